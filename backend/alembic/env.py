@@ -11,7 +11,7 @@ sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 from core.config import settings
 from core.database import Base
-from models import user, coin
+from models import user, coin, catalog, snapshot, country, idempotency
 
 config = context.config
 
@@ -0,0 +1,465 @@
+"""
+Helpers para migrações online no Postgres, sem bloquear a API.
+
+- `run_guarded`: DDL curta numa transação própria com `lock_timeout` e
+  `statement_timeout`; se o lock não vier a tempo, desiste (liberando a fila
+  de consultas que esperavam atrás dela) e tenta de novo com backoff.
+- `create_index_concurrently` / `drop_index_concurrently`: fora de transação.
+  Em tabela particionada (CONCURRENTLY não é suportado no pai), o índice é
+  criado `ON ONLY` no pai, construído CONCURRENTLY em cada partição e as
+  partições são anexadas com `ALTER INDEX ... ATTACH PARTITION`.
+- `backfill_in_batches`: UPDATE em lotes de ids, um lote por transação, com
+  pausa entre lotes.
+- `add_column_with_backfill`, `add_constraint_not_valid` e `set_not_null`:
+  o padrão adicionar coluna -> backfill em lotes -> validar constraint. FK
+  NOT VALID não existe em tabela particionada: a FK é validada partição a
+  partição e o pai reaproveita as constraints já validadas.
+- `change_column_type`: troca o tipo de uma coluna sem reescrever a tabela
+  sob ACCESS EXCLUSIVE (coluna nova + trigger + backfill + troca de nomes).
+
+Em outros bancos (SQLite no desenvolvimento) os helpers caem nas operações
+comuns do Alembic. Só funcionam no modo online (não geram SQL com --sql).
+"""
+import time
+from contextlib import nullcontext
+from typing import Callable, List, Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from psycopg.errors import LockNotAvailable
+from sqlalchemy.exc import DBAPIError
+
+from core.config import settings
+
+Statement = Union[str, Callable[[], None]]
+
+
+def is_postgresql() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def _execute(statement: Statement) -> None:
+    if callable(statement):
+        statement()
+    else:
+        op.get_bind().execute(sa.text(statement))
+
+
+def _lock_not_available(exc: DBAPIError) -> bool:
+    return isinstance(exc.orig, LockNotAvailable)
+
+
+def _guarded_transaction(
+    statements: Sequence[Statement],
+    lock_timeout_ms: int,
+    statement_timeout_ms: int,
+    retries: int,
+    params: Optional[dict] = None,
+) -> None:
+    """Roda `statements` numa transação explícita; exige autocommit_block ativo."""
+    bind = op.get_bind()
+    for attempt in range(retries + 1):
+        try:
+            bind.exec_driver_sql("BEGIN")
+            bind.exec_driver_sql(f"SET LOCAL lock_timeout = {int(lock_timeout_ms)}")
+            bind.exec_driver_sql(f"SET LOCAL statement_timeout = {int(statement_timeout_ms)}")
+            for statement in statements:
+                if params is not None and not callable(statement):
+                    bind.execute(sa.text(statement), params)
+                else:
+                    _execute(statement)
+            bind.exec_driver_sql("COMMIT")
+            return
+        except DBAPIError as exc:
+            bind.exec_driver_sql("ROLLBACK")
+            if not _lock_not_available(exc) or attempt == retries:
+                raise
+            delay = min(30.0, settings.MIGRATION_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+            time.sleep(delay)
+
+
+def run_guarded(
+    *statements: Statement,
+    lock_timeout_ms: Optional[int] = None,
+    statement_timeout_ms: Optional[int] = None,
+    retries: Optional[int] = None,
+) -> None:
+    """
+    Executa DDL curta (SQL ou funções que chamam `op.*`) numa transação
+    própria, com limite de espera pelo lock. Ao receber `lock_timeout`, desfaz
+    e tenta de novo até `retries` vezes com backoff exponencial.
+    """
+    if not is_postgresql():
+        for statement in statements:
+            _execute(statement)
+        return
+
+    with op.get_context().autocommit_block():
+        _guarded_transaction(
+            statements,
+            settings.MIGRATION_LOCK_TIMEOUT_MS if lock_timeout_ms is None else lock_timeout_ms,
+            settings.MIGRATION_STATEMENT_TIMEOUT_MS if statement_timeout_ms is None else statement_timeout_ms,
+            settings.MIGRATION_LOCK_RETRIES if retries is None else retries,
+        )
+
+
+def _index_is_valid(name: str) -> Optional[bool]:
+    """True/False se o índice existe (válido ou não); None se não existe."""
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid WHERE c.relname = :name"
+        ),
+        {"name": name},
+    ).scalar()
+
+
+def is_partitioned(table: str) -> bool:
+    return bool(
+        op.get_bind().execute(
+            sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table))"),
+            {"table": table},
+        ).scalar()
+    )
+
+
+def _partitions(table: str) -> List[str]:
+    """Partições diretas de `table` (que podem ser particionadas também)."""
+    return list(
+        op.get_bind().execute(
+            sa.text(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(:table) ORDER BY c.relname"
+            ),
+            {"table": table},
+        ).scalars()
+    )
+
+
+def _constraint_is_valid(table: str, name: str) -> Optional[bool]:
+    """Como `_index_is_valid`, para a constraint `name` de `table`."""
+    return op.get_bind().execute(
+        sa.text(
+            "SELECT convalidated FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:table) AND conname = :name"
+        ),
+        {"table": table, "name": name},
+    ).scalar()
+
+
+def _index_is_attached(index: str, parent_index: str) -> bool:
+    return bool(
+        op.get_bind().execute(
+            sa.text(
+                "SELECT EXISTS (SELECT 1 FROM pg_inherits "
+                "WHERE inhrelid = to_regclass(:index) AND inhparent = to_regclass(:parent))"
+            ),
+            {"index": index, "parent": parent_index},
+        ).scalar()
+    )
+
+
+def _partition_index_name(name: str, partition: str) -> str:
+    # Identificadores do Postgres têm até 63 bytes; o sufixo da partição fica inteiro.
+    suffix = f"_{partition}"
+    return name[: 63 - len(suffix)] + suffix
+
+
+def _index_columns(columns: Sequence[str]) -> list:
+    """Nomes de coluna como estão; expressões (índice funcional) como SQL literal."""
+    return [column if column.isidentifier() else sa.text(column) for column in columns]
+
+
+def _create_partitioned_index(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool,
+    where: Optional[str],
+) -> None:
+    """
+    Índice num pai particionado, sem bloquear as partições durante a
+    construção. O índice do pai fica inválido até a última partição ser
+    anexada; uma execução interrompida é retomada de onde parou.
+    """
+    if _index_is_valid(name):
+        return
+    unique_sql = "UNIQUE " if unique else ""
+    where_sql = f" WHERE {where}" if where else ""
+    _guarded_transaction(
+        [f"CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON ONLY {table} ({', '.join(columns)}){where_sql}"],
+        settings.MIGRATION_LOCK_TIMEOUT_MS,
+        settings.MIGRATION_STATEMENT_TIMEOUT_MS,
+        settings.MIGRATION_LOCK_RETRIES,
+    )
+    for partition in _partitions(table):
+        partition_index = _partition_index_name(name, partition)
+        if is_partitioned(partition):
+            _create_partitioned_index(partition_index, partition, columns, unique, where)
+        else:
+            _create_index(partition_index, partition, columns, unique, where)
+        if not _index_is_attached(partition_index, name):
+            _guarded_transaction(
+                [f"ALTER INDEX {name} ATTACH PARTITION {partition_index}"],
+                settings.MIGRATION_LOCK_TIMEOUT_MS,
+                settings.MIGRATION_STATEMENT_TIMEOUT_MS,
+                settings.MIGRATION_LOCK_RETRIES,
+            )
+
+
+def _create_index(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool,
+    where: Optional[str],
+) -> None:
+    """CREATE INDEX CONCURRENTLY numa tabela comum; exige autocommit_block ativo."""
+    valid = _index_is_valid(name)
+    if valid:
+        return
+    if valid is False:
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    # A construção pode demorar, e o lock usado (SHARE UPDATE EXCLUSIVE)
+    # não bloqueia leituras nem escritas: sem timeouts aqui.
+    op.execute("SET statement_timeout = 0")
+    try:
+        op.create_index(
+            name,
+            table,
+            _index_columns(columns),
+            unique=unique,
+            postgresql_concurrently=True,
+            postgresql_where=sa.text(where) if where else None,
+        )
+    finally:
+        op.execute("RESET statement_timeout")
+
+
+def create_index_concurrently(
+    name: str,
+    table: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    where: Optional[str] = None,
+) -> None:
+    """
+    CREATE INDEX CONCURRENTLY fora da transação da migração; `columns` pode
+    ter expressões, como "lower(country)". Um índice
+    inválido deixado por uma tentativa interrompida é removido antes; se o
+    índice já existe e é válido, não faz nada. Em tabela particionada, um
+    índice por partição anexado ao índice do pai.
+    """
+    if not is_postgresql():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, _index_columns(columns), unique=unique)
+        return
+
+    with op.get_context().autocommit_block():
+        if is_partitioned(table):
+            _create_partitioned_index(name, table, columns, unique, where)
+        else:
+            _create_index(name, table, columns, unique, where)
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    """
+    DROP INDEX CONCURRENTLY fora da transação. Índice de tabela particionada
+    não aceita CONCURRENTLY: cai num DROP com lock_timeout e retry (que leva
+    junto os índices das partições).
+    """
+    if not is_postgresql():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
+        return
+
+    if is_partitioned(table):
+        run_guarded(f"DROP INDEX IF EXISTS {name}")
+        return
+    with op.get_context().autocommit_block():
+        op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+
+
+def backfill_in_batches(
+    table: str,
+    set_clause: str,
+    where: Optional[str] = None,
+    batch_size: Optional[int] = None,
+    pause_seconds: Optional[float] = None,
+    key: str = 'id',
+) -> None:
+    """
+    `UPDATE table SET set_clause` em lotes de `batch_size` valores de `key`,
+    cada lote em sua própria transação (com lock_timeout e retry), pausando
+    entre eles para não saturar o banco nem as réplicas.
+    """
+    batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+    pause_seconds = settings.MIGRATION_BATCH_PAUSE_SECONDS if pause_seconds is None else pause_seconds
+    condition = f" AND ({where})" if where else ""
+    statement = (
+        f"UPDATE {table} SET {set_clause} "
+        f"WHERE {key} > :low AND {key} <= :high{condition}"
+    )
+
+    bind = op.get_bind()
+    postgresql = is_postgresql()
+    with op.get_context().autocommit_block() if postgresql else nullcontext():
+        low, high = bind.execute(
+            sa.text(f"SELECT COALESCE(MIN({key}), 1) - 1, COALESCE(MAX({key}), 0) FROM {table}")
+        ).one()
+        while low < high:
+            params = {"low": low, "high": low + batch_size}
+            if postgresql:
+                _guarded_transaction(
+                    [statement],
+                    settings.MIGRATION_LOCK_TIMEOUT_MS,
+                    settings.MIGRATION_STATEMENT_TIMEOUT_MS,
+                    settings.MIGRATION_LOCK_RETRIES,
+                    params,
+                )
+                time.sleep(pause_seconds)
+            else:
+                bind.execute(sa.text(statement), params)
+            low += batch_size
+
+
+def add_column_with_backfill(
+    table: str,
+    column: sa.Column,
+    set_expression: str,
+    where: Optional[str] = None,
+    not_null: bool = False,
+    batch_size: Optional[int] = None,
+) -> None:
+    """
+    Adiciona `column` (anulável e sem default volátil: só altera o catálogo),
+    preenche em lotes com `set_expression` e, se `not_null`, aplica NOT NULL
+    via CHECK validado.
+    """
+    if not column.nullable:
+        raise ValueError("Add the column as nullable and pass not_null=True.")
+    run_guarded(lambda: op.add_column(table, column))
+    backfill_in_batches(
+        table,
+        f"{column.name} = {set_expression}",
+        where=f"{column.name} IS NULL" + (f" AND ({where})" if where else ""),
+        batch_size=batch_size,
+    )
+    if not_null:
+        set_not_null(table, column.name)
+
+
+def add_constraint_not_valid(table: str, name: str, definition: str) -> None:
+    """
+    Cria a constraint como NOT VALID (lock curto, sem varrer a tabela) e a
+    valida depois; VALIDATE usa SHARE UPDATE EXCLUSIVE e não bloqueia
+    leituras nem escritas. `definition` é, por exemplo, `CHECK (...)` ou
+    `FOREIGN KEY (...) REFERENCES ...`.
+
+    Tabela particionada não aceita FK NOT VALID: cada partição recebe a FK
+    (NOT VALID + VALIDATE) com o mesmo nome e o pai a cria sem NOT VALID,
+    anexando as das partições sem varrê-las de novo.
+    """
+    if not is_postgresql():
+        op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        return
+
+    if definition.lstrip().upper().startswith("FOREIGN KEY") and is_partitioned(table):
+        for partition in _partitions(table):
+            valid = _constraint_is_valid(partition, name)
+            if valid is None and is_partitioned(partition):
+                add_constraint_not_valid(partition, name, definition)
+                continue
+            if valid is None:
+                run_guarded(f"ALTER TABLE {partition} ADD CONSTRAINT {name} {definition} NOT VALID")
+            if not valid:
+                run_guarded(
+                    f"ALTER TABLE {partition} VALIDATE CONSTRAINT {name}",
+                    statement_timeout_ms=0,
+                )
+        run_guarded(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}")
+        return
+
+    run_guarded(f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition} NOT VALID")
+    run_guarded(
+        f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}",
+        statement_timeout_ms=0,
+    )
+
+
+def set_not_null(table: str, column: str) -> None:
+    """
+    NOT NULL sem varredura sob ACCESS EXCLUSIVE: um CHECK (col IS NOT NULL)
+    validado permite ao Postgres (12+) pular a verificação no SET NOT NULL.
+    """
+    if not is_postgresql():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(column, nullable=False)
+        return
+
+    check = f"ck_{table}_{column}_not_null"
+    add_constraint_not_valid(table, check, f"CHECK ({column} IS NOT NULL)")
+    run_guarded(
+        f"ALTER TABLE {table} ALTER COLUMN {column} SET NOT NULL",
+        f"ALTER TABLE {table} DROP CONSTRAINT {check}",
+    )
+
+
+def change_column_type(
+    table: str,
+    column: str,
+    new_type: sa.types.TypeEngine,
+    using: str,
+    batch_size: Optional[int] = None,
+) -> None:
+    """
+    Troca o tipo de `column` sem `ALTER COLUMN ... TYPE` (que reescreve a
+    tabela inteira sob ACCESS EXCLUSIVE). `using` é a conversão com `{col}`
+    no lugar da coluna, por exemplo `UPPER({col}::text)::originalityenum`.
+
+    1. cria `<column>_new` com o novo tipo;
+    2. um trigger mantém a coluna nova em INSERT/UPDATE concorrentes;
+    3. backfill em lotes;
+    4. troca os nomes numa transação curta e remove a coluna antiga.
+
+    Defaults, índices e constraints da coluna antiga não são copiados: o
+    chamador recria depois (índices com `create_index_concurrently`).
+    """
+    if not is_postgresql():
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column(
+                column,
+                type_=new_type,
+                postgresql_using=using.format(col=column),
+            )
+        return
+
+    type_sql = new_type.compile(dialect=op.get_bind().dialect)
+    new_column = f"{column}_new"
+    function = f"{table}_{column}_sync_new"
+    run_guarded(
+        f"ALTER TABLE {table} ADD COLUMN {new_column} {type_sql}",
+        f"""
+        CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$
+        BEGIN
+            NEW.{new_column} := {using.format(col=f'NEW.{column}')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f"CREATE TRIGGER {function} BEFORE INSERT OR UPDATE ON {table} "
+        f"FOR EACH ROW EXECUTE FUNCTION {function}()",
+    )
+    # O trigger também converte as linhas tocadas pelo próprio backfill.
+    backfill_in_batches(
+        table,
+        f"{new_column} = {using.format(col=column)}",
+        where=f"{new_column} IS DISTINCT FROM {using.format(col=column)}",
+        batch_size=batch_size,
+    )
+    run_guarded(
+        f"DROP TRIGGER {function} ON {table}",
+        f"DROP FUNCTION {function}()",
+        f"ALTER TABLE {table} DROP COLUMN {column}",
+        f"ALTER TABLE {table} RENAME COLUMN {new_column} TO {column}",
+    )
@@ -0,0 +1,42 @@
+"""add natural key index to coins
+
+Revision ID: 0a6d3e9f1b87
+Revises: f5c0a8e7b342
+Create Date: 2026-03-09 20:17:36.240915
+
+Índice (não único) na chave natural normalizada, usado pelo upsert opcional
+da importação e do cadastro para achar a moeda igual já existente. Nenhuma
+linha é alterada aqui: duplicatas já existentes aparecem em
+GET /coins/duplicates e só são juntadas a pedido do usuário
+(POST /coins/duplicates/merge).
+"""
+from typing import Sequence, Union
+
+from online_migrations import create_index_concurrently, drop_index_concurrently
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6d3e9f1b87'
+down_revision: Union[str, Sequence[str], None] = 'f5c0a8e7b342'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mesma expressão de models.coin.natural_key nesta revisão.
+NATURAL_KEY = [
+    'owner_id',
+    'lower(trim(country))',
+    'year',
+    'lower(trim(face_value))',
+    "coalesce(lower(trim(condition)), '')",
+    'originality',
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    create_index_concurrently('ix_coins_natural_key', 'coins', NATURAL_KEY)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_coins_natural_key', 'coins')
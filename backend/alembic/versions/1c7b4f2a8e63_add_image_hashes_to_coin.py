@@ -0,0 +1,32 @@
+"""add image hashes to coin
+
+Revision ID: 1c7b4f2a8e63
+Revises: 0a6d3e9f1b87
+Create Date: 2026-03-23 22:02:51.617440
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1c7b4f2a8e63'
+down_revision: Union[str, Sequence[str], None] = '0a6d3e9f1b87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('image_hash_front', sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('image_hash_back', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.drop_column('image_hash_back')
+        batch_op.drop_column('image_hash_front')
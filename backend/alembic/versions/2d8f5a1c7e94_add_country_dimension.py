@@ -0,0 +1,415 @@
+"""add canonical country dimension
+
+Revision ID: 2d8f5a1c7e94
+Revises: 1c7b4f2a8e63
+Create Date: 2026-04-06 21:13:40.118027
+
+Cria `countries` (ISO 3166-1) e `country_aliases`, carregados da cópia de
+data/countries.csv abaixo, e a coluna `coins.country_code`. No Postgres, a
+FK entra como NOT VALID, o código das moedas existentes é resolvido em
+Python com a normalização das moedas novas (copiada de
+services/country_service.py na época desta revisão) e gravado em lotes de
+MIGRATION_BATCH_SIZE ids (um lote por transação, avançando updated_at), e o
+índice é criado com CONCURRENTLY depois do backfill. Moedas cadastradas com
+aliases carregados mais tarde podem ser resolvidas com
+`python -m scripts.backfill_country_codes`.
+"""
+import csv
+import io
+import unicodedata
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import (
+    add_constraint_not_valid,
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    is_postgresql,
+    run_guarded,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2d8f5a1c7e94'
+down_revision: Union[str, Sequence[str], None] = '1c7b4f2a8e63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTRIES_CSV = """\
+code,name,aliases
+AD,Andorra,
+AE,Emirados Árabes Unidos,United Arab Emirates|UAE|EAU|Emirados Árabes
+AF,Afeganistão,Afghanistan
+AG,Antígua e Barbuda,Antigua and Barbuda
+AI,Anguila,Anguilla
+AL,Albânia,Albania
+AM,Armênia,Armenia
+AO,Angola,
+AQ,Antártida,Antarctica
+AR,Argentina,
+AS,Samoa Americana,American Samoa
+AT,Áustria,Austria|Österreich
+AU,Austrália,Australia
+AW,Aruba,
+AX,Ilhas Åland,Aland Islands|Åland
+AZ,Azerbaijão,Azerbaijan
+BA,Bósnia e Herzegovina,Bosnia and Herzegovina|Bosnia
+BB,Barbados,
+BD,Bangladesh,
+BE,Bélgica,Belgium|Belgique|België
+BF,Burkina Faso,
+BG,Bulgária,Bulgaria
+BH,Bahrein,Bahrain
+BI,Burundi,
+BJ,Benin,
+BL,São Bartolomeu,Saint Barthelemy
+BM,Bermudas,Bermuda
+BN,Brunei,Brunei Darussalam
+BO,Bolívia,Bolivia
+BQ,Países Baixos Caribenhos,Caribbean Netherlands|Bonaire
+BR,Brasil,Brazil|República Federativa do Brasil|Brasil (Real)
+BS,Bahamas,
+BT,Butão,Bhutan
+BV,Ilha Bouvet,Bouvet Island
+BW,Botsuana,Botswana
+BY,Bielorrússia,Belarus
+BZ,Belize,
+CA,Canadá,Canada
+CC,Ilhas Cocos,Cocos Islands|Cocos (Keeling) Islands
+CD,República Democrática do Congo,Democratic Republic of the Congo|DR Congo|Congo-Kinshasa|Zaire
+CF,República Centro-Africana,Central African Republic
+CG,República do Congo,Republic of the Congo|Congo|Congo-Brazzaville
+CH,Suíça,Switzerland|Schweiz|Suisse|Helvetia
+CI,Costa do Marfim,Ivory Coast|Côte d'Ivoire
+CK,Ilhas Cook,Cook Islands
+CL,Chile,
+CM,Camarões,Cameroon
+CN,China,People's Republic of China
+CO,Colômbia,Colombia
+CR,Costa Rica,
+CU,Cuba,
+CV,Cabo Verde,Cape Verde
+CW,Curaçao,Curacao
+CX,Ilha Christmas,Christmas Island
+CY,Chipre,Cyprus
+CZ,Tchéquia,Czech Republic|Czechia|República Tcheca
+DE,Alemanha,Germany|Deutschland|Alemanha Ocidental|West Germany
+DJ,Djibuti,Djibouti
+DK,Dinamarca,Denmark|Danmark
+DM,Dominica,
+DO,República Dominicana,Dominican Republic
+DZ,Argélia,Algeria
+EC,Equador,Ecuador
+EE,Estônia,Estonia
+EG,Egito,Egypt
+EH,Saara Ocidental,Western Sahara
+ER,Eritreia,Eritrea
+ES,Espanha,Spain|España
+ET,Etiópia,Ethiopia
+FI,Finlândia,Finland|Suomi
+FJ,Fiji,
+FK,Ilhas Malvinas,Falkland Islands|Malvinas
+FM,Micronésia,Micronesia
+FO,Ilhas Faroé,Faroe Islands
+FR,França,France
+GA,Gabão,Gabon
+GB,Reino Unido,United Kingdom|UK|Great Britain|Grã-Bretanha|Inglaterra|England|Escócia|Scotland
+GD,Granada,Grenada
+GE,Geórgia,Georgia
+GF,Guiana Francesa,French Guiana
+GG,Guernsey,
+GH,Gana,Ghana
+GI,Gibraltar,
+GL,Groenlândia,Greenland
+GM,Gâmbia,Gambia
+GN,Guiné,Guinea
+GP,Guadalupe,Guadeloupe
+GQ,Guiné Equatorial,Equatorial Guinea
+GR,Grécia,Greece|Hellas
+GS,Ilhas Geórgia do Sul e Sandwich do Sul,South Georgia and the South Sandwich Islands
+GT,Guatemala,
+GU,Guam,
+GW,Guiné-Bissau,Guinea-Bissau
+GY,Guiana,Guyana
+HK,Hong Kong,
+HM,Ilhas Heard e McDonald,Heard Island and McDonald Islands
+HN,Honduras,
+HR,Croácia,Croatia|Hrvatska
+HT,Haiti,
+HU,Hungria,Hungary|Magyarország
+ID,Indonésia,Indonesia
+IE,Irlanda,Ireland|Éire
+IL,Israel,
+IM,Ilha de Man,Isle of Man
+IN,Índia,India
+IO,Território Britânico do Oceano Índico,British Indian Ocean Territory
+IQ,Iraque,Iraq
+IR,Irã,Iran|Irão|Pérsia|Persia
+IS,Islândia,Iceland
+IT,Itália,Italy|Italia
+JE,Jersey,
+JM,Jamaica,
+JO,Jordânia,Jordan
+JP,Japão,Japan|Nippon
+KE,Quênia,Kenya|Quénia
+KG,Quirguistão,Kyrgyzstan
+KH,Camboja,Cambodia
+KI,Kiribati,
+KM,Comores,Comoros
+KN,São Cristóvão e Névis,Saint Kitts and Nevis
+KP,Coreia do Norte,North Korea
+KR,Coreia do Sul,South Korea|Coreia|Korea
+KW,Kuwait,Kuwait
+KY,Ilhas Cayman,Cayman Islands
+KZ,Cazaquistão,Kazakhstan
+LA,Laos,
+LB,Líbano,Lebanon
+LC,Santa Lúcia,Saint Lucia
+LI,Liechtenstein,
+LK,Sri Lanka,Ceilão|Ceylon
+LR,Libéria,Liberia
+LS,Lesoto,Lesotho
+LT,Lituânia,Lithuania
+LU,Luxemburgo,Luxembourg
+LV,Letônia,Latvia
+LY,Líbia,Libya
+MA,Marrocos,Morocco
+MC,Mônaco,Monaco
+MD,Moldávia,Moldova
+ME,Montenegro,
+MF,São Martinho,Saint Martin
+MG,Madagascar,
+MH,Ilhas Marshall,Marshall Islands
+MK,Macedônia do Norte,North Macedonia|Macedonia
+ML,Mali,
+MM,Mianmar,Myanmar|Birmânia|Burma
+MN,Mongólia,Mongolia
+MO,Macau,Macao
+MP,Ilhas Marianas do Norte,Northern Mariana Islands
+MQ,Martinica,Martinique
+MR,Mauritânia,Mauritania
+MS,Montserrat,
+MT,Malta,
+MU,Maurício,Mauritius
+MV,Maldivas,Maldives
+MW,Malawi,Malaui
+MX,México,Mexico
+MY,Malásia,Malaysia
+MZ,Moçambique,Mozambique
+NA,Namíbia,Namibia
+NC,Nova Caledônia,New Caledonia
+NE,Níger,Niger
+NF,Ilha Norfolk,Norfolk Island
+NG,Nigéria,Nigeria
+NI,Nicarágua,Nicaragua
+NL,Países Baixos,Netherlands|Holanda|Holland|Nederland
+NO,Noruega,Norway|Norge
+NP,Nepal,
+NR,Nauru,
+NU,Niue,
+NZ,Nova Zelândia,New Zealand
+OM,Omã,Oman
+PA,Panamá,Panama
+PE,Peru,
+PF,Polinésia Francesa,French Polynesia
+PG,Papua-Nova Guiné,Papua New Guinea
+PH,Filipinas,Philippines
+PK,Paquistão,Pakistan
+PL,Polônia,Poland|Polska|Polónia
+PM,São Pedro e Miquelão,Saint Pierre and Miquelon
+PN,Ilhas Pitcairn,Pitcairn Islands
+PR,Porto Rico,Puerto Rico
+PS,Palestina,Palestine
+PT,Portugal,República Portuguesa
+PW,Palau,
+PY,Paraguai,Paraguay
+QA,Catar,Qatar
+RE,Reunião,Réunion|Reunion
+RO,Romênia,Romania|Roménia
+RS,Sérvia,Serbia
+RU,Rússia,Russia|Russian Federation|Federação Russa
+RW,Ruanda,Rwanda
+SA,Arábia Saudita,Saudi Arabia
+SB,Ilhas Salomão,Solomon Islands
+SC,Seicheles,Seychelles
+SD,Sudão,Sudan
+SE,Suécia,Sweden|Sverige
+SG,Singapura,Singapore
+SH,Santa Helena,Saint Helena
+SI,Eslovênia,Slovenia|Eslovénia
+SJ,Svalbard e Jan Mayen,Svalbard and Jan Mayen
+SK,Eslováquia,Slovakia
+SL,Serra Leoa,Sierra Leone
+SM,San Marino,São Marino
+SN,Senegal,
+SO,Somália,Somalia
+SR,Suriname,
+SS,Sudão do Sul,South Sudan
+ST,São Tomé e Príncipe,Sao Tome and Principe
+SV,El Salvador,Salvador
+SX,Sint Maarten,
+SY,Síria,Syria
+SZ,Essuatíni,Eswatini|Suazilândia|Swaziland
+TC,Ilhas Turks e Caicos,Turks and Caicos Islands
+TD,Chade,Chad
+TF,Terras Austrais Francesas,French Southern Territories
+TG,Togo,
+TH,Tailândia,Thailand
+TJ,Tajiquistão,Tajikistan
+TK,Tokelau,
+TL,Timor-Leste,East Timor|Timor
+TM,Turcomenistão,Turkmenistan
+TN,Tunísia,Tunisia
+TO,Tonga,
+TR,Turquia,Turkey|Türkiye
+TT,Trinidad e Tobago,Trinidad and Tobago
+TV,Tuvalu,
+TW,Taiwan,Formosa
+TZ,Tanzânia,Tanzania
+UA,Ucrânia,Ukraine
+UG,Uganda,
+UM,Ilhas Menores Distantes dos Estados Unidos,United States Minor Outlying Islands
+US,Estados Unidos,United States|USA|US|EUA|Estados Unidos da América|United States of America|America
+UY,Uruguai,Uruguay
+UZ,Uzbequistão,Uzbekistan
+VA,Vaticano,Vatican|Vatican City|Cidade do Vaticano|Santa Sé|Holy See
+VC,São Vicente e Granadinas,Saint Vincent and the Grenadines
+VE,Venezuela,
+VG,Ilhas Virgens Britânicas,British Virgin Islands
+VI,Ilhas Virgens Americanas,U.S. Virgin Islands
+VN,Vietnã,Vietnam|Vietname
+VU,Vanuatu,
+WF,Wallis e Futuna,Wallis and Futuna
+WS,Samoa,
+YE,Iêmen,Yemen|Iémen
+YT,Mayotte,
+ZA,África do Sul,South Africa
+ZM,Zâmbia,Zambia
+ZW,Zimbábue,Zimbabwe|Zimbabué
+"""
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.split()).lower()
+
+
+def _strip_accents(value: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def _parse_countries() -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """Linhas de `countries` e de `country_aliases`; um alias repetido fica com o primeiro país."""
+    countries: List[Dict[str, str]] = []
+    aliases: Dict[str, str] = {}
+    for row in csv.DictReader(io.StringIO(COUNTRIES_CSV)):
+        code = row['code'].strip().upper()
+        name = row['name'].strip()
+        countries.append({'code': code, 'name': name})
+        for alias in [code, name, *(row['aliases'] or '').split('|')]:
+            if alias.strip():
+                key = _normalize(alias)
+                aliases.setdefault(key, code)
+                aliases.setdefault(_strip_accents(key), code)
+    return countries, [{'alias': a, 'country_code': c} for a, c in aliases.items()]
+
+
+def _lookup(aliases: Dict[str, str], name: Optional[str]) -> Optional[str]:
+    if not name or not name.strip():
+        return None
+    key = _normalize(name)
+    return aliases.get(key) or aliases.get(_strip_accents(key))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    countries = op.create_table(
+        'countries',
+        sa.Column('code', sa.String(length=2), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.PrimaryKeyConstraint('code', name=op.f('pk_countries')),
+    )
+    aliases = op.create_table(
+        'country_aliases',
+        sa.Column('alias', sa.String(length=100), nullable=False),
+        sa.Column('country_code', sa.String(length=2), nullable=False),
+        sa.ForeignKeyConstraint(['country_code'], ['countries.code'], name=op.f('fk_country_aliases_country_code_countries'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('alias', name=op.f('pk_country_aliases')),
+    )
+    with op.batch_alter_table('country_aliases', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_country_aliases_country_code'), ['country_code'], unique=False)
+
+    country_rows, alias_rows = _parse_countries()
+    op.bulk_insert(countries, country_rows)
+    op.bulk_insert(aliases, alias_rows)
+
+    if not is_postgresql():
+        with op.batch_alter_table('coins', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('country_code', sa.String(length=2), nullable=True))
+            batch_op.create_foreign_key(batch_op.f('fk_coins_country_code_countries'), 'countries', ['country_code'], ['code'], ondelete='SET NULL')
+            batch_op.create_index('ix_coins_owner_id_country_code', ['owner_id', 'country_code'], unique=False)
+        return
+
+    run_guarded("ALTER TABLE coins ADD COLUMN country_code VARCHAR(2)")
+    add_constraint_not_valid(
+        'coins',
+        'fk_coins_country_code_countries',
+        "FOREIGN KEY (country_code) REFERENCES countries (code) ON DELETE SET NULL",
+    )
+    _backfill_country_codes({row['alias']: row['country_code'] for row in alias_rows})
+    create_index_concurrently('ix_coins_owner_id_country_code', 'coins', ['owner_id', 'country_code'])
+
+
+def _backfill_country_codes(aliases: Dict[str, str]) -> None:
+    """
+    Os nomes distintos são resolvidos em Python (mesma normalização das
+    moedas novas: acentos, maiúsculas, espaços) numa tabela temporária
+    nome -> código; o UPDATE em lotes só copia de lá.
+    """
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        names = bind.execute(
+            sa.text("SELECT DISTINCT country FROM coins WHERE country_code IS NULL")
+        ).scalars()
+        resolved = [
+            {'country': name, 'country_code': code}
+            for name in names
+            if (code := _lookup(aliases, name))
+        ]
+        bind.execute(sa.text(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS coin_country_codes "
+            "(country VARCHAR(100) PRIMARY KEY, country_code VARCHAR(2) NOT NULL)"
+        ))
+        if resolved:
+            bind.execute(
+                sa.text(
+                    "INSERT INTO coin_country_codes (country, country_code) "
+                    "VALUES (:country, :country_code) ON CONFLICT DO NOTHING"
+                ),
+                resolved,
+            )
+    backfill_in_batches(
+        'coins',
+        "country_code = (SELECT m.country_code FROM coin_country_codes m "
+        "WHERE m.country = coins.country), updated_at = now()",
+        where="country_code IS NULL AND country IN (SELECT country FROM coin_country_codes)",
+    )
+    with op.get_context().autocommit_block():
+        bind.execute(sa.text("DROP TABLE coin_country_codes"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently('ix_coins_owner_id_country_code', 'coins')
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('fk_coins_country_code_countries'), type_='foreignkey')
+        batch_op.drop_column('country_code')
+
+    with op.batch_alter_table('country_aliases', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_country_aliases_country_code'))
+
+    op.drop_table('country_aliases')
+    op.drop_table('countries')
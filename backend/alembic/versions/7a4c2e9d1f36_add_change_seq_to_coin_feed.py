@@ -0,0 +1,131 @@
+"""add commit-ordered change sequence to the coin feed
+
+Revision ID: 7a4c2e9d1f36
+Revises: 5e3b9c7d2f18
+Create Date: 2026-10-19 14:22:41.530918
+
+O feed de alterações paginava por (updated_at, id), mas `now()` é o início
+da transação: uma transação longa que termina depois de outra grava um
+updated_at menor e fica atrás de um cursor já entregue. `change_seq` vem de
+um contador por dono (`collection_versions`) incrementado por trigger em
+coins e coin_tombstones, uma vez por transação (`xact_id`); o lock da linha
+do contador vai até o commit, então a ordem da sequência é a ordem de commit
+das escritas de cada dono. No Postgres, as colunas entram só no catálogo, o
+trigger preenche as linhas existentes num backfill em lotes e os índices são
+criados com CONCURRENTLY. No SQLite, triggers AFTER incrementam o contador
+a cada linha.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import (
+    backfill_in_batches,
+    create_index_concurrently,
+    drop_index_concurrently,
+    is_postgresql,
+    run_guarded,
+)
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7a4c2e9d1f36'
+down_revision: Union[str, Sequence[str], None] = '5e3b9c7d2f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CHANGE_SEQ_FUNCTION = """
+CREATE OR REPLACE FUNCTION collection_change_seq() RETURNS trigger AS $$
+BEGIN
+    -- Só a primeira escrita do dono na transação incrementa o contador.
+    SELECT change_seq INTO NEW.change_seq FROM collection_versions
+    WHERE owner_id = NEW.owner_id AND xact_id = txid_current();
+    IF NOT FOUND THEN
+        INSERT INTO collection_versions (owner_id, change_seq, xact_id)
+        VALUES (NEW.owner_id, 1, txid_current())
+        ON CONFLICT (owner_id) DO UPDATE
+        SET change_seq = collection_versions.change_seq + 1, xact_id = EXCLUDED.xact_id
+        RETURNING change_seq INTO NEW.change_seq;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+FEED_TABLES = ('coins', 'coin_tombstones')
+
+
+def sqlite_change_seq_triggers(table: str) -> list:
+    # O SQLite não altera NEW: o trigger AFTER grava o valor com um UPDATE, e o
+    # WHEN impede que esse UPDATE incremente o contador de novo.
+    bump = f"""
+    INSERT INTO collection_versions (owner_id, change_seq) VALUES (NEW.owner_id, 1)
+    ON CONFLICT (owner_id) DO UPDATE SET change_seq = change_seq + 1;
+    UPDATE {table} SET change_seq = (
+        SELECT change_seq FROM collection_versions WHERE owner_id = NEW.owner_id
+    ) WHERE id = NEW.id;
+    """
+    return [
+        f"CREATE TRIGGER {table}_change_seq_insert AFTER INSERT ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER {table}_change_seq_update AFTER UPDATE ON {table} "
+        f"WHEN NEW.change_seq IS OLD.change_seq BEGIN {bump} END",
+    ]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'collection_versions',
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('change_seq', sa.BigInteger(), nullable=False),
+        sa.Column('xact_id', sa.BigInteger(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], name=op.f('fk_collection_versions_owner_id_users'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('owner_id', name=op.f('pk_collection_versions')),
+    )
+
+    if not is_postgresql():
+        for table in FEED_TABLES:
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+                batch_op.create_index(f'ix_{table}_owner_id_change_seq', ['owner_id', 'change_seq'], unique=False)
+        for table in FEED_TABLES:
+            for statement in sqlite_change_seq_triggers(table):
+                op.execute(statement)
+            # Os próprios triggers numeram as linhas existentes.
+            op.execute(f"UPDATE {table} SET change_seq = NULL")
+        return
+
+    run_guarded(
+        *(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS change_seq BIGINT" for table in FEED_TABLES),
+        CHANGE_SEQ_FUNCTION,
+        *(
+            f"CREATE OR REPLACE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION collection_change_seq()"
+            for table in FEED_TABLES
+        ),
+    )
+    # O próprio trigger numera as linhas tocadas pelo backfill.
+    for table in FEED_TABLES:
+        backfill_in_batches(table, "change_seq = NULL", where="change_seq IS NULL")
+        create_index_concurrently(f'ix_{table}_owner_id_change_seq', table, ['owner_id', 'change_seq'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in FEED_TABLES:
+        drop_index_concurrently(f'ix_{table}_owner_id_change_seq', table)
+
+    if is_postgresql():
+        run_guarded(
+            *(f"DROP TRIGGER IF EXISTS {table}_change_seq ON {table}" for table in FEED_TABLES),
+            "DROP FUNCTION IF EXISTS collection_change_seq()",
+        )
+    else:
+        for table in FEED_TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_insert")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_change_seq_update")
+    for table in FEED_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_column('change_seq')
+
+    op.drop_table('collection_versions')
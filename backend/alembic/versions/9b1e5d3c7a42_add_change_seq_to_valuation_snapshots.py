@@ -0,0 +1,33 @@
+"""add change_seq to valuation snapshots
+
+Revision ID: 9b1e5d3c7a42
+Revises: 7a4c2e9d1f36
+Create Date: 2026-10-19 16:05:12.274310
+
+O snapshot guarda a versão dos dados do dono (`collection_versions`) em que
+foi calculado; a próxima rodada só refaz os donos cujo contador avançou.
+Coluna anulável: snapshots antigos ficam sem versão e são refeitos uma vez.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9b1e5d3c7a42'
+down_revision: Union[str, Sequence[str], None] = '7a4c2e9d1f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('valuation_snapshots', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('change_seq', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('valuation_snapshots', schema=None) as batch_op:
+        batch_op.drop_column('change_seq')
@@ -0,0 +1,47 @@
+"""add change feed index and coin tombstones
+
+Revision ID: b7d41c2e9a10
+Revises: 93e54cc0b811
+Create Date: 2026-01-08 21:12:04.318227
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d41c2e9a10'
+down_revision: Union[str, Sequence[str], None] = '93e54cc0b811'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'coin_tombstones',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('coin_id', sa.Integer(), nullable=False),
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], name=op.f('fk_coin_tombstones_owner_id_users'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_coin_tombstones')),
+    )
+    with op.batch_alter_table('coin_tombstones', schema=None) as batch_op:
+        batch_op.create_index('ix_coin_tombstones_owner_id_deleted_at_coin_id', ['owner_id', 'deleted_at', 'coin_id'], unique=False)
+
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.create_index('ix_coins_owner_id_updated_at_id', ['owner_id', 'updated_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.drop_index('ix_coins_owner_id_updated_at_id')
+
+    with op.batch_alter_table('coin_tombstones', schema=None) as batch_op:
+        batch_op.drop_index('ix_coin_tombstones_owner_id_deleted_at_coin_id')
+
+    op.drop_table('coin_tombstones')
@@ -0,0 +1,196 @@
+"""partition coins by owner_id (optional)
+
+Revision ID: c3a9f0d15e72
+Revises: b7d41c2e9a10
+Create Date: 2026-01-15 22:40:51.902114
+
+Reconstrói `coins` como tabela particionada por HASH (owner_id). O número de
+partições é escolhido explicitamente na execução:
+
+    alembic -x coins_partitions=8 upgrade head
+
+Sem `-x coins_partitions`, vale COINS_PARTITION_COUNT; com 0 (padrão) a
+migração não faz nada. A escolha aparece no log da migração e fica gravada
+no comentário da tabela (`obj_description('coins'::regclass)`); se `coins`
+já estiver particionada com outro número de partições, a migração avisa e
+não mexe nela.
+
+A cópia é feita online:
+1. remove sobras de uma execução interrompida e cria `coins_new`
+   (particionada) com os mesmos índices;
+2. um trigger em `coins` replica INSERT/UPDATE/DELETE para `coins_new`;
+3. os dados existentes são copiados em lotes de COINS_PARTITION_BATCH_SIZE
+   ids, cada lote em sua própria transação (FOR SHARE evita corrida com o
+   trigger);
+4. uma transação curta, com lock_timeout e novas tentativas
+   (`run_guarded`), troca as tabelas e remove a antiga.
+
+A chave primária passa a ser (id, owner_id), exigência do Postgres para
+tabelas particionadas. Consultas sem filtro por owner_id (GET /coins/{id} e a
+listagem anônima) continuam varrendo todas as partições; use
+`python -m scripts.check_partition_pruning` para conferir.
+"""
+import logging
+import time
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from core.config import settings
+from online_migrations import run_guarded
+
+logger = logging.getLogger('alembic.runtime.migration')
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9f0d15e72'
+down_revision: Union[str, Sequence[str], None] = 'b7d41c2e9a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Índices de `coins` nesta revisão: nome -> colunas.
+COINS_INDEXES = {
+    'ix_coins_id': ['id'],
+    'ix_coins_year': ['year'],
+    'ix_coins_country': ['country'],
+    'ix_coins_originality': ['originality'],
+    'ix_coins_condition': ['condition'],
+    'ix_coins_category': ['category'],
+    'ix_coins_owner_id': ['owner_id'],
+    'ix_coins_owner_id_updated_at_id': ['owner_id', 'updated_at', 'id'],
+}
+
+
+def _is_partitioned(bind) -> bool:
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'coins'::regclass"
+    )).scalar())
+
+
+def _partition_count() -> int:
+    """`-x coins_partitions=N` da linha de comando; sem ele, COINS_PARTITION_COUNT."""
+    value = context.get_x_argument(as_dictionary=True).get('coins_partitions')
+    return settings.COINS_PARTITION_COUNT if value is None else int(value)
+
+
+def _current_partitions(bind) -> int:
+    return bind.execute(sa.text(
+        "SELECT count(*) FROM pg_inherits WHERE inhparent = 'coins'::regclass"
+    )).scalar()
+
+
+def _layout(partitions: int) -> str:
+    if partitions > 0:
+        return f"HASH (owner_id), {partitions} partitions"
+    return "not partitioned"
+
+
+def _rebuild_coins(partitions: int) -> None:
+    """Reconstrói `coins` online, particionada (partitions > 0) ou simples."""
+    bind = op.get_bind()
+
+    # 1. Sobras de uma execução interrompida (a cópia recomeça do zero).
+    run_guarded(
+        "DROP TRIGGER IF EXISTS coins_sync_new ON coins",
+        "DROP FUNCTION IF EXISTS coins_sync_new()",
+        "DROP TABLE IF EXISTS coins_new",
+    )
+
+    with op.get_context().autocommit_block():
+        # Nova tabela com as mesmas colunas e defaults (inclusive a sequence de id).
+        if partitions > 0:
+            op.execute(
+                "CREATE TABLE coins_new (LIKE coins INCLUDING DEFAULTS) "
+                "PARTITION BY HASH (owner_id)"
+            )
+            for remainder in range(partitions):
+                op.execute(
+                    f"CREATE TABLE coins_new_p{remainder} PARTITION OF coins_new "
+                    f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+                )
+            op.execute("ALTER TABLE coins_new ADD CONSTRAINT pk_coins_new PRIMARY KEY (id, owner_id)")
+        else:
+            op.execute("CREATE TABLE coins_new (LIKE coins INCLUDING DEFAULTS)")
+            op.execute("ALTER TABLE coins_new ADD CONSTRAINT pk_coins_new PRIMARY KEY (id)")
+        op.execute(
+            "ALTER TABLE coins_new ADD CONSTRAINT fk_coins_new_owner_id_users "
+            "FOREIGN KEY (owner_id) REFERENCES users (id) ON DELETE CASCADE"
+        )
+        for name, columns in COINS_INDEXES.items():
+            op.execute(f"CREATE INDEX {name}_new ON coins_new ({', '.join(columns)})")
+
+        # 2. Replica escritas concorrentes enquanto a cópia acontece.
+        op.execute("""
+            CREATE OR REPLACE FUNCTION coins_sync_new() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM coins_new WHERE id = OLD.id AND owner_id = OLD.owner_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO coins_new SELECT NEW.*;
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(
+            "CREATE TRIGGER coins_sync_new AFTER INSERT OR UPDATE OR DELETE ON coins "
+            "FOR EACH ROW EXECUTE FUNCTION coins_sync_new()"
+        )
+
+        # 3. Cópia em lotes de ids; linhas inseridas depois já vêm pelo trigger.
+        max_id = bind.execute(sa.text("SELECT COALESCE(MAX(id), 0) FROM coins")).scalar()
+        batch_size = settings.COINS_PARTITION_BATCH_SIZE
+        for low in range(0, max_id, batch_size):
+            bind.execute(
+                sa.text(
+                    "INSERT INTO coins_new "
+                    "SELECT * FROM coins WHERE id > :low AND id <= :high FOR SHARE "
+                    "ON CONFLICT DO NOTHING"
+                ),
+                {"low": low, "high": low + batch_size},
+            )
+            time.sleep(settings.COINS_PARTITION_BATCH_PAUSE_SECONDS)
+
+    # 4. Troca rápida das tabelas, numa transação curta com lock_timeout e retry.
+    run_guarded(
+        "LOCK TABLE coins IN ACCESS EXCLUSIVE MODE",
+        "DROP TRIGGER coins_sync_new ON coins",
+        "DROP FUNCTION coins_sync_new()",
+        "ALTER SEQUENCE coins_id_seq OWNED BY coins_new.id",
+        "DROP TABLE coins",
+        "ALTER TABLE coins_new RENAME TO coins",
+        "ALTER TABLE coins RENAME CONSTRAINT pk_coins_new TO pk_coins",
+        "ALTER TABLE coins RENAME CONSTRAINT fk_coins_new_owner_id_users TO fk_coins_owner_id_users",
+        *(f"ALTER INDEX {name}_new RENAME TO {name}" for name in COINS_INDEXES),
+        *(f"ALTER TABLE coins_new_p{r} RENAME TO coins_p{r}" for r in range(partitions)),
+        f"COMMENT ON TABLE coins IS 'c3a9f0d15e72: {_layout(partitions)}'",
+    )
+    logger.info("coins: %s", _layout(partitions))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    partitions = _partition_count()
+    if bind.dialect.name != 'postgresql' or partitions <= 0:
+        logger.info("coins: %s (coins_partitions=%s)", _layout(0), partitions)
+        return
+    if _is_partitioned(bind):
+        current = _current_partitions(bind)
+        if current != partitions:
+            logger.warning(
+                "coins is already partitioned into %s partitions; coins_partitions=%s ignored",
+                current, partitions,
+            )
+        return
+    _rebuild_coins(partitions)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or not _is_partitioned(bind):
+        return
+    _rebuild_coins(0)
@@ -0,0 +1,41 @@
+"""add currency to coin and fx_rates table
+
+Revision ID: d8e2b6a4c019
+Revises: c3a9f0d15e72
+Create Date: 2026-01-29 20:05:13.774310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd8e2b6a4c019'
+down_revision: Union[str, Sequence[str], None] = 'c3a9f0d15e72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'fx_rates',
+        sa.Column('currency', sa.String(length=3), nullable=False),
+        sa.Column('rate_date', sa.Date(), nullable=False),
+        sa.Column('rate', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('currency', 'rate_date', name=op.f('pk_fx_rates')),
+    )
+
+    # Default constante: no Postgres 11+ não reescreve a tabela.
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('currency', sa.String(length=3), nullable=False, server_default='BRL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('coins', schema=None) as batch_op:
+        batch_op.drop_column('currency')
+
+    op.drop_table('fx_rates')
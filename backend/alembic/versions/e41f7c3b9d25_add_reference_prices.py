@@ -0,0 +1,40 @@
+"""add reference price catalog
+
+Revision ID: e41f7c3b9d25
+Revises: d8e2b6a4c019
+Create Date: 2026-02-10 19:31:47.108362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e41f7c3b9d25'
+down_revision: Union[str, Sequence[str], None] = 'd8e2b6a4c019'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'reference_prices',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('country', sa.String(length=100), nullable=False),
+        sa.Column('face_value', sa.String(length=100), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('condition', sa.String(length=100), server_default='', nullable=False),
+        sa.Column('price', sa.Float(), nullable=False),
+        sa.Column('currency', sa.String(length=3), server_default='BRL', nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id', name=op.f('pk_reference_prices')),
+        sa.UniqueConstraint('country', 'face_value', 'year', 'condition', name='uq_reference_prices_key'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('reference_prices')
@@ -0,0 +1,41 @@
+"""add valuation snapshots
+
+Revision ID: f5c0a8e7b342
+Revises: e41f7c3b9d25
+Create Date: 2026-02-24 21:48:09.551730
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5c0a8e7b342'
+down_revision: Union[str, Sequence[str], None] = 'e41f7c3b9d25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    json_type = sa.JSON().with_variant(postgresql.JSONB(), 'postgresql')
+    op.create_table(
+        'valuation_snapshots',
+        sa.Column('owner_id', sa.Integer(), nullable=False),
+        sa.Column('snapshot_date', sa.Date(), nullable=False),
+        sa.Column('total_coins', sa.Integer(), nullable=False),
+        sa.Column('total_estimated_value', sa.Float(), nullable=False),
+        sa.Column('by_originality', json_type, nullable=False),
+        sa.Column('by_country', json_type, nullable=False),
+        sa.Column('taken_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], name=op.f('fk_valuation_snapshots_owner_id_users'), ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('owner_id', 'snapshot_date', name=op.f('pk_valuation_snapshots')),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('valuation_snapshots')
@@ -0,0 +1,181 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Hashable, Iterator, Optional
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse
+from psycopg.errors import QueryCanceled
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import get_db
+from core.security import get_current_user
+from models.user import User
+
+
+class TokenBucketLimiter:
+    """Token buckets por (classe de rota, usuário), com taxa e rajada configuráveis."""
+
+    def __init__(self, rate_per_minute: Dict[str, float], burst: Dict[str, int]):
+        self.rate_per_minute = rate_per_minute
+        self.burst = burst
+        # Buckets parados por uma hora voltam cheios: podem ser descartados.
+        self._buckets = TTLCache(maxsize=100_000, ttl=3600)
+        self._lock = threading.Lock()
+
+    def acquire(self, route_class: str, key: Hashable) -> Optional[float]:
+        """Consome um token. Retorna None se permitido, ou os segundos até o próximo token."""
+        rate = self.rate_per_minute.get(route_class)
+        if not rate:
+            return None
+        capacity = self.burst.get(route_class, 1)
+        per_second = rate / 60
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated_at = self._buckets.get((route_class, key), (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * per_second)
+            if tokens < 1:
+                self._buckets.set((route_class, key), (tokens, now))
+                return (1 - tokens) / per_second
+            self._buckets.set((route_class, key), (tokens - 1, now))
+            return None
+
+
+limiter = TokenBucketLimiter(settings.ADMISSION_RATE_PER_MINUTE, settings.ADMISSION_BURST)
+semaphores = {
+    route_class: threading.BoundedSemaphore(limit)
+    for route_class, limit in settings.ADMISSION_CONCURRENCY.items()
+}
+metrics: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {"admitted": 0, "rate_limited": 0, "overloaded": 0, "in_flight": 0}
+)
+_metrics_lock = threading.Lock()
+
+
+def _count(route_class: str, name: str, delta: int = 1) -> None:
+    with _metrics_lock:
+        metrics[route_class][name] += delta
+
+
+def _reject(status_code: int, detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=status_code,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def rate_limit(route_class: str):
+    """Dependência só com o token bucket por usuário (429 + Retry-After quando esgotado)."""
+
+    def dependency(
+        request: Request,
+        current_user: Optional[User] = Depends(get_current_user),
+    ) -> None:
+        key = current_user.id if current_user else (request.client.host if request.client else None)
+        if (wait := limiter.acquire(route_class, key)) is not None:
+            _count(route_class, "rate_limited")
+            raise _reject(status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests.", wait)
+
+    return dependency
+
+
+@contextmanager
+def admission_slot(route_class: str) -> Iterator[None]:
+    """
+    Vaga no semáforo global da classe enquanto o bloco roda (503 +
+    Retry-After se não houver vaga em ADMISSION_QUEUE_TIMEOUT_SECONDS).
+    Respostas em streaming entram aqui dentro do próprio gerador, para a
+    vaga durar até o último byte.
+    """
+    semaphore = semaphores.get(route_class)
+    if semaphore is not None and not semaphore.acquire(
+        timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+    ):
+        _count(route_class, "overloaded")
+        raise _reject(status.HTTP_503_SERVICE_UNAVAILABLE, "Server busy, try again later.", 5)
+
+    _count(route_class, "admitted")
+    _count(route_class, "in_flight")
+    try:
+        yield
+    finally:
+        _count(route_class, "in_flight", -1)
+        if semaphore is not None:
+            semaphore.release()
+
+
+def set_local_statement_timeout(db: Session, route_class: str) -> None:
+    """`statement_timeout` da classe só na transação atual da sessão (Postgres)."""
+    timeout_ms = settings.STATEMENT_TIMEOUT_MS.get(route_class)
+    if timeout_ms is not None and db.get_bind().dialect.name == "postgresql":
+        db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+
+def admission(route_class: str):
+    """
+    Dependência que protege rotas pesadas (import, export, upload):
+
+    - token bucket por usuário (`rate_limit`);
+    - semáforo global da classe (`admission_slot`);
+    - `statement_timeout` do Postgres durante a requisição.
+
+    Rotas que devolvem StreamingResponse usam `rate_limit` e tomam a vaga e
+    o timeout dentro do gerador: a saída da dependência roda antes do corpo
+    ser enviado.
+    """
+
+    def dependency(
+        request: Request,
+        db: Session = Depends(get_db),
+        current_user: Optional[User] = Depends(get_current_user),
+    ):
+        rate_limit(route_class)(request, current_user)
+
+        with admission_slot(route_class):
+            timeout_ms = settings.STATEMENT_TIMEOUT_MS.get(route_class)
+            use_timeout = timeout_ms is not None and db.get_bind().dialect.name == "postgresql"
+            if use_timeout:
+                # Commit para o SET valer na sessão mesmo se a rota fizer rollback.
+                db.execute(text(f"SET statement_timeout = {int(timeout_ms)}"))
+                db.commit()
+            try:
+                yield
+            finally:
+                if use_timeout:
+                    # A conexão volta para o pool: desfaz o timeout da sessão (ou
+                    # descarta a conexão, se não for possível).
+                    try:
+                        db.rollback()
+                        db.execute(text("RESET statement_timeout"))
+                        db.commit()
+                    except DBAPIError:
+                        db.invalidate()
+
+    return dependency
+
+
+async def statement_timeout_handler(request: Request, exc: OperationalError):
+    """Consultas canceladas pelo statement_timeout viram 503 em vez de 500."""
+    if isinstance(exc.orig, QueryCanceled):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": "Query took too long, try again later."},
+            headers={"Retry-After": "30"},
+        )
+    return JSONResponse(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        content={"detail": "Internal Server Error"},
+    )
+
+
+def admission_metrics() -> Dict[str, Dict[str, int]]:
+    with _metrics_lock:
+        return {route_class: dict(counters) for route_class, counters in metrics.items()}
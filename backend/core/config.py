@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from pydantic import AnyHttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -9,6 +9,24 @@ class Settings(BaseSettings):
     API_V1_PREFIX: str = "/api/v1"
 
     DATABASE_URL: str
+    # Réplicas de leitura (opcional). GETs vão para elas; escritas vão para o primário.
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_RETRY_SECONDS: int = 30
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # Particionamento por hash de `coins` em owner_id (0 = tabela simples);
+    # `alembic -x coins_partitions=N upgrade head` tem precedência.
+    COINS_PARTITION_COUNT: int = 0
+    COINS_PARTITION_BATCH_SIZE: int = 5_000
+    COINS_PARTITION_BATCH_PAUSE_SECONDS: float = 0.05
+
+    # Migrações online (alembic/online_migrations.py)
+    MIGRATION_LOCK_TIMEOUT_MS: int = 2_000
+    MIGRATION_STATEMENT_TIMEOUT_MS: int = 60_000
+    MIGRATION_LOCK_RETRIES: int = 10
+    MIGRATION_RETRY_BACKOFF_SECONDS: float = 0.5
+    MIGRATION_BATCH_SIZE: int = 5_000
+    MIGRATION_BATCH_PAUSE_SECONDS: float = 0.05
 
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
@@ -16,6 +34,65 @@ class Settings(BaseSettings):
 
     BACKEND_CORS_ORIGINS: List[AnyHttpUrl] = []
 
+    # Logs (JSON, uma linha por registro, escritos por uma thread própria)
+    LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10_000
+    # Acima de LOG_SAMPLE_AFTER_PER_SECOND requisições bem-sucedidas por
+    # segundo, só essa fração é registrada (erros e lentas sempre são).
+    LOG_SAMPLE_AFTER_PER_SECOND: int = 50
+    LOG_SUCCESS_SAMPLE_RATE: float = 0.1
+    LOG_SLOW_REQUEST_MS: int = 1_000
+
+    # Moedas e câmbio
+    DEFAULT_CURRENCY: str = "BRL"
+    FX_BASE_CURRENCY: str = "USD"
+    FX_CACHE_TTL_SECONDS: int = 300
+
+    # Países canônicos: cache dos aliases e backfill de coins.country_code
+    COUNTRY_ALIAS_CACHE_TTL_SECONDS: int = 600
+    COUNTRY_BACKFILL_BATCH_SIZE: int = 5_000
+    COUNTRY_BACKFILL_PAUSE_SECONDS: float = 0.05
+
+    # Controle de admissão por classe de rota (import, export, upload)
+    ADMISSION_RATE_PER_MINUTE: Dict[str, float] = {"import": 6, "export": 12, "upload": 30}
+    ADMISSION_BURST: Dict[str, int] = {"import": 2, "export": 4, "upload": 10}
+    ADMISSION_CONCURRENCY: Dict[str, int] = {"import": 4, "export": 4, "upload": 16}
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 0.5
+    STATEMENT_TIMEOUT_MS: Dict[str, int] = {"import": 120_000, "export": 60_000, "upload": 10_000}
+
+    # Idempotency-Key em POST /coins, /coins/import e /coins/{id}/upload-images
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 60 * 60
+    IDEMPOTENCY_WAIT_SECONDS: float = 10
+    IDEMPOTENCY_POLL_SECONDS: float = 0.2
+    # Requisição "em andamento" há mais tempo que isso foi abandonada (worker caiu).
+    IDEMPOTENCY_LOCK_SECONDS: int = 300
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 256 * 1024
+
+    # Busca de moedas por imagem
+    IMAGE_INDEX_REFRESH_SECONDS: int = 300
+    IMAGE_SIMILARITY_MAX_DISTANCE: int = 12
+
+    # Listagem de moedas
+    FACET_MAX_BUCKETS: int = 50
+    LIST_COUNT_CACHE_TTL_SECONDS: int = 30
+    LIST_COUNT_CACHE_MAX_ENTRIES: int = 10_000
+    # Sugestões de preenchimento (índices por usuário e campo)
+    SUGGEST_INDEX_MAX_ENTRIES: int = 4_000
+    SUGGEST_INDEX_TTL_SECONDS: int = 600
+
+    # Agregações ad-hoc do dashboard
+    AGGREGATE_MAX_DIMENSIONS: int = 3
+    AGGREGATE_MAX_ROWS: int = 1_000
+    AGGREGATE_CACHE_TTL_SECONDS: int = 600
+    AGGREGATE_CACHE_MAX_ENTRIES: int = 5_000
+    # Limites das faixas de valor estimado (dimensão price_band)
+    AGGREGATE_PRICE_BANDS: List[float] = [10, 50, 100, 500, 1_000]
+
+    # Snapshot colunar da coleção em memória (resumo do dashboard e agregações)
+    COLLECTION_COLUMNS_ENABLED: bool = True
+    COLLECTION_COLUMNS_MAX_BYTES: int = 256 * 1024 * 1024
+    COLLECTION_COLUMNS_MAX_ROWS: int = 1_000_000
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
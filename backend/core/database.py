@@ -1,5 +1,12 @@
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.orm import sessionmaker, declarative_base, DeclarativeBase, declared_attr
+import itertools
+import threading
+import time
+
+from fastapi import Request
+from sqlalchemy import create_engine, MetaData, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, sessionmaker, declarative_base, DeclarativeBase, declared_attr
 
 from core.config import settings
 
@@ -11,10 +18,9 @@ NAMING_CONVENTION = {
     "pk": "pk_%(table_name)s",
 }
 
-engine = create_engine(
-    str(settings.DATABASE_URL),
-    echo=settings.DEBUG,
-)
+READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+engine = create_engine(str(settings.DATABASE_URL))
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -22,6 +28,60 @@ SessionLocal = sessionmaker(
     bind=engine,
 )
 
+
+class ReplicaSet:
+    """
+    Conjunto de réplicas de leitura escolhidas em round-robin.
+
+    Uma réplica que falha é marcada como fora do ar e só volta a ser tentada
+    (com um `SELECT 1`) depois de `retry_seconds`.
+    """
+
+    def __init__(self, urls: list[str], retry_seconds: float):
+        self.engines: list[Engine] = [
+            create_engine(url, pool_pre_ping=True) for url in urls
+        ]
+        self.retry_seconds = retry_seconds
+        self._down_until = [0.0] * len(self.engines)
+        self._cycle = itertools.cycle(range(len(self.engines)))
+        self._lock = threading.Lock()
+
+    def mark_down(self, engine_: Engine) -> None:
+        index = self.engines.index(engine_)
+        self._down_until[index] = time.monotonic() + self.retry_seconds
+
+    def _is_healthy(self, index: int) -> bool:
+        if self._down_until[index] <= 0:
+            return True
+        if self._down_until[index] > time.monotonic():
+            return False
+        try:
+            with self.engines[index].connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except DBAPIError:
+            self.mark_down(self.engines[index])
+            return False
+        self._down_until[index] = 0.0
+        return True
+
+    def choose(self) -> Engine | None:
+        """Retorna a próxima réplica saudável, ou None se nenhuma estiver disponível."""
+        for _ in range(len(self.engines)):
+            with self._lock:
+                index = next(self._cycle)
+            if self._is_healthy(index):
+                return self.engines[index]
+        return None
+
+
+replicas = ReplicaSet(settings.DATABASE_REPLICA_URLS, settings.REPLICA_RETRY_SECONDS)
+
+# Read-your-writes: o momento da última escrita vai para o cliente (cookie e
+# header) e volta nas leituras seguintes, valendo em qualquer worker.
+LAST_WRITE_COOKIE = "last_write_at"
+LAST_WRITE_HEADER = "X-Last-Write-At"
+
+
 class Base(DeclarativeBase):
     metadata = MetaData(naming_convention=NAMING_CONVENTION)
 
@@ -29,9 +89,79 @@ class Base(DeclarativeBase):
     def __tablename__(cls) -> str:
         return f"{cls.__name__.lower()}s" # Pluralizando o nome da tabela
 
-def get_db():
-    db = SessionLocal()
+
+def _wrote_recently(request: Request) -> bool:
+    """True se o cliente informou uma escrita há menos de READ_YOUR_WRITES_SECONDS."""
+    raw = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return float(raw) > time.time() - settings.READ_YOUR_WRITES_SECONDS
+    except (TypeError, ValueError):
+        return False
+
+
+def _open_read_session():
+    """Abre uma sessão em uma réplica saudável, caindo para o primário se necessário."""
+    while (replica := replicas.choose()) is not None:
+        db = SessionLocal(bind=replica)
+        try:
+            db.connection()
+            return db
+        except DBAPIError:
+            db.close()
+            replicas.mark_down(replica)
+    return SessionLocal()
+
+
+def open_session(request: Request) -> Session:
+    """
+    Abre uma sessão de banco para a requisição (quem chama fecha).
+
+    Requisições somente leitura vão para uma réplica (quando configurada), a
+    menos que o cliente tenha escrito há menos de READ_YOUR_WRITES_SECONDS
+    (ver `ReadYourWritesMiddleware`). Todas as demais usam o primário.
+    """
+    if request.method in READ_ONLY_METHODS and replicas.engines and not _wrote_recently(request):
+        return _open_read_session()
+    return SessionLocal()
+
+
+def get_db(request: Request):
+    """Sessão de banco para a requisição atual (ver `open_session`)."""
+    db = open_session(request)
     try:
         yield db
     finally:
         db.close()
+
+
+class ReadYourWritesMiddleware:
+    """
+    Middleware ASGI que marca as respostas de escrita bem-sucedidas com o
+    momento em que foram enviadas (depois do commit), no cookie
+    LAST_WRITE_COOKIE e no header LAST_WRITE_HEADER. Clientes sem cookies
+    devolvem o header nas leituras seguintes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in READ_ONLY_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_last_write(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                now = f"{time.time():.3f}".encode()
+                cookie = (
+                    f"{LAST_WRITE_COOKIE}={now.decode()}; Max-Age={settings.READ_YOUR_WRITES_SECONDS}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                ).encode()
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (LAST_WRITE_HEADER.lower().encode(), now),
+                    (b"set-cookie", cookie),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_last_write)
@@ -0,0 +1,296 @@
+import hashlib
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from fastapi import Depends, Header, HTTPException, Request, status
+from fastapi.responses import Response
+from sqlalchemy import delete, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import UploadFile
+
+from core.config import settings
+from core.database import SessionLocal
+from core.security import get_current_user
+from models.idempotency import IdempotencyKey
+from models.user import User
+
+
+class IdempotencyClaim(NamedTuple):
+    owner_id: int
+    key: str
+    fingerprint: str
+
+
+class StoredResponse(NamedTuple):
+    fingerprint: str
+    status_code: Optional[int]
+    body: Optional[bytes]
+
+
+class IdempotentReplay(Exception):
+    """Levantada pela dependência quando a chave já tem resposta guardada."""
+
+    def __init__(self, stored: StoredResponse):
+        self.stored = stored
+
+
+# Requisições em andamento neste processo: duplicatas locais esperam no
+# evento em vez de consultar o banco a cada IDEMPOTENCY_POLL_SECONDS.
+_in_flight: Dict[Tuple[int, str], threading.Event] = {}
+_in_flight_lock = threading.Lock()
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _body_digest(
+    request: Request, idempotency_key: Optional[str] = Header(None, max_length=255)
+) -> str:
+    """
+    SHA-256 do corpo da requisição, só quando há Idempotency-Key. Em
+    multipart, hash dos campos e do conteúdo dos arquivos, lidos em blocos
+    e rebobinados para a rota.
+    """
+    if not idempotency_key:
+        return ""
+    digest = hashlib.sha256()
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        for name, value in (await request.form()).multi_items():
+            digest.update(f"{name}={getattr(value, 'filename', '')}\n".encode())
+            if isinstance(value, UploadFile):
+                while chunk := await value.read(1 << 20):
+                    digest.update(chunk)
+                await value.seek(0)
+            else:
+                digest.update(value.encode())
+            digest.update(b"\n")
+    else:
+        digest.update(await request.body())
+    return digest.hexdigest()
+
+
+def _fingerprint(request: Request, body_digest: str) -> str:
+    """Rota, parâmetros e corpo: a mesma chave com outro conteúdo não é repetição."""
+    target = f"{request.method} {request.url.path}?{request.url.query}\n{body_digest}"
+    return hashlib.sha256(target.encode()).hexdigest()
+
+
+def _load(db: Session, owner_id: int, key: str) -> Optional[StoredResponse]:
+    """Resposta guardada (ou em andamento); linhas expiradas ou abandonadas são apagadas."""
+    now = _now()
+    db.execute(
+        delete(IdempotencyKey).where(
+            IdempotencyKey.owner_id == owner_id,
+            IdempotencyKey.key == key,
+            or_(
+                IdempotencyKey.expires_at < now,
+                IdempotencyKey.status_code.is_(None)
+                & (IdempotencyKey.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)),
+            ),
+        )
+    )
+    db.commit()
+    row = db.execute(
+        select(IdempotencyKey.fingerprint, IdempotencyKey.status_code, IdempotencyKey.body).where(
+            IdempotencyKey.owner_id == owner_id, IdempotencyKey.key == key
+        )
+    ).first()
+    return StoredResponse(*row) if row else None
+
+
+def _claim(claim: IdempotencyClaim) -> Optional[StoredResponse]:
+    """
+    Reserva a chave gravando uma linha "em andamento" (numa transação própria,
+    visível para os outros workers). Retorna None se reservou, ou a linha
+    existente.
+    """
+    with SessionLocal() as db:
+        while True:
+            stored = _load(db, claim.owner_id, claim.key)
+            if stored is not None:
+                return stored
+            now = _now()
+            db.add(
+                IdempotencyKey(
+                    owner_id=claim.owner_id,
+                    key=claim.key,
+                    fingerprint=claim.fingerprint,
+                    created_at=now,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+                )
+            )
+            try:
+                db.commit()
+            except IntegrityError:
+                # Outra requisição reservou primeiro.
+                db.rollback()
+                continue
+            with _in_flight_lock:
+                _in_flight[(claim.owner_id, claim.key)] = threading.Event()
+            return None
+
+
+def _finish(claim: IdempotencyClaim, status_code: Optional[int], body: bytes = b"") -> None:
+    """Guarda a resposta (ou, sem `status_code`, libera a chave) e acorda quem espera."""
+    where = (
+        IdempotencyKey.owner_id == claim.owner_id,
+        IdempotencyKey.key == claim.key,
+        IdempotencyKey.status_code.is_(None),
+    )
+    try:
+        with SessionLocal() as db:
+            if status_code is None:
+                db.execute(delete(IdempotencyKey).where(*where))
+            else:
+                db.execute(
+                    update(IdempotencyKey)
+                    .where(*where)
+                    .values(
+                        status_code=status_code,
+                        body=zlib.compress(body),
+                        expires_at=_now() + timedelta(seconds=settings.IDEMPOTENCY_TTL_SECONDS),
+                    )
+                )
+            db.commit()
+    finally:
+        with _in_flight_lock:
+            event = _in_flight.pop((claim.owner_id, claim.key), None)
+        if event is not None:
+            event.set()
+
+
+def idempotent(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
+    body_digest: str = Depends(_body_digest),
+    current_user: Optional[User] = Depends(get_current_user),
+):
+    """
+    Dependência para POSTs que os clientes repetem após timeout. Com o header
+    Idempotency-Key:
+
+    - a primeira requisição reserva a chave e sua resposta é guardada por
+      IDEMPOTENCY_TTL_SECONDS (pelo `IdempotencyMiddleware`);
+    - repetições recebem a resposta guardada sem executar a rota;
+    - duplicatas concorrentes esperam a original terminar (até
+      IDEMPOTENCY_WAIT_SECONDS, depois 409 + Retry-After);
+    - a mesma chave em outra rota, com outros parâmetros ou outro corpo
+      (JSON ou arquivos enviados) dá 422.
+
+    Deve vir antes de `admission(...)`, para repetições não consumirem vagas.
+    """
+    if not idempotency_key or current_user is None:
+        return
+
+    claim = IdempotencyClaim(current_user.id, idempotency_key, _fingerprint(request, body_digest))
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while (stored := _claim(claim)) is not None:
+        if stored.fingerprint != claim.fingerprint:
+            raise HTTPException(
+                status.HTTP_422_UNPROCESSABLE_ENTITY,
+                "Idempotency-Key was already used for a different request.",
+            )
+        if stored.status_code is not None:
+            raise IdempotentReplay(stored)
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise HTTPException(
+                status.HTTP_409_CONFLICT,
+                "A request with this Idempotency-Key is still in progress.",
+                headers={"Retry-After": "1"},
+            )
+        with _in_flight_lock:
+            event = _in_flight.get((claim.owner_id, claim.key))
+        if event is not None:
+            event.wait(remaining)
+        else:
+            # A original está em outro worker.
+            time.sleep(min(remaining, settings.IDEMPOTENCY_POLL_SECONDS))
+
+    request.state.idempotency = claim
+
+
+async def idempotent_replay_handler(request: Request, exc: IdempotentReplay):
+    return Response(
+        content=zlib.decompress(exc.stored.body),
+        status_code=exc.stored.status_code,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _storable(status_code: int) -> bool:
+    """Erros transitórios (5xx, 408, 429) liberam a chave para a próxima tentativa."""
+    return status_code < 500 and status_code not in (408, 429)
+
+
+class IdempotencyMiddleware:
+    """
+    Middleware ASGI que guarda a resposta das requisições cuja chave foi
+    reservada por `idempotent`. Respostas maiores que
+    IDEMPOTENCY_MAX_RESPONSE_BYTES não são guardadas (a chave é liberada).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        status_code: Optional[int] = None
+        chunks, size = [], 0
+
+        async def capture(message):
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body" and "idempotency" in scope.get("state", {}):
+                body = message.get("body", b"")
+                size += len(body)
+                if size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    chunks.append(body)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            claim = scope.get("state", {}).get("idempotency")
+            if claim is not None:
+                keep = (
+                    status_code is not None
+                    and _storable(status_code)
+                    and size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES
+                )
+                if keep:
+                    await run_in_threadpool(_finish, claim, status_code, b"".join(chunks))
+                else:
+                    await run_in_threadpool(_finish, claim, None)
+
+
+def purge_expired(db: Session, batch_size: int = 5_000) -> int:
+    """Apaga as chaves expiradas em lotes, um commit por lote. Retorna quantas foram apagadas."""
+    purged = 0
+    while True:
+        expired = (
+            select(IdempotencyKey.owner_id, IdempotencyKey.key)
+            .where(IdempotencyKey.expires_at < _now())
+            .limit(batch_size)
+        )
+        deleted = db.execute(
+            delete(IdempotencyKey).where(
+                tuple_(IdempotencyKey.owner_id, IdempotencyKey.key).in_(expired)
+            )
+        ).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
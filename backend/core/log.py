@@ -0,0 +1,217 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+import traceback
+import uuid
+from datetime import timezone
+from typing import Any, Dict, Optional, TextIO
+
+from loguru import logger
+
+from core.config import settings
+
+
+class QueueSink:
+    """
+    Sink do loguru que só enfileira o registro: a serialização em JSON e a
+    escrita acontecem numa thread própria, então quem loga (inclusive as
+    threads das requisições) nunca espera por I/O. A fila é limitada; quando
+    está cheia o registro é descartado e contado.
+    """
+
+    def __init__(self, stream: TextIO, maxsize: int):
+        self.stream = stream
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        self.counters = {"written": 0, "dropped": 0, "sampled_out": 0}
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.counters[name] += 1
+
+    def write(self, message) -> None:
+        try:
+            self._queue.put_nowait(message.record)
+        except queue.Full:
+            self.count("dropped")
+
+    def _run(self) -> None:
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                self.stream.write(format_record(record) + "\n")
+                # Só força o flush quando a fila esvazia, para agrupar as escritas.
+                if self._queue.empty():
+                    self.stream.flush()
+                self.count("written")
+            except Exception:  # noqa: BLE001  (o logger não pode derrubar a thread)
+                self.count("dropped")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Escreve o que ainda está na fila e encerra a thread."""
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self.counters, "queued": self._queue.qsize()}
+
+
+def format_record(record: Dict[str, Any]) -> str:
+    """Uma linha JSON por registro, com os campos de contexto (request_id, user_id...)."""
+    line = {
+        "time": record["time"].astimezone(timezone.utc).isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "message": record["message"],
+        **record["extra"],
+    }
+    if record["exception"] is not None:
+        exc_type, exc_value, tb = record["exception"]
+        line["exception"] = "".join(traceback.format_exception(exc_type, exc_value, tb))
+    return json.dumps(line, default=str, ensure_ascii=False)
+
+
+class InterceptHandler(logging.Handler):
+    """Encaminha o `logging` da biblioteca padrão (uvicorn, SQLAlchemy) para o loguru."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            level = logger.level(record.levelname).name
+        except ValueError:
+            level = record.levelno
+        logger.patch(lambda r: r.update(name=record.name)).opt(
+            exception=record.exc_info
+        ).log(level, record.getMessage())
+
+
+class SuccessSampler:
+    """
+    Amostragem dos logs de sucesso: até LOG_SAMPLE_AFTER_PER_SECOND por
+    segundo todos são mantidos; acima disso, só a fração
+    LOG_SUCCESS_SAMPLE_RATE. Erros (5xx) e requisições lentas não passam
+    por aqui.
+    """
+
+    def __init__(self, keep_per_second: int, rate: float):
+        self.keep_per_second = keep_per_second
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._second = 0
+        self._seen = 0
+
+    def keep(self) -> bool:
+        second = int(time.monotonic())
+        with self._lock:
+            if second != self._second:
+                self._second, self._seen = second, 0
+            self._seen += 1
+            seen = self._seen
+        return seen <= self.keep_per_second or random.random() < self.rate
+
+
+sink: Optional[QueueSink] = None
+sampler = SuccessSampler(settings.LOG_SAMPLE_AFTER_PER_SECOND, settings.LOG_SUCCESS_SAMPLE_RATE)
+
+
+def setup_logging() -> None:
+    """Configura o loguru com o sink assíncrono e captura o `logging` padrão."""
+    global sink
+    if sink is not None:
+        return
+    sink = QueueSink(sys.stdout, settings.LOG_QUEUE_SIZE)
+    logger.remove()
+    logger.add(sink.write, level=settings.LOG_LEVEL, format="{message}", catch=False)
+
+    logging.basicConfig(
+        handlers=[InterceptHandler()], level=logging.getLevelName(settings.LOG_LEVEL), force=True
+    )
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        logging.getLogger(name).handlers = [InterceptHandler()]
+        logging.getLogger(name).propagate = False
+    # Nosso middleware já registra cada requisição.
+    logging.getLogger("uvicorn.access").disabled = True
+    # SQL em modo DEBUG passa pela fila, em vez do handler síncrono do `echo`.
+    logging.getLogger("sqlalchemy.engine").setLevel(
+        logging.INFO if settings.DEBUG else logging.WARNING
+    )
+
+
+def shutdown_logging() -> None:
+    if sink is not None:
+        sink.stop()
+
+
+def logging_metrics() -> Dict[str, int]:
+    return sink.stats() if sink is not None else {}
+
+
+class RequestLogMiddleware:
+    """
+    Middleware ASGI que registra uma linha por requisição com request id,
+    usuário, rota, status e latência. O request id vem do header
+    X-Request-ID (ou é gerado) e volta na resposta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        with logger.contextualize(request_id=request_id):
+            try:
+                await self.app(scope, receive, send_with_request_id)
+            except Exception:
+                self._log(scope, status_code, started, error=True)
+                raise
+            self._log(scope, status_code, started)
+
+    def _log(self, scope, status_code: int, started: float, error: bool = False) -> None:
+        latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        slow = latency_ms >= settings.LOG_SLOW_REQUEST_MS
+        failed = error or status_code >= 500
+        if not (failed or slow or sampler.keep()):
+            if sink is not None:
+                sink.count("sampled_out")
+            return
+
+        route = scope.get("route")
+        fields = {
+            "user_id": scope.get("state", {}).get("user_id"),
+            "method": scope["method"],
+            "route": getattr(route, "path", None) or scope["path"],
+            "status": status_code,
+            "latency_ms": latency_ms,
+        }
+        level = "ERROR" if failed else "WARNING" if slow else "INFO"
+        logger.bind(**fields).opt(exception=error).log(
+            level, f"{fields['method']} {fields['route']} {status_code} {latency_ms}ms"
+        )
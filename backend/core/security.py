@@ -4,7 +4,7 @@ from typing import Any, Optional
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy import select
 from sqlalchemy.orm import Session
@@ -45,6 +45,7 @@ def create_access_token(user_id: int, expires_delta: timedelta | None = None) ->
 
 
 def get_current_user(
+    request: Request,
     token: Optional[str] = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
 ) -> Optional[User]:
@@ -77,4 +78,6 @@ def get_current_user(
     if user is None:
         return None
 
+    # Para o log da requisição.
+    request.state.user_id = user.id
     return user
@@ -3,20 +3,30 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from loguru import logger
 
+from sqlalchemy.exc import OperationalError
+
+from core.admission import statement_timeout_handler
 from core.config import settings
+from core.database import LAST_WRITE_HEADER, ReadYourWritesMiddleware
+from core.idempotency import IdempotencyMiddleware, IdempotentReplay, idempotent_replay_handler
+from core.log import RequestLogMiddleware, setup_logging, shutdown_logging
 from routers import auth, coins, dashboard, health
 
 MEDIA_DIR = "media"
 
+setup_logging()
+
 # Context manager para eventos de startup e shutdown da aplicação.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("INFO:     Iniciando a aplicação...")
+    logger.info("Iniciando a aplicação...")
     os.makedirs(os.path.join(MEDIA_DIR, "coins"), exist_ok=True)
-    print(f"INFO:     Diretório de mídia '{MEDIA_DIR}/coins' verificado/criado.")
+    logger.info(f"Diretório de mídia '{MEDIA_DIR}/coins' verificado/criado.")
     yield
-    print("INFO:     Encerrando a aplicação...")
+    logger.info("Encerrando a aplicação...")
+    shutdown_logging()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -33,8 +43,15 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=[LAST_WRITE_HEADER],
     )
 
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(IdempotencyMiddleware)
+app.add_middleware(RequestLogMiddleware)
+app.add_exception_handler(OperationalError, statement_timeout_handler)
+app.add_exception_handler(IdempotentReplay, idempotent_replay_handler)
+
 app.mount(f"/{MEDIA_DIR}", StaticFiles(directory=MEDIA_DIR), name="media")
 
 api_router = APIRouter(prefix=settings.API_V1_PREFIX)
@@ -0,0 +1,37 @@
+from datetime import datetime
+from sqlalchemy import DateTime, Float, Integer, String, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from core.config import settings
+from core.database import Base
+
+
+class ReferencePrice(Base):
+    """
+    Preço de referência de uma moeda no catálogo.
+
+    As chaves (country, face_value, condition) são gravadas normalizadas
+    (minúsculas, sem espaços nas pontas); condition vazia vale para moedas
+    sem estado de conservação informado.
+    """
+
+    __tablename__ = "reference_prices"
+    __table_args__ = (
+        UniqueConstraint(
+            "country", "face_value", "year", "condition",
+            name="uq_reference_prices_key",
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    country: Mapped[str] = mapped_column(String(100))
+    face_value: Mapped[str] = mapped_column(String(100))
+    year: Mapped[int] = mapped_column(Integer)
+    condition: Mapped[str] = mapped_column(String(100), default="", server_default="")
+    price: Mapped[float] = mapped_column(Float)
+    currency: Mapped[str] = mapped_column(
+        String(3), default=settings.DEFAULT_CURRENCY, server_default=settings.DEFAULT_CURRENCY
+    )
+
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
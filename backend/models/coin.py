@@ -1,17 +1,24 @@
 import enum
-from datetime import datetime
+from datetime import date, datetime
 from typing import TYPE_CHECKING
 from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Date,
     DateTime,
     Enum,
+    FetchedValue,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
+    event,
     func,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
+from core.config import settings
 from core.database import Base
 
 if TYPE_CHECKING:
@@ -25,13 +32,30 @@ class OriginalityEnum(str, enum.Enum):
 
 
 class Coin(Base):
+    __table_args__ = (
+        # Moedas alteradas desde um instante.
+        Index("ix_coins_owner_id_updated_at_id", "owner_id", "updated_at", "id"),
+        # Feed de alterações: varredura por dono em ordem de commit.
+        Index("ix_coins_owner_id_change_seq", "owner_id", "change_seq"),
+        # Filtro e agrupamento por país canônico.
+        Index("ix_coins_owner_id_country_code", "owner_id", "country_code"),
+    )
+
     id: Mapped[int] = mapped_column(primary_key=True, index=True)
     quantity: Mapped[int] = mapped_column(Integer)
     year: Mapped[int] = mapped_column(index=True)
     country: Mapped[str] = mapped_column(String(100), index=True)
+    # País canônico (ISO 3166-1), resolvido a partir de `country` pelos aliases
+    country_code: Mapped[str | None] = mapped_column(
+        ForeignKey("countries.code", ondelete="SET NULL")
+    )
     face_value: Mapped[str] = mapped_column(String(100))
     purchase_price: Mapped[float | None] = mapped_column(Float)
     estimated_value: Mapped[float | None] = mapped_column(Float)
+    # Moeda (ISO 4217) de purchase_price e estimated_value
+    currency: Mapped[str] = mapped_column(
+        String(3), default=settings.DEFAULT_CURRENCY, server_default=settings.DEFAULT_CURRENCY
+    )
     originality: Mapped[OriginalityEnum] = mapped_column(
         Enum(OriginalityEnum),
         default=OriginalityEnum.ORIGINAL,
@@ -45,6 +69,9 @@ class Coin(Base):
     notes: Mapped[str | None] = mapped_column(Text)
     image_url_front: Mapped[str | None] = mapped_column(String(500))
     image_url_back: Mapped[str | None] = mapped_column(String(500))
+    # Hash perceptual (dHash de 64 bits) das imagens, para busca por semelhança
+    image_hash_front: Mapped[int | None] = mapped_column(BigInteger)
+    image_hash_back: Mapped[int | None] = mapped_column(BigInteger)
 
     # Foreign Key
     owner_id: Mapped[int] = mapped_column(
@@ -58,6 +85,132 @@ class Coin(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
     )
+    # Posição no feed de alterações, preenchida por trigger (ver CollectionVersion).
+    change_seq: Mapped[int | None] = mapped_column(
+        BigInteger, server_default=FetchedValue(), server_onupdate=FetchedValue()
+    )
 
     # Relationship
     owner: Mapped["User"] = relationship(back_populates="coins")
+
+
+def natural_key(source) -> tuple:
+    """
+    Chave natural normalizada de uma moeda: país, valor facial e estado sem
+    diferenciar maiúsculas nem espaços nas pontas (estado vazio = sem estado).
+    `source` é `Coin` ou qualquer objeto com as mesmas colunas (por exemplo,
+    valores literais de uma linha ainda não inserida). É a mesma expressão do
+    índice ix_coins_natural_key, do relatório de duplicatas e do upsert.
+    """
+    return (
+        source.owner_id,
+        func.lower(func.trim(source.country)),
+        source.year,
+        func.lower(func.trim(source.face_value)),
+        func.coalesce(func.lower(func.trim(source.condition)), ""),
+        source.originality,
+    )
+
+
+# Busca da moeda igual no upsert opcional; não é único (ver find_duplicates).
+Index("ix_coins_natural_key", *natural_key(Coin))
+
+
+class CoinTombstone(Base):
+    """Registro de uma moeda excluída, usado pelo feed de alterações."""
+
+    __tablename__ = "coin_tombstones"
+    __table_args__ = (
+        Index("ix_coin_tombstones_owner_id_deleted_at_coin_id", "owner_id", "deleted_at", "coin_id"),
+        Index("ix_coin_tombstones_owner_id_change_seq", "owner_id", "change_seq"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    coin_id: Mapped[int] = mapped_column(Integer)
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE")
+    )
+    deleted_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    change_seq: Mapped[int | None] = mapped_column(BigInteger, server_default=FetchedValue())
+
+
+class CollectionVersion(Base):
+    """
+    Contador de alterações da coleção de um usuário. Um trigger em coins e
+    coin_tombstones o incrementa e grava o valor em `change_seq` da linha.
+    No Postgres, `collection_change_seq` incrementa uma vez por transação
+    (`xact_id`): as demais escritas da mesma transação só leem o valor, sem
+    gerar nova versão da linha. O lock da linha vai até o commit, então a
+    sequência segue a ordem de commit das escritas do usuário. No SQLite
+    (desenvolvimento) o trigger incrementa a cada linha.
+    """
+
+    __tablename__ = "collection_versions"
+
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    change_seq: Mapped[int] = mapped_column(BigInteger)
+    # Transação que fez o último incremento (txid_current(), só no Postgres).
+    xact_id: Mapped[int | None] = mapped_column(BigInteger)
+
+
+# Mesmo SQL da migration 7a4c2e9d1f36, para tabelas criadas com create_all.
+CHANGE_SEQ_FUNCTION = """
+CREATE OR REPLACE FUNCTION collection_change_seq() RETURNS trigger AS $$
+BEGIN
+    SELECT change_seq INTO NEW.change_seq FROM collection_versions
+    WHERE owner_id = NEW.owner_id AND xact_id = txid_current();
+    IF NOT FOUND THEN
+        INSERT INTO collection_versions (owner_id, change_seq, xact_id)
+        VALUES (NEW.owner_id, 1, txid_current())
+        ON CONFLICT (owner_id) DO UPDATE
+        SET change_seq = collection_versions.change_seq + 1, xact_id = EXCLUDED.xact_id
+        RETURNING change_seq INTO NEW.change_seq;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+"""
+
+
+def change_seq_triggers(table: str, dialect: str) -> list[str]:
+    """DDL dos triggers que preenchem `change_seq` de `table` no dialeto dado."""
+    if dialect == "postgresql":
+        return [
+            CHANGE_SEQ_FUNCTION,
+            f"CREATE OR REPLACE TRIGGER {table}_change_seq BEFORE INSERT OR UPDATE ON {table} "
+            f"FOR EACH ROW EXECUTE FUNCTION collection_change_seq()",
+        ]
+    # O SQLite não altera NEW: o trigger AFTER grava o valor com um UPDATE, e o
+    # WHEN impede que esse UPDATE incremente o contador de novo.
+    bump = f"""
+    INSERT INTO collection_versions (owner_id, change_seq) VALUES (NEW.owner_id, 1)
+    ON CONFLICT (owner_id) DO UPDATE SET change_seq = change_seq + 1;
+    UPDATE {table} SET change_seq = (
+        SELECT change_seq FROM collection_versions WHERE owner_id = NEW.owner_id
+    ) WHERE id = NEW.id;
+    """
+    return [
+        f"CREATE TRIGGER {table}_change_seq_insert AFTER INSERT ON {table} BEGIN {bump} END",
+        f"CREATE TRIGGER {table}_change_seq_update AFTER UPDATE ON {table} "
+        f"WHEN NEW.change_seq IS OLD.change_seq BEGIN {bump} END",
+    ]
+
+
+for _table in (Coin.__table__, CoinTombstone.__table__):
+    for _dialect in ("postgresql", "sqlite"):
+        for _statement in change_seq_triggers(_table.name, _dialect):
+            event.listen(_table, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+
+class FxRate(Base):
+    """Cotação de uma moeda em uma data: unidades de `currency` por 1 FX_BASE_CURRENCY."""
+
+    __tablename__ = "fx_rates"
+
+    currency: Mapped[str] = mapped_column(String(3), primary_key=True)
+    rate_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    rate: Mapped[float] = mapped_column(Float)
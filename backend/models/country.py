@@ -0,0 +1,26 @@
+from sqlalchemy import ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column
+from core.database import Base
+
+
+class Country(Base):
+    """País canônico (ISO 3166-1 alfa-2)."""
+
+    __tablename__ = "countries"
+
+    code: Mapped[str] = mapped_column(String(2), primary_key=True)
+    name: Mapped[str] = mapped_column(String(100))
+
+
+class CountryAlias(Base):
+    """
+    Nome alternativo de um país, gravado normalizado (minúsculas, sem espaços
+    nas pontas). Inclui o nome canônico, o código e a grafia sem acentos.
+    """
+
+    __tablename__ = "country_aliases"
+
+    alias: Mapped[str] = mapped_column(String(100), primary_key=True)
+    country_code: Mapped[str] = mapped_column(
+        ForeignKey("countries.code", ondelete="CASCADE"), index=True
+    )
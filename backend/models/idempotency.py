@@ -0,0 +1,29 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import DateTime, ForeignKey, Integer, LargeBinary, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+from core.database import Base
+
+
+class IdempotencyKey(Base):
+    """
+    Resposta guardada de uma requisição com header Idempotency-Key (uma linha
+    por usuário e chave). `status_code` nulo indica requisição em andamento.
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    # Método e caminho da requisição original (sha256).
+    fingerprint: Mapped[str] = mapped_column(String(64))
+    status_code: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    # Corpo JSON comprimido com zlib.
+    body: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)
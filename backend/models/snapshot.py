@@ -0,0 +1,30 @@
+from datetime import date, datetime
+from typing import Any
+from sqlalchemy import JSON, BigInteger, Date, DateTime, Float, ForeignKey, Integer, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from core.database import Base
+
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+
+class ValuationSnapshot(Base):
+    """Rollup diário da coleção de um usuário (uma linha por usuário e dia)."""
+
+    __tablename__ = "valuation_snapshots"
+
+    owner_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    snapshot_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    total_coins: Mapped[int] = mapped_column(Integer)
+    # Em DEFAULT_CURRENCY
+    total_estimated_value: Mapped[float] = mapped_column(Float)
+    by_originality: Mapped[dict[str, Any]] = mapped_column(JSONType)
+    by_country: Mapped[dict[str, Any]] = mapped_column(JSONType)
+
+    taken_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now()
+    )
+    # Versão dos dados do dono (CollectionVersion) usada no cálculo.
+    change_seq: Mapped[int | None] = mapped_column(BigInteger)
@@ -1,33 +1,67 @@
 import csv
 import io
+import itertools
+import math
 import os
 import uuid
-from datetime import datetime
+from datetime import date, datetime
+from functools import partial
 from typing import List, Optional
 
+import numpy as np
 from fastapi import (
     APIRouter,
     Depends,
     HTTPException,
     Query,
+    Request,
     status,
     UploadFile,
     File,
 )
 from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy import func, select, or_
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import Session
 
-from core.database import get_db
+from core.admission import admission, admission_slot, rate_limit, set_local_statement_timeout
+from core.cache import TTLCache
+from core.config import settings
+from core.database import get_db, open_session
+from core.idempotency import idempotent
 from core.security import get_current_user
-from models.coin import Coin, OriginalityEnum
+from models.coin import Coin, CoinTombstone, OriginalityEnum
 from models.user import User
-from schemas.coin import CoinCreate, CoinRead, CoinUpdate
+from schemas.coin import CoinChanges, CoinCreate, CoinMatch, CoinMerge, CoinRead, CoinUpdate
 from schemas.common import PaginatedResponse, PaginationMeta
+from services.catalog_service import revaluate_coins
+from services.coin_service import (
+    DUPLICATE_MODES,
+    FACET_FIELDS,
+    compute_facets,
+    data_version,
+    estimate_count,
+    find_duplicates,
+    list_changes,
+    merge_coin,
+    merge_duplicates,
+    upsert_coins,
+)
+from services.columnar_service import COLUMNAR_FORMATS, columnar_rows, stream_export
+from services.country_service import assign_country_codes, resolve_country_code
+from services.image_hash_service import dhash, image_index
+from services.suggest_service import SUGGEST_FIELDS, suggest_values, suggestions
+from services.valuation_service import RATE_BASIS, get_fx_table, normalize_currency, rate_days
 
 router = APIRouter(prefix="/coins", tags=["coins"])
 MEDIA_DIR = "media/coins"
 
+# Contagens exatas da listagem, por usuário, versão dos dados e filtros.
+_count_cache = TTLCache(
+    maxsize=settings.LIST_COUNT_CACHE_MAX_ENTRIES,
+    ttl=settings.LIST_COUNT_CACHE_TTL_SECONDS,
+)
+
 
 def get_coin_or_404(db: Session, coin_id: int, user_id: int) -> Coin:
     """Busca uma moeda pelo ID, garantindo que ela pertença ao usuário. Falha com 404 caso contrário."""
@@ -40,16 +74,35 @@ def get_coin_or_404(db: Session, coin_id: int, user_id: int) -> Coin:
     return coin
 
 
-@router.post("", response_model=CoinRead, status_code=status.HTTP_201_CREATED)
+@router.post("", response_model=CoinRead, status_code=status.HTTP_201_CREATED, dependencies=[Depends(idempotent)])
 def create_coin(
     coin_in: CoinCreate,
+    merge: bool = Query(False, description="Add the quantity to an identical existing coin"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    coin = Coin(**coin_in.model_dump(), owner_id=current_user.id)
+    if merge:
+        coin = merge_coin(
+            db,
+            {
+                **coin_in.model_dump(),
+                "owner_id": current_user.id,
+                "country_code": resolve_country_code(db, coin_in.country),
+            },
+        )
+        db.commit()
+        suggestions.invalidate(current_user.id)
+        return coin
+
+    coin = Coin(
+        **coin_in.model_dump(),
+        owner_id=current_user.id,
+        country_code=resolve_country_code(db, coin_in.country),
+    )
     db.add(coin)
     db.commit()
     db.refresh(coin)
+    suggestions.record(current_user.id, new=suggest_values(coin))
     return coin
 
 
@@ -59,43 +112,178 @@ def list_coins(
     current_user: Optional[User] = Depends(get_current_user),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
-    country: Optional[str] = Query(None),
+    country: Optional[str] = Query(None, description="Country name, alias or ISO code"),
+    country_code: Optional[str] = Query(None, min_length=2, max_length=2),
     year_from: Optional[int] = Query(None),
     year_to: Optional[int] = Query(None),
     originality: Optional[OriginalityEnum] = Query(None),
+    category: Optional[str] = Query(None),
+    condition: Optional[str] = Query(None),
     search: Optional[str] = Query(None, description="Search in country, value, and notes"),
+    facets: Optional[str] = Query(
+        None,
+        description=f"Comma-separated facets to count: {', '.join(FACET_FIELDS)}",
+    ),
+    include_total: str = Query("exact", enum=["exact", "estimated", "none"]),
 ):
-    base_query = select(Coin)
+    facet_fields: List[str] = []
+    if facets:
+        facet_fields = list(dict.fromkeys(f.strip() for f in facets.split(",") if f.strip()))
+        invalid = [f for f in facet_fields if f not in FACET_FIELDS]
+        if invalid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Invalid facets: {', '.join(invalid)}",
+            )
+
+    # Filtros gerais e filtros por dimensão (usados pelas facetas).
+    base_conditions = []
     if current_user:
-        base_query = base_query.where(Coin.owner_id == current_user.id)
-
-    if country:
-        base_query = base_query.where(Coin.country.ilike(f"%{country}%"))
-    if year_from is not None:
-        base_query = base_query.where(Coin.year >= year_from)
-    if year_to is not None:
-        base_query = base_query.where(Coin.year <= year_to)
-    if originality:
-        base_query = base_query.where(Coin.originality == originality)
+        base_conditions.append(Coin.owner_id == current_user.id)
     if search:
         like = f"%{search}%"
-        base_query = base_query.where(
+        base_conditions.append(
             or_(Coin.country.ilike(like), Coin.face_value.ilike(like), Coin.notes.ilike(like))
         )
 
-    count_query = select(func.count()).select_from(base_query.subquery())
-    total_items = db.scalar(count_query) or 0
-    total_pages = (total_items + page_size - 1) // page_size
+    facet_conditions = {field: [] for field in FACET_FIELDS}
+    # País reconhecido vira igualdade no código (indexado); senão, busca no
+    # texto. Com `country` e `country_code`, valem os dois filtros.
+    if country_code:
+        facet_conditions["country_code"].append(Coin.country_code == country_code.upper())
+    code = resolve_country_code(db, country) if country else None
+    if code:
+        facet_conditions["country_code"].append(Coin.country_code == code)
+    elif country:
+        facet_conditions["country"].append(Coin.country.ilike(f"%{country}%"))
+    if year_from is not None:
+        facet_conditions["year"].append(Coin.year >= year_from)
+    if year_to is not None:
+        facet_conditions["year"].append(Coin.year <= year_to)
+    if originality:
+        facet_conditions["originality"].append(Coin.originality == originality)
+    if category:
+        facet_conditions["category"].append(Coin.category == category)
+    if condition:
+        facet_conditions["condition"].append(Coin.condition == condition)
+
+    base_query = select(Coin).where(
+        *base_conditions,
+        *(p for predicates in facet_conditions.values() for p in predicates),
+    )
 
+    # Busca uma linha a mais para saber se existe próxima página sem contar tudo.
     items_query = (
         base_query.order_by(Coin.year.desc(), Coin.country)
         .offset((page - 1) * page_size)
-        .limit(page_size)
+        .limit(page_size + 1)
     )
     coins = db.execute(items_query).scalars().all()
+    has_next = len(coins) > page_size
+    coins = coins[:page_size]
+
+    total_items: Optional[int] = None
+    # A estimativa vem do planejador do Postgres; nos outros bancos, conta.
+    estimated = include_total == "estimated" and db.get_bind().dialect.name == "postgresql"
+    if estimated:
+        total_items = estimate_count(db, base_query)
+    elif include_total != "none":
+        # A versão dos dados invalida a contagem a cada escrita do usuário; a
+        # listagem anônima (todas as moedas) não tem versão e conta sempre.
+        cache_key = None
+        if current_user:
+            cache_key = (
+                current_user.id, data_version(db, current_user.id),
+                country, country_code, year_from, year_to, originality, category, condition, search,
+            )
+            total_items = _count_cache.get(cache_key)
+        if total_items is None:
+            count_query = select(func.count()).select_from(base_query.subquery())
+            total_items = db.scalar(count_query) or 0
+            if cache_key is not None:
+                _count_cache.set(cache_key, total_items)
+    total_pages = (
+        (total_items + page_size - 1) // page_size if total_items is not None else None
+    )
+
+    facet_counts = None
+    if facet_fields:
+        facet_counts = compute_facets(
+            db,
+            base_conditions,
+            facet_conditions,
+            facet_fields,
+            settings.FACET_MAX_BUCKETS,
+        )
+
+    meta = PaginationMeta(
+        page=page,
+        page_size=page_size,
+        total_items=total_items,
+        total_pages=total_pages,
+        total_is_estimate=estimated,
+        has_next=has_next,
+    )
+    return PaginatedResponse(data=coins, meta=meta, facets=facet_counts)
+
 
-    meta = PaginationMeta(page=page, page_size=page_size, total_items=total_items, total_pages=total_pages)
-    return PaginatedResponse(data=coins, meta=meta)
+@router.get("/changes", response_model=CoinChanges)
+def list_coin_changes(
+    since: Optional[str] = Query(None, description="Cursor returned by the previous call"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    try:
+        return list_changes(db, current_user.id, since, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/duplicates")
+def list_duplicates(
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Grupos de moedas do usuário que parecem repetidas (candidatas a juntar)."""
+    return find_duplicates(db, current_user.id, limit)
+
+
+@router.post("/duplicates/merge", response_model=CoinRead)
+def merge_duplicate_coins(
+    merge_in: CoinMerge,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Junta moedas com a mesma chave natural (ver /duplicates) na mais antiga, somando as quantidades."""
+    try:
+        coin = merge_duplicates(db, current_user.id, merge_in.ids)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if coin is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Coin not found")
+    removed = [coin_id for coin_id in merge_in.ids if coin_id != coin.id]
+    db.commit()
+    for coin_id in removed:
+        image_index.remove(coin_id)
+    suggestions.invalidate(current_user.id)
+    db.refresh(coin)
+    return coin
+
+
+@router.get("/suggest")
+def suggest(
+    field: str = Query(..., enum=list(SUGGEST_FIELDS)),
+    prefix: str = Query("", max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Valores já usados pelo usuário no campo, começando com `prefix` (sem diferenciar acentos)."""
+    if field not in SUGGEST_FIELDS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid field.")
+    return suggestions.suggest(db, current_user.id, field, prefix, limit)
 
 
 def get_public_coin_or_404(db: Session, coin_id: int) -> Coin:
@@ -126,10 +314,13 @@ def update_coin(
     current_user: User = Depends(get_current_user),
 ):
     coin = get_coin_or_404(db, coin_id, current_user.id)
+    old = suggest_values(coin)
     for field, value in coin_in.model_dump().items():
         setattr(coin, field, value)
+    coin.country_code = resolve_country_code(db, coin.country)
     db.commit()
     db.refresh(coin)
+    suggestions.record(current_user.id, old, suggest_values(coin))
     return coin
 
 
@@ -141,11 +332,15 @@ def partial_update_coin(
     current_user: User = Depends(get_current_user),
 ):
     coin = get_coin_or_404(db, coin_id, current_user.id)
+    old = suggest_values(coin)
     update_data = coin_in.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(coin, field, value)
+    if "country" in update_data:
+        coin.country_code = resolve_country_code(db, coin.country)
     db.commit()
     db.refresh(coin)
+    suggestions.record(current_user.id, old, suggest_values(coin))
     return coin
 
 
@@ -156,12 +351,20 @@ def delete_coin(
     current_user: User = Depends(get_current_user),
 ):
     coin = get_coin_or_404(db, coin_id, current_user.id)
+    old = suggest_values(coin)
+    db.add(CoinTombstone(coin_id=coin.id, owner_id=coin.owner_id))
     db.delete(coin)
     db.commit()
+    image_index.remove(coin_id)
+    suggestions.record(current_user.id, old=old)
     return
 
 
-@router.post("/{coin_id}/upload-images", response_model=CoinRead)
+@router.post(
+    "/{coin_id}/upload-images",
+    response_model=CoinRead,
+    dependencies=[Depends(idempotent), Depends(admission("upload"))],
+)
 def upload_coin_image(
     coin_id: int,
     db: Session = Depends(get_db),
@@ -174,33 +377,67 @@ def upload_coin_image(
 
     coin = get_coin_or_404(db, coin_id, current_user.id)
 
-    def save_file(file: UploadFile) -> str:
+    def save_file(file: UploadFile) -> tuple[str, int | None]:
         os.makedirs(MEDIA_DIR, exist_ok=True)
         ext = os.path.splitext(file.filename)[-1]
         filename = f"{uuid.uuid4().hex}{ext}"
         path = os.path.join(MEDIA_DIR, filename)
+        content = file.file.read()
         with open(path, "wb") as f:
-            f.write(file.file.read())
-        return path.replace(os.sep, '/')
+            f.write(content)
+        return path.replace(os.sep, '/'), dhash(content)
 
     if front_image:
-        coin.image_url_front = save_file(front_image)
+        coin.image_url_front, coin.image_hash_front = save_file(front_image)
     if back_image:
-        coin.image_url_back = save_file(back_image)
+        coin.image_url_back, coin.image_hash_back = save_file(back_image)
 
     db.commit()
     db.refresh(coin)
+    if front_image:
+        image_index.update(coin.id, coin.owner_id, "front", coin.image_hash_front)
+    if back_image:
+        image_index.update(coin.id, coin.owner_id, "back", coin.image_hash_back)
     return coin
 
 
-@router.post("/import")
+@router.post("/similar", response_model=List[CoinMatch], dependencies=[Depends(admission("upload"))])
+def find_similar_coins(
+    image: UploadFile = File(...),
+    scope: str = Query("mine", enum=["mine", "all"], description="Search own collection or all coins"),
+    k: int = Query(10, ge=1, le=100),
+    max_distance: int = Query(settings.IMAGE_SIMILARITY_MAX_DISTANCE, ge=0, le=64),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Moedas com imagem parecida com a enviada, pela distância de Hamming do dHash."""
+    value = dhash(image.file.read())
+    if value is None:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, "Invalid image file.")
+
+    owner_id = current_user.id if scope == "mine" else None
+    matches = image_index.search(db, value, k, max_distance, owner_id)
+    if not matches:
+        return []
+
+    ids = [coin_id for coin_id, _ in matches]
+    coins = {c.id: c for c in db.execute(select(Coin).where(Coin.id.in_(ids))).scalars()}
+    return [
+        CoinMatch(coin=coins[coin_id], distance=distance)
+        for coin_id, distance in matches
+        if coin_id in coins
+    ]
+
+
+@router.post("/import", dependencies=[Depends(idempotent), Depends(admission("import"))])
 def import_from_file(
     file: UploadFile,
+    on_duplicate: str = Query("insert", enum=list(DUPLICATE_MODES)),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
     content = file.file.read()
-    inserted, errors = 0, 0
+    rows, errors = [], 0
 
     try:
         if file.filename.endswith(".json"):
@@ -209,8 +446,7 @@ def import_from_file(
             for item in data:
                 try:
                     coin_in = CoinCreate(**item)
-                    db.add(Coin(**coin_in.model_dump(), owner_id=current_user.id))
-                    inserted += 1
+                    rows.append({**coin_in.model_dump(), "owner_id": current_user.id})
                 except Exception:
                     errors += 1
         elif file.filename.endswith(".csv"):
@@ -224,30 +460,85 @@ def import_from_file(
                     if d := row.get("acquisition_date"): row["acquisition_date"] = datetime.fromisoformat(d)
                     
                     coin_in = CoinCreate(**row)
-                    db.add(Coin(**coin_in.model_dump(), owner_id=current_user.id))
-                    inserted += 1
+                    rows.append({**coin_in.model_dump(), "owner_id": current_user.id})
                 except (ValueError, TypeError):
                     errors += 1
+        elif file.filename.endswith(".parquet"):
+            rows, errors = columnar_rows(content, "parquet", current_user.id)
+        elif file.filename.endswith((".arrow", ".arrows")):
+            rows, errors = columnar_rows(content, "arrow", current_user.id)
         else:
-            raise HTTPException(400, "Invalid file format. Use .json or .csv.")
-        
+            raise HTTPException(400, "Invalid file format. Use .json, .csv, .parquet or .arrow.")
+
+        assign_country_codes(db, rows)
+        # Com on_duplicate=merge/skip, moedas iguais às existentes não duplicam.
+        result = upsert_coins(db, rows, on_duplicate)
         db.commit()
+    except (HTTPException, OperationalError):
+        # Formato inválido continua 400; statement_timeout vira 503 (ver main.py).
+        db.rollback()
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(500, f"Import failed: {e}")
+    suggestions.invalidate(current_user.id)
 
-    return {"inserted": inserted, "errors": errors}
+    return {**result, "errors": errors}
 
 
-@router.get("/export/all")
+@router.post("/revaluate", dependencies=[Depends(admission("import"))])
+def revaluate_from_catalog(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """Atualiza o valor estimado das moedas do usuário com os preços do catálogo."""
+    return revaluate_coins(db, owner_id=current_user.id)
+
+
+@router.get("/export/all", dependencies=[Depends(rate_limit("export"))])
 def export_to_file(
-    format: str = Query("json", enum=["json", "csv"]),
+    request: Request,
+    format: str = Query("json", enum=["json", "csv", *COLUMNAR_FORMATS]),
+    currency: Optional[str] = Query(
+        None, description="Add values converted to this currency (ISO 4217; json/csv only)"
+    ),
+    as_of: Optional[date] = Query(None, description="Exchange rate date (default: today)"),
+    rate_basis: str = Query("as_of", enum=list(RATE_BASIS)),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
 ):
-    query = select(Coin).where(Coin.owner_id == current_user.id)
-    coins = db.execute(query).scalars().all()
-    data = [CoinRead.model_validate(c).model_dump(mode="json") for c in coins]
+    if format in COLUMNAR_FORMATS:
+        # Colunar: gerado em lotes direto do banco, sem montar a lista em memória.
+        media_type, filename = COLUMNAR_FORMATS[format]
+        body = stream_export(current_user.id, format, partial(open_session, request))
+        # Admissão antes do status 200: sem vaga, a requisição ainda recebe 503.
+        header = next(body)
+        return StreamingResponse(
+            itertools.chain([header], body),
+            media_type=media_type,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    with admission_slot("export"):
+        set_local_statement_timeout(db, "export")
+        query = select(Coin).where(Coin.owner_id == current_user.id)
+        coins = db.execute(query).scalars().all()
+        data = [CoinRead.model_validate(c).model_dump(mode="json") for c in coins]
+
+        if (currency := normalize_currency(currency)) and coins:
+            fx = get_fx_table(db)
+            currencies = np.array([c.currency for c in coins], dtype=object)
+            days = rate_days([c.acquisition_date for c in coins], as_of, rate_basis)
+            estimated = fx.convert(
+                np.array([c.estimated_value for c in coins], dtype=np.float64), currencies, days, currency
+            )
+            purchase = fx.convert(
+                np.array([c.purchase_price for c in coins], dtype=np.float64), currencies, days, currency
+            )
+            for row, est, pur in zip(data, estimated.tolist(), purchase.tolist()):
+                row["converted_currency"] = currency
+                row["converted_estimated_value"] = None if math.isnan(est) else est
+                row["converted_purchase_price"] = None if math.isnan(pur) else pur
 
     if format == "json":
         return JSONResponse(content=data)
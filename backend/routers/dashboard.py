@@ -1,11 +1,23 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import func, select
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 
 from core.database import get_db
 from core.security import get_current_user
 from models.user import User
-from models.coin import Coin, OriginalityEnum
+from core.config import settings
+from services.analytics_service import (
+    DIMENSIONS,
+    aggregate,
+    parse_filters,
+    parse_group_by,
+    parse_metrics,
+)
+from services.dashboard_service import collection_summary
+from services.snapshot_service import BUCKETS, valuation_history
+from services.valuation_service import RATE_BASIS, normalize_currency
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
@@ -14,69 +26,58 @@ router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 def get_summary(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    currency: Optional[str] = Query(None, description="Convert values to this currency (ISO 4217)"),
+    as_of: Optional[date] = Query(None, description="Exchange rate date (default: today)"),
+    rate_basis: str = Query("as_of", enum=list(RATE_BASIS)),
 ):
-    q = select(Coin).where(Coin.owner_id == current_user.id)
-
-    total_coins = db.scalar(select(func.count()).select_from(q.subquery())) or 0
-    total_countries = (
-        db.scalar(
-            select(func.count(func.distinct(Coin.country))).select_from(q.subquery())
-        )
-        or 0
+    return collection_summary(
+        db, current_user.id, normalize_currency(currency), as_of, rate_basis
     )
 
-    q_originals = q.where(Coin.originality == OriginalityEnum.ORIGINAL)
-    total_originals = db.scalar(select(func.count()).select_from(q_originals.subquery())) or 0
-
-    q_replicas = q.where(Coin.originality == OriginalityEnum.REPLICA)
-    total_replicas = db.scalar(select(func.count()).select_from(q_replicas.subquery())) or 0
 
-    total_estimated_value = (
-        db.scalar(select(func.sum(Coin.estimated_value)).select_from(q.subquery()))
-        or 0.0
-    )
-
-    by_country_q = (
-        select(Coin.country, func.count(Coin.id).label("count"))
-        .where(Coin.owner_id == current_user.id)
-        .group_by(Coin.country)
-        .order_by(func.count(Coin.id).desc())
+@router.get("/aggregate")
+def get_aggregate(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    group_by: Optional[str] = Query(
+        None, description=f"Comma-separated dimensions: {', '.join(DIMENSIONS)}"
+    ),
+    metrics: Optional[str] = Query(
+        "count", description="Comma-separated metrics: count or func:field (e.g. sum:estimated_value)"
+    ),
+    filters: Optional[str] = Query(
+        None, description="Comma-separated field:op:value (ops: eq, ne, gt, gte, lt, lte, in with a|b)"
+    ),
+):
+    """Agregação ad-hoc da coleção (dimensões, métricas e filtros de uma lista permitida)."""
+    return aggregate(
+        db,
+        current_user.id,
+        parse_group_by(group_by),
+        parse_metrics(metrics),
+        parse_filters(filters),
     )
-    by_country = db.execute(by_country_q).mappings().all()
 
-    by_year_q = (
-        select(Coin.year, func.count(Coin.id).label("count"))
-        .where(Coin.owner_id == current_user.id)
-        .group_by(Coin.year)
-        .order_by(Coin.year.asc())
-    )
-    by_year = db.execute(by_year_q).mappings().all()
 
-    by_originality_q = (
-        select(Coin.originality, func.count(Coin.id).label("count"))
-        .where(Coin.owner_id == current_user.id)
-        .group_by(Coin.originality)
-        .order_by(func.count(Coin.id).desc())
-    )
-    by_originality = db.execute(by_originality_q).mappings().all()
+@router.get("/history")
+def get_history(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    from_: Optional[date] = Query(None, alias="from", description="Default: one year ago"),
+    to: Optional[date] = Query(None, description="Default: today"),
+    bucket: str = Query("week", enum=list(BUCKETS)),
+):
+    """Série histórica da coleção a partir dos snapshots diários."""
+    to = to or date.today()
+    from_ = from_ or to - timedelta(days=365)
+    if from_ > to or bucket not in BUCKETS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid date range or bucket.",
+        )
 
     return {
-        "total_coins": total_coins,
-        "total_countries": total_countries,
-        "total_originals": total_originals,
-        "total_replicas": total_replicas,
-        "total_estimated_value": total_estimated_value,
-        "by_country": by_country,
-        "by_year": by_year,
-        "by_originality": [
-            {
-                "originality": (
-                    row["originality"].value
-                    if hasattr(row["originality"], "value")
-                    else row["originality"]
-                ),
-                "count": row["count"],
-            }
-            for row in by_originality
-        ],
+        "bucket": bucket,
+        "currency": settings.DEFAULT_CURRENCY,
+        "series": valuation_history(db, current_user.id, from_, to, bucket),
     }
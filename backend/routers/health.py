@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from core.admission import admission_metrics
 from core.config import settings
+from core.log import logging_metrics
+from services.collection_columns_service import columns_cache
 
 router = APIRouter()
 
@@ -9,3 +12,18 @@ def health_check():
     Endpoint de health check para verificar se a aplicação está no ar.
     """
     return {"status": "ok", "app_name": settings.PROJECT_NAME}
+
+
+@router.get("/metrics", tags=["Health"])
+def metrics():
+    """
+    Contadores do controle de admissão por classe de rota (admitidas,
+    limitadas por taxa, recusadas por sobrecarga, em andamento) e da fila de
+    logs (escritos, descartados, filtrados pela amostragem, na fila), além
+    do uso de memória dos snapshots colunares das coleções.
+    """
+    return {
+        "admission": admission_metrics(),
+        "logging": logging_metrics(),
+        "collection_columns": columns_cache.stats(),
+    }
@@ -1,8 +1,11 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field, ConfigDict
+from core.config import settings
 from models.coin import OriginalityEnum
 
+CURRENCY_PATTERN = r"^[A-Z]{3}$"
+
 class BaseModelWithOrm(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
@@ -14,6 +17,7 @@ class CoinBase(BaseModel):
     face_value: str = Field(..., max_length=100, example="1 Real")
     purchase_price: Optional[float] = Field(None, ge=0, example=10.5)
     estimated_value: Optional[float] = Field(None, ge=0, example=25.0)
+    currency: str = Field(settings.DEFAULT_CURRENCY, pattern=CURRENCY_PATTERN, example="BRL")
     originality: OriginalityEnum = OriginalityEnum.UNKNOWN
     condition: Optional[str] = Field(None, max_length=100, example="Flor de Cunho")
     storage_location: Optional[str] = Field(None, max_length=200, example="Álbum 1, p. 3")
@@ -34,6 +38,7 @@ class CoinUpdate(BaseModel):
     face_value: Optional[str] = Field(None, max_length=100)
     purchase_price: Optional[float] = Field(None, ge=0)
     estimated_value: Optional[float] = Field(None, ge=0)
+    currency: Optional[str] = Field(None, pattern=CURRENCY_PATTERN)
     originality: Optional[OriginalityEnum] = None
     condition: Optional[str] = Field(None, max_length=100)
     storage_location: Optional[str] = Field(None, max_length=200)
@@ -47,5 +52,27 @@ class CoinUpdate(BaseModel):
 class CoinRead(BaseModelWithOrm, CoinBase):
     id: int
     owner_id: int
+    country_code: Optional[str] = None
     created_at: datetime
     updated_at: datetime
+
+
+class CoinTombstoneRead(BaseModel):
+    id: int
+    deleted_at: datetime
+
+
+class CoinChanges(BaseModel):
+    changes: List[CoinRead]
+    deleted: List[CoinTombstoneRead]
+    next_cursor: Optional[str]
+    has_more: bool
+
+
+class CoinMerge(BaseModel):
+    ids: List[int] = Field(..., min_length=2, description="Moedas a juntar (a mais antiga é mantida).")
+
+
+class CoinMatch(BaseModel):
+    coin: CoinRead
+    distance: int
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, ConfigDict
-from typing import Generic, TypeVar, List
+from typing import Dict, Generic, List, Optional, TypeVar, Union
 
 
 T = TypeVar("T")
@@ -8,8 +8,15 @@ T = TypeVar("T")
 class PaginationMeta(BaseModel):
     page: int
     page_size: int
-    total_items: int
-    total_pages: int
+    total_items: Optional[int] = None
+    total_pages: Optional[int] = None
+    total_is_estimate: bool = False
+    has_next: bool = False
+
+
+class FacetBucket(BaseModel):
+    value: Union[int, str, None]
+    count: int
 
 
 class PaginatedResponse(BaseModel, Generic[T]):
@@ -17,3 +24,4 @@ class PaginatedResponse(BaseModel, Generic[T]):
 
     data: List[T]
     meta: PaginationMeta
+    facets: Optional[Dict[str, List[FacetBucket]]] = None
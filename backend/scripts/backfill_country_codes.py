@@ -0,0 +1,25 @@
+"""
+Resolve `country_code` das moedas que ainda não têm país canônico (por
+exemplo, depois de novos aliases serem carregados), em lotes de ids.
+
+Uso (a partir de backend/):
+    python -m scripts.backfill_country_codes
+"""
+from core.config import settings
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.country_service import backfill_country_codes
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        updated = backfill_country_codes(
+            db,
+            settings.COUNTRY_BACKFILL_BATCH_SIZE,
+            settings.COUNTRY_BACKFILL_PAUSE_SECONDS,
+        )
+    print(f"{updated} moedas atualizadas")
+
+
+if __name__ == "__main__":
+    main()
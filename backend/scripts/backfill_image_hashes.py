@@ -0,0 +1,45 @@
+"""
+Calcula o hash perceptual das imagens já enviadas antes da busca por semelhança.
+
+Uso (a partir de backend/):
+    python -m scripts.backfill_image_hashes
+"""
+from sqlalchemy import or_, select
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from models.coin import Coin
+from services.image_hash_service import dhash
+
+
+def file_hash(path: str | None) -> int | None:
+    if not path:
+        return None
+    try:
+        with open(path, "rb") as f:
+            return dhash(f.read())
+    except OSError:
+        return None
+
+
+def main() -> None:
+    updated = 0
+    with SessionLocal() as db:
+        query = select(Coin).where(
+            or_(
+                Coin.image_url_front.is_not(None) & Coin.image_hash_front.is_(None),
+                Coin.image_url_back.is_not(None) & Coin.image_hash_back.is_(None),
+            )
+        )
+        for coin in db.execute(query).scalars():
+            if coin.image_hash_front is None:
+                coin.image_hash_front = file_hash(coin.image_url_front)
+            if coin.image_hash_back is None:
+                coin.image_hash_back = file_hash(coin.image_url_back)
+            updated += 1
+        db.commit()
+    print(f"{updated} moedas processadas")
+
+
+if __name__ == "__main__":
+    main()
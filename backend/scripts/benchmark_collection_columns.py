@@ -0,0 +1,79 @@
+"""
+Compara o snapshot colunar da coleção com o caminho SQL: memória por 100 mil
+moedas e latência do resumo do dashboard e de algumas agregações.
+
+Uso (a partir de backend/):
+    python -m scripts.benchmark_collection_columns [owner_id] [repeticoes]
+
+O tempo de carga do snapshot (uma consulta de colunas) é mostrado à parte;
+as latências do snapshot são de leituras já com ele em memória, sem a
+consulta de versão feita a cada requisição.
+"""
+import statistics
+import sys
+import time
+from typing import Callable
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.analytics_service import (
+    _aggregate_columns,
+    _aggregate_sql,
+    parse_filters,
+    parse_group_by,
+    parse_metrics,
+)
+from services.collection_columns_service import _load
+from services.coin_service import data_version
+from services.dashboard_service import _summary_from_columns, _summary_from_sql
+
+AGGREGATIONS = [
+    ("country", "count,sum:estimated_value", None),
+    ("decade,originality", "count,avg:estimated_value,max:purchase_price", "year:gte:1900"),
+    ("price_band", "count,sum:quantity", "country:in:Brasil|Portugal,estimated_value:gt:5"),
+]
+
+
+def timed(fn: Callable[[], object], repeats: int) -> float:
+    """Mediana em milissegundos."""
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    owner_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with SessionLocal() as db:
+        started = time.perf_counter()
+        columns = _load(db, owner_id)
+        load_ms = (time.perf_counter() - started) * 1000
+        if not columns.size:
+            print("Usuário sem moedas.")
+            return
+
+        print(f"moedas: {columns.size}")
+        print(f"memória: {columns.nbytes / 1024:.0f} KiB "
+              f"({columns.nbytes / columns.size * 100_000 / 2**20:.1f} MiB por 100 mil moedas)")
+        print(f"carga do snapshot: {load_ms:.1f} ms")
+        print(f"consulta de versão: {timed(lambda: data_version(db, owner_id), repeats):.2f} ms")
+        print()
+        print(f"{'consulta':<60} {'SQL (ms)':>10} {'snapshot (ms)':>14}")
+
+        sql = timed(lambda: _summary_from_sql(db, owner_id), repeats)
+        snapshot = timed(lambda: _summary_from_columns(columns), repeats)
+        print(f"{'get_summary':<60} {sql:>10.2f} {snapshot:>14.2f}")
+
+        for group_by, metrics, filters in AGGREGATIONS:
+            args = (parse_group_by(group_by), parse_metrics(metrics), parse_filters(filters))
+            sql = timed(lambda: _aggregate_sql(db, owner_id, *args), repeats)
+            snapshot = timed(lambda: _aggregate_columns(columns, *args), repeats)
+            label = f"aggregate {group_by} / {metrics}" + (f" / {filters}" if filters else "")
+            print(f"{label[:60]:<60} {sql:>10.2f} {snapshot:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
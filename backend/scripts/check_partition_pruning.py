@@ -0,0 +1,66 @@
+"""
+Confere se o Postgres poda partições de `coins` nas consultas da API.
+
+Uso (a partir de backend/):
+    python -m scripts.check_partition_pruning [owner_id]
+
+Para cada formato de consulta usado pelos routers, roda EXPLAIN e lista
+quantas partições de `coins` aparecem no plano.
+"""
+import sys
+
+from sqlalchemy import func, select, text
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from models.coin import Coin, OriginalityEnum
+from services.coin_service import explain_plan
+
+
+def query_shapes(owner_id: int) -> dict:
+    owned = Coin.owner_id == owner_id
+    return {
+        "list_coins (autenticado)": select(Coin).where(owned, Coin.year >= 1900)
+        .order_by(Coin.year.desc(), Coin.country).limit(21),
+        "list_coins (anônimo)": select(Coin).order_by(Coin.year.desc(), Coin.country).limit(21),
+        "get_coin_or_404": select(Coin).where(Coin.id == 1, owned),
+        "get_public_coin_or_404": select(Coin).where(Coin.id == 1),
+        "list_coin_changes": select(Coin.id).where(owned, Coin.change_seq > 0)
+        .order_by(Coin.change_seq).limit(101),
+        "export_to_file": select(Coin).where(owned),
+        "get_summary (totais)": select(func.count(), func.sum(Coin.estimated_value)).where(owned),
+        "get_summary (por país)": select(Coin.country, func.count(Coin.id))
+        .where(owned).group_by(Coin.country),
+        "get_summary (originais)": select(func.count())
+        .where(owned, Coin.originality == OriginalityEnum.ORIGINAL),
+    }
+
+
+def scanned_partitions(plan: dict) -> set[str]:
+    found = set()
+    relation = plan.get("Relation Name", "")
+    if relation.startswith("coins_p"):
+        found.add(relation)
+    for child in plan.get("Plans", []):
+        found |= scanned_partitions(child)
+    return found
+
+
+def main() -> None:
+    owner_id = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    with SessionLocal() as db:
+        total = db.execute(text(
+            "SELECT count(*) FROM pg_inherits WHERE inhparent = 'coins'::regclass"
+        )).scalar()
+        if not total:
+            print("A tabela coins não está particionada.")
+            return
+
+        for name, query in query_shapes(owner_id).items():
+            partitions = scanned_partitions(explain_plan(db, query))
+            status = "OK" if len(partitions) <= 1 else "SEM PODA"
+            print(f"{status:9} {len(partitions):3}/{total} partições  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Importa/atualiza países canônicos e aliases (CSV com colunas `code,name,aliases`,
+aliases separados por `|`). Sem argumentos, recarrega data/countries.csv.
+
+Uso (a partir de backend/):
+    python -m scripts.load_countries [paises.csv ...] [--backfill]
+
+Com --backfill, resolve em seguida o país das moedas ainda sem `country_code`.
+"""
+import sys
+
+from core.config import settings
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.country_service import backfill_country_codes, load_countries_csv
+
+
+def main() -> None:
+    args = sys.argv[1:]
+    backfill = "--backfill" in args
+    paths = [a for a in args if a != "--backfill"] or ["data/countries.csv"]
+    with SessionLocal() as db:
+        for path in paths:
+            with open(path, newline="", encoding="utf-8") as f:
+                print(f"{path}: {load_countries_csv(db, f)} países importados")
+        if backfill:
+            updated = backfill_country_codes(
+                db,
+                settings.COUNTRY_BACKFILL_BATCH_SIZE,
+                settings.COUNTRY_BACKFILL_PAUSE_SECONDS,
+            )
+            print(f"{updated} moedas atualizadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Importa um snapshot de cotações (CSV com colunas `date,currency,rate`).
+
+Uso (a partir de backend/):
+    python -m scripts.load_fx_rates cotacoes.csv [outro.csv ...]
+
+`rate` é a quantidade de `currency` por 1 FX_BASE_CURRENCY naquela data.
+"""
+import sys
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.valuation_service import load_fx_csv
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        for path in sys.argv[1:]:
+            with open(path, newline="", encoding="utf-8") as f:
+                print(f"{path}: {load_fx_csv(db, f)} cotações importadas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Importa o catálogo de preços de referência (CSV).
+
+Uso (a partir de backend/):
+    python -m scripts.load_reference_prices catalogo.csv [--revaluate]
+
+Colunas: country,face_value,year,condition,price,currency. Com --revaluate,
+recalcula em seguida o valor estimado de todas as moedas do catálogo.
+"""
+import sys
+import time
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.catalog_service import load_reference_prices_csv, revaluate_coins
+
+
+def main() -> None:
+    args = [a for a in sys.argv[1:] if a != "--revaluate"]
+    with SessionLocal() as db:
+        for path in args:
+            with open(path, newline="", encoding="utf-8") as f:
+                print(f"{path}: {load_reference_prices_csv(db, f)} preços importados")
+
+        if "--revaluate" in sys.argv:
+            started = time.perf_counter()
+            result = revaluate_coins(db)
+            elapsed = time.perf_counter() - started
+            print(
+                f"Reavaliação: {result['matched']} moedas no catálogo, "
+                f"{result['updated']} alteradas em {elapsed:.1f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
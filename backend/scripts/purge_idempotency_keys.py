@@ -0,0 +1,20 @@
+"""
+Apaga as respostas guardadas de Idempotency-Key já expiradas. Chaves
+expiradas também são descartadas quando reutilizadas; este job só evita que
+a tabela cresça com chaves que nunca se repetem.
+
+Uso (a partir de backend/), por exemplo de hora em hora:
+    python -m scripts.purge_idempotency_keys
+"""
+from core.database import SessionLocal
+from core.idempotency import purge_expired
+
+
+def main() -> None:
+    with SessionLocal() as db:
+        purged = purge_expired(db)
+    print(f"{purged} chaves expiradas removidas")
+
+
+if __name__ == "__main__":
+    main()
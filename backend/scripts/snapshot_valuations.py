@@ -0,0 +1,27 @@
+"""
+Grava os snapshots diários de valorização (rodar uma vez por dia, via cron).
+
+Uso (a partir de backend/):
+    python -m scripts.snapshot_valuations [AAAA-MM-DD]
+
+Só processa usuários cujas moedas mudaram desde o último snapshot.
+"""
+import sys
+import time
+from datetime import date
+
+from core.database import SessionLocal
+from models import user  # noqa: F401  (registra o mapeamento de User)
+from services.snapshot_service import take_snapshots
+
+
+def main() -> None:
+    snapshot_date = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        written = take_snapshots(db, snapshot_date)
+    print(f"{written} snapshots gravados em {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import Integer, case, cast, func, literal, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from core.cache import TTLCache
+from core.config import settings
+from models.coin import Coin, OriginalityEnum
+from services.coin_service import data_version
+from services.collection_columns_service import CollectionColumns, get_collection_columns
+
+
+def _price_band_labels() -> List[str]:
+    bounds = [0, *sorted(settings.AGGREGATE_PRICE_BANDS)]
+    return [f"{lower:g}-{upper:g}" for lower, upper in zip(bounds, bounds[1:])] + [f"{bounds[-1]:g}+"]
+
+
+def _price_band(column: ColumnElement) -> ColumnElement:
+    edges = sorted(settings.AGGREGATE_PRICE_BANDS)
+    labels = _price_band_labels()
+    whens = [(column < upper, literal(label)) for upper, label in zip(edges, labels)]
+    return case(*whens, (column.is_not(None), literal(labels[-1])), else_=None)
+
+
+# Dimensões permitidas: nome -> expressão SQL (colunas ou faixas derivadas).
+DIMENSIONS: Dict[str, Callable[[], ColumnElement]] = {
+    "country": lambda: Coin.country,
+    "country_code": lambda: Coin.country_code,
+    "year": lambda: Coin.year,
+    "decade": lambda: (Coin.year // 10) * 10,
+    "category": lambda: Coin.category,
+    "condition": lambda: Coin.condition,
+    "originality": lambda: Coin.originality,
+    "currency": lambda: Coin.currency,
+    "storage_location": lambda: Coin.storage_location,
+    "acquisition_source": lambda: Coin.acquisition_source,
+    "acquisition_year": lambda: cast(func.extract("year", Coin.acquisition_date), Integer),
+    "price_band": lambda: _price_band(Coin.estimated_value),
+}
+INTEGER_DIMENSIONS = ("year", "decade", "acquisition_year")
+
+METRIC_FIELDS = ("estimated_value", "purchase_price", "quantity")
+METRIC_FUNCTIONS = {"sum": func.sum, "avg": func.avg, "min": func.min, "max": func.max}
+
+FILTER_OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in")
+
+# Dimensões que o snapshot colunar sabe calcular; as demais vão para o SQL.
+COLUMNAR_DIMENSIONS = (
+    "country",
+    "country_code",
+    "year",
+    "decade",
+    "category",
+    "condition",
+    "originality",
+    "currency",
+    "acquisition_year",
+    "price_band",
+)
+_COMPARE: Dict[str, Callable[[Any, Any], Any]] = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+
+_results = TTLCache(
+    maxsize=settings.AGGREGATE_CACHE_MAX_ENTRIES, ttl=settings.AGGREGATE_CACHE_TTL_SECONDS
+)
+
+
+def _bad_request(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return list(dict.fromkeys(v.strip() for v in (value or "").split(",") if v.strip()))
+
+
+def parse_group_by(value: Optional[str]) -> Tuple[str, ...]:
+    dimensions = _split(value)
+    invalid = [d for d in dimensions if d not in DIMENSIONS]
+    if invalid:
+        raise _bad_request(f"Invalid dimensions: {', '.join(invalid)}")
+    if len(dimensions) > settings.AGGREGATE_MAX_DIMENSIONS:
+        raise _bad_request(f"At most {settings.AGGREGATE_MAX_DIMENSIONS} dimensions allowed.")
+    return tuple(dimensions)
+
+
+def parse_metrics(value: Optional[str]) -> Tuple[str, ...]:
+    """Métricas no formato `count` ou `função:campo` (ex.: `sum:estimated_value`)."""
+    metrics = _split(value) or ["count"]
+    for metric in metrics:
+        if metric == "count":
+            continue
+        function, _, field = metric.partition(":")
+        if function not in METRIC_FUNCTIONS or field not in METRIC_FIELDS:
+            raise _bad_request(f"Invalid metric: {metric}")
+    return tuple(metrics)
+
+
+def _filter_value(field: str, raw: str) -> Any:
+    try:
+        if field in INTEGER_DIMENSIONS:
+            return int(raw)
+        if field in METRIC_FIELDS:
+            return float(raw)
+        if field == "originality":
+            return OriginalityEnum(raw.lower())
+    except ValueError:
+        raise _bad_request(f"Invalid value for {field}: {raw}")
+    return raw
+
+
+def parse_filters(value: Optional[str]) -> Tuple[Tuple[str, str, Any], ...]:
+    """
+    Filtros no formato `campo:operador:valor`, separados por vírgula. Em `in`,
+    os valores são separados por `|` (ex.: `country:in:Brasil|Portugal`).
+    """
+    filters = []
+    for item in _split(value):
+        field, _, rest = item.partition(":")
+        operator, _, raw = rest.partition(":")
+        if field not in DIMENSIONS and field not in METRIC_FIELDS:
+            raise _bad_request(f"Invalid filter field: {field}")
+        if operator not in FILTER_OPERATORS or not raw:
+            raise _bad_request(f"Invalid filter: {item}")
+        if operator == "in":
+            parsed = tuple(sorted({_filter_value(field, v) for v in raw.split("|")}, key=str))
+        else:
+            parsed = _filter_value(field, raw)
+        filters.append((field, operator, parsed))
+    return tuple(sorted(filters, key=lambda f: (f[0], f[1], str(f[2]))))
+
+
+def _filter_expression(field: str, operator: str, value: Any) -> ColumnElement:
+    column = DIMENSIONS[field]() if field in DIMENSIONS else getattr(Coin, field)
+    if operator == "in":
+        return column.in_(value)
+    return {
+        "eq": column.__eq__,
+        "ne": column.__ne__,
+        "gt": column.__gt__,
+        "gte": column.__ge__,
+        "lt": column.__lt__,
+        "lte": column.__le__,
+    }[operator](value)
+
+
+def _metric_label(metric: str) -> str:
+    return metric.replace(":", "_")
+
+
+def _metric_expression(metric: str, source) -> ColumnElement:
+    if metric == "count":
+        return func.count()
+    function, _, field = metric.partition(":")
+    return METRIC_FUNCTIONS[function](source.c[field])
+
+
+def _integer_dimension(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, List[Any]]:
+    labels, inverse = np.unique(values[valid], return_inverse=True)
+    codes = np.full(values.shape, -1, dtype=np.int64)
+    codes[valid] = inverse
+    return codes, labels.tolist()
+
+
+def _columnar_dimension(columns: CollectionColumns, name: str) -> Tuple[np.ndarray, List[Any]]:
+    """Códigos por moeda (-1 = nulo) e rótulos de uma dimensão, como no SQL de DIMENSIONS."""
+    if name in columns.codes:
+        return columns.codes[name].astype(np.int64), columns.labels[name]
+    if name in ("year", "decade"):
+        # Divisão inteira do Postgres: trunca em direção a zero.
+        years = columns.year if name == "year" else columns.year - np.fmod(columns.year, 10)
+        return _integer_dimension(years, np.ones(columns.size, dtype=bool))
+    if name == "acquisition_year":
+        days = columns.acquisition_day
+        years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+        return _integer_dimension(years, ~np.isnat(days))
+    # price_band
+    values = columns.numeric["estimated_value"]
+    bands = np.searchsorted(sorted(settings.AGGREGATE_PRICE_BANDS), values, side="right")
+    return np.where(np.isnan(values), -1, bands), _price_band_labels()
+
+
+def _columnar_mask(columns: CollectionColumns, filters: Tuple[Tuple[str, str, Any], ...]) -> np.ndarray:
+    """Linhas que passam nos filtros; nulos nunca passam (como no SQL)."""
+    mask = np.ones(columns.size, dtype=bool)
+    for field, operator, value in filters:
+        value = (
+            {getattr(v, "value", v) for v in value} if operator == "in" else getattr(value, "value", value)
+        )
+        if field in METRIC_FIELDS:
+            values = columns.numeric[field]
+            matches = np.isin(values, list(value)) if operator == "in" else _COMPARE[operator](values, value)
+            mask &= ~np.isnan(values) & matches
+        else:
+            codes, labels = _columnar_dimension(columns, field)
+            by_label = [
+                label in value if operator == "in" else bool(_COMPARE[operator](label, value))
+                for label in labels
+            ]
+            # O código -1 (nulo) cai no último elemento, sempre False.
+            mask &= np.array([*by_label, False], dtype=bool)[codes]
+    return mask
+
+
+def _columnar_metric(metric: str, values: Optional[np.ndarray], inverse: np.ndarray, groups: int) -> List[Any]:
+    if metric == "count":
+        return np.bincount(inverse, minlength=groups).tolist()
+    function, _, field = metric.partition(":")
+    valid = ~np.isnan(values)
+    counts = np.bincount(inverse[valid], minlength=groups)
+    if function in ("sum", "avg"):
+        result = np.bincount(inverse[valid], weights=values[valid], minlength=groups)
+        if function == "avg":
+            result = result / np.maximum(counts, 1)
+    else:
+        result = np.full(groups, np.inf if function == "min" else -np.inf)
+        (np.minimum if function == "min" else np.maximum).at(result, inverse[valid], values[valid])
+    as_int = field == "quantity" and function != "avg"
+    return [
+        None if count == 0 else int(value) if as_int else float(value)
+        for value, count in zip(result.tolist(), counts.tolist())
+    ]
+
+
+def _aggregate_columns(
+    columns: CollectionColumns,
+    group_by: Tuple[str, ...],
+    metrics: Tuple[str, ...],
+    filters: Tuple[Tuple[str, str, Any], ...],
+) -> List[Dict[str, Any]]:
+    """Mesma agregação do SQL, vetorizada sobre o snapshot colunar."""
+    mask = _columnar_mask(columns, filters)
+    dimensions = [_columnar_dimension(columns, d) for d in group_by]
+    # Chave de grupo em base mista: um dígito (código + 1) por dimensão.
+    keys = np.zeros(int(mask.sum()), dtype=np.int64)
+    for codes, labels in dimensions:
+        keys = keys * (len(labels) + 1) + codes[mask] + 1
+    if dimensions:
+        keys, inverse = np.unique(keys, return_inverse=True)
+    else:
+        # Sem dimensões, sempre uma linha (como o SELECT sem GROUP BY).
+        keys, inverse = np.zeros(1, dtype=np.int64), keys
+    groups = len(keys)
+
+    values = {
+        metric: _columnar_metric(
+            metric,
+            None if metric == "count" else columns.numeric[metric.partition(":")[2]][mask],
+            inverse,
+            groups,
+        )
+        for metric in metrics
+    }
+    rows = []
+    for index, key in enumerate(keys.tolist()):
+        row: Dict[str, Any] = {}
+        for name, (_, labels) in reversed(list(zip(group_by, dimensions))):
+            key, code = divmod(key, len(labels) + 1)
+            row[name] = labels[code - 1] if code else None
+        rows.append({
+            **{name: row[name] for name in group_by},
+            **{_metric_label(m): values[m][index] for m in metrics},
+        })
+    # ORDER BY das dimensões, com nulos no fim (padrão do Postgres).
+    rows.sort(key=lambda r: tuple((r[d] is None, r[d] if r[d] is not None else 0) for d in group_by))
+    return rows[: settings.AGGREGATE_MAX_ROWS + 1]
+
+
+def _aggregate_sql(
+    db: Session,
+    owner_id: int,
+    group_by: Tuple[str, ...],
+    metrics: Tuple[str, ...],
+    filters: Tuple[Tuple[str, str, Any], ...],
+) -> List[Dict[str, Any]]:
+    # As faixas derivadas são calculadas numa subconsulta e agrupadas por nome,
+    # sem repetir no GROUP BY expressões com parâmetros.
+    source = (
+        select(
+            *[DIMENSIONS[d]().label(d) for d in group_by],
+            *[getattr(Coin, field) for field in METRIC_FIELDS],
+        )
+        .where(Coin.owner_id == owner_id)
+        .where(*[_filter_expression(*f) for f in filters])
+        .subquery()
+    )
+    dimensions = [source.c[d] for d in group_by]
+    query = select(
+        *dimensions,
+        *[_metric_expression(m, source).label(_metric_label(m)) for m in metrics],
+    ).select_from(source)
+    if dimensions:
+        query = query.group_by(*dimensions).order_by(*dimensions)
+    rows = db.execute(query.limit(settings.AGGREGATE_MAX_ROWS + 1)).mappings().all()
+    return [{key: getattr(value, "value", value) for key, value in row.items()} for row in rows]
+
+
+def aggregate(
+    db: Session,
+    owner_id: int,
+    group_by: Tuple[str, ...],
+    metrics: Tuple[str, ...],
+    filters: Tuple[Tuple[str, str, Any], ...],
+) -> Dict[str, Any]:
+    """
+    Executa a agregação pedida sobre o snapshot colunar da coleção, quando
+    todas as dimensões e filtros são suportados por ele, ou em um único
+    GROUP BY no banco. O resultado fica em cache pela consulta normalizada e
+    pela versão dos dados do usuário, de modo que qualquer alteração na
+    coleção invalida as entradas antigas.
+    """
+    version = data_version(db, owner_id)
+    cache_key = (owner_id, version, group_by, metrics, filters)
+    cached = _results.get(cache_key)
+    if cached is not None:
+        return cached
+
+    columns = None
+    fields = [*group_by, *(f[0] for f in filters)]
+    if all(f in COLUMNAR_DIMENSIONS or f in METRIC_FIELDS for f in fields):
+        columns = get_collection_columns(db, owner_id, version)
+    if columns is not None:
+        rows = _aggregate_columns(columns, group_by, metrics, filters)
+    else:
+        rows = _aggregate_sql(db, owner_id, group_by, metrics, filters)
+
+    result = {
+        "group_by": list(group_by),
+        "metrics": [_metric_label(m) for m in metrics],
+        "rows": rows[: settings.AGGREGATE_MAX_ROWS],
+        "truncated": len(rows) > settings.AGGREGATE_MAX_ROWS,
+    }
+    _results.set(cache_key, result)
+    return result
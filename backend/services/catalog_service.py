@@ -0,0 +1,143 @@
+import csv
+from typing import Any, Dict, List, Optional, TextIO
+
+import numpy as np
+from sqlalchemy import Float, Integer, column, func, select, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.catalog import ReferencePrice
+from models.coin import Coin
+from services.valuation_service import get_fx_table, rate_days
+
+# Diferença mínima para considerar que o valor estimado mudou.
+VALUE_TOLERANCE = 0.005
+
+
+def normalize_key(value: Optional[str]) -> str:
+    return (value or "").strip().lower()
+
+
+def load_reference_prices_csv(db: Session, stream: TextIO, batch_size: int = 5_000) -> int:
+    """
+    Importa o catálogo de preços de um CSV com colunas
+    `country,face_value,year,condition,price,currency` (condition e currency
+    opcionais). Entradas existentes com a mesma chave são atualizadas.
+    """
+    loaded = 0
+    batch: Dict[tuple, Dict[str, Any]] = {}
+
+    def flush() -> None:
+        stmt = insert(ReferencePrice).values(list(batch.values()))
+        db.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_reference_prices_key",
+                set_={
+                    "price": stmt.excluded.price,
+                    "currency": stmt.excluded.currency,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+        batch.clear()
+
+    for row in csv.DictReader(stream):
+        entry = {
+            "country": normalize_key(row["country"]),
+            "face_value": normalize_key(row["face_value"]),
+            "year": int(row["year"]),
+            "condition": normalize_key(row.get("condition")),
+            "price": float(row["price"]),
+            "currency": (row.get("currency") or settings.DEFAULT_CURRENCY).strip().upper(),
+        }
+        # Chave repetida no mesmo lote quebraria o ON CONFLICT: vale a última.
+        key = (entry["country"], entry["face_value"], entry["year"], entry["condition"])
+        batch[key] = entry
+        loaded += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    db.commit()
+    return loaded
+
+
+def revaluate_coins(
+    db: Session, owner_id: Optional[int] = None, batch_size: int = 10_000
+) -> Dict[str, int]:
+    """
+    Recalcula `estimated_value` das moedas que têm preço no catálogo.
+
+    Percorre `coins` em lotes de ids: cada lote é casado com o catálogo em um
+    único JOIN, convertido para a moeda da peça de forma vetorizada e gravado
+    com um único `UPDATE ... FROM (VALUES ...)`, com commit por lote.
+    """
+    fx = get_fx_table(db)
+    matched = updated = 0
+    last_id = 0
+
+    while True:
+        match_q = (
+            select(
+                Coin.id,
+                Coin.estimated_value,
+                Coin.currency,
+                ReferencePrice.price,
+                ReferencePrice.currency.label("price_currency"),
+            )
+            .join(
+                ReferencePrice,
+                (func.lower(func.trim(Coin.country)) == ReferencePrice.country)
+                & (func.lower(func.trim(Coin.face_value)) == ReferencePrice.face_value)
+                & (Coin.year == ReferencePrice.year)
+                & (
+                    func.lower(func.trim(func.coalesce(Coin.condition, "")))
+                    == ReferencePrice.condition
+                ),
+            )
+            .where(Coin.id > last_id)
+            .order_by(Coin.id)
+            .limit(batch_size)
+        )
+        if owner_id is not None:
+            match_q = match_q.where(Coin.owner_id == owner_id)
+        rows = db.execute(match_q).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        matched += len(rows)
+
+        ids, current, coin_currencies, prices, price_currencies = zip(*rows)
+        ids = np.array(ids, dtype=np.int64)
+        current = np.array(current, dtype=np.float64)
+        coin_currencies = np.array(coin_currencies, dtype=object)
+        price_currencies = np.array(price_currencies, dtype=object)
+        prices = np.array(prices, dtype=np.float64)
+
+        # Converte o preço do catálogo para a moeda de cada peça (cotação de hoje).
+        days = rate_days([None] * len(ids), None, "as_of")
+        new_values = np.round(fx.convert(prices, price_currencies, days, coin_currencies), 2)
+
+        changed = ~np.isnan(new_values) & (
+            np.isnan(current) | (np.abs(new_values - current) > VALUE_TOLERANCE)
+        )
+        if changed.any():
+            _bulk_update_values(db, ids[changed].tolist(), new_values[changed].tolist())
+            updated += int(changed.sum())
+        db.commit()
+
+    return {"matched": matched, "updated": updated}
+
+
+def _bulk_update_values(db: Session, ids: List[int], new_values: List[float]) -> None:
+    new = values(
+        column("id", Integer), column("estimated_value", Float), name="new_values"
+    ).data(list(zip(ids, new_values)))
+    db.execute(
+        update(Coin)
+        .where(Coin.id == new.c.id)
+        .values(estimated_value=new.c.estimated_value, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,439 @@
+import base64
+import hashlib
+import json
+from types import SimpleNamespace
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import (
+    Select,
+    and_,
+    bindparam,
+    case,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    text,
+    true,
+    tuple_,
+    union_all,
+    update,
+)
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.elements import ClauseElement, ColumnElement
+
+from models.coin import Coin, CoinTombstone, CollectionVersion, natural_key
+
+FACET_FIELDS = ("country", "country_code", "year", "originality", "category", "condition")
+
+# Campos da chave natural (normalizada por models.coin.natural_key).
+NATURAL_KEY = ("owner_id", "country", "year", "face_value", "condition", "originality")
+DUPLICATE_MODES = ("insert", "merge", "skip")
+
+
+def _dimension(field: str) -> str:
+    """`country` (texto livre) e `country_code` são a mesma dimensão de filtro."""
+    return "country" if field == "country_code" else field
+
+
+def _all_of(predicates: Iterable[ColumnElement]) -> ColumnElement:
+    predicates = list(predicates)
+    return and_(*predicates) if predicates else true()
+
+
+def compute_facets(
+    db: Session,
+    base_conditions: List[ColumnElement],
+    facet_conditions: Dict[str, List[ColumnElement]],
+    fields: List[str],
+    max_buckets: int,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Calcula as contagens por faceta em uma única consulta com GROUPING SETS.
+
+    Cada faceta é contada com todos os filtros aplicados, exceto o da própria
+    dimensão (os filtros de país valem como uma só: um país digitado pode
+    virar filtro por código), para que a barra lateral mostre as alternativas disponíveis.
+    Retorna no máximo `max_buckets` valores por faceta, ordenados pela contagem.
+    """
+    if not fields:
+        return {}
+
+    # Filtros de dimensões que não foram pedidas como faceta valem para todas.
+    dimensions = {_dimension(field) for field in fields}
+    fixed = list(base_conditions)
+    for field, predicates in facet_conditions.items():
+        if _dimension(field) not in dimensions:
+            fixed.extend(predicates)
+
+    def others_match(field: str) -> ColumnElement:
+        return _all_of(
+            p
+            for other, predicates in facet_conditions.items()
+            if _dimension(other) != _dimension(field) and _dimension(other) in dimensions
+            for p in predicates
+        )
+
+    columns = {field: getattr(Coin, field) for field in fields}
+    groupings = {field: func.grouping(col) for field, col in columns.items()}
+
+    # GROUPING() não pode aparecer dentro do agregado: calcula uma contagem
+    # filtrada por dimensão e escolhe a do grouping set da linha.
+    bucket_count = case(
+        *[
+            (groupings[field] == 0, func.count().filter(others_match(field)))
+            for field in fields
+        ],
+        else_=0,
+    )
+    grouping_set = func.grouping(*columns.values())
+
+    facets_q = (
+        select(
+            *[col.label(field) for field, col in columns.items()],
+            *[g.label(f"g_{field}") for field, g in groupings.items()],
+            bucket_count.label("count"),
+            func.row_number()
+            .over(partition_by=grouping_set, order_by=bucket_count.desc())
+            .label("position"),
+        )
+        .where(*fixed)
+        # Só interessam linhas que passam em todos os filtros, exceto no máximo um.
+        .where(or_(*[others_match(field) for field in fields]))
+        .group_by(func.grouping_sets(*[tuple_(col) for col in columns.values()]))
+    ).subquery()
+
+    rows = db.execute(
+        select(facets_q)
+        .where(facets_q.c.position <= max_buckets, facets_q.c.count > 0)
+        .order_by(facets_q.c.position)
+    ).mappings()
+
+    facets: Dict[str, List[Dict[str, Any]]] = {field: [] for field in fields}
+    for row in rows:
+        field = next(f for f in fields if row[f"g_{f}"] == 0)
+        value = row[field]
+        facets[field].append(
+            {
+                "value": value.value if hasattr(value, "value") else value,
+                "count": row["count"],
+            }
+        )
+    return facets
+
+
+class _ExplainJson(Executable, ClauseElement):
+    """`EXPLAIN (FORMAT JSON) <consulta>` com os parâmetros ligados normalmente."""
+
+    inherit_cache = False
+
+    def __init__(self, query: Select):
+        self.query = query
+
+
+@compiles(_ExplainJson, "postgresql")
+def _compile_explain_json(element: _ExplainJson, compiler, **kw) -> str:
+    return f"EXPLAIN (FORMAT JSON) {compiler.process(element.query, **kw)}"
+
+
+def explain_plan(db: Session, query: Select) -> Dict[str, Any]:
+    """Plano estimado do Postgres para `query`, sem executá-la."""
+    plan = db.execute(_ExplainJson(query)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def estimate_count(db: Session, query: Select) -> int:
+    """
+    Estima o número de linhas de uma consulta a partir das estatísticas do
+    planejador do Postgres (EXPLAIN), sem executá-la.
+    """
+    return int(explain_plan(db, query)["Plan Rows"])
+
+
+def data_version(db: Session, owner_id: int) -> int:
+    """
+    Versão dos dados de um usuário: muda quando uma moeda é criada, alterada
+    ou excluída. Serve de chave para caches derivados da coleção. É o
+    contador de `CollectionVersion` (uma leitura por chave primária, na
+    ordem de commit), mantido pelos triggers de `change_seq`.
+    """
+    change_seq = db.scalar(
+        select(CollectionVersion.change_seq).where(CollectionVersion.owner_id == owner_id)
+    )
+    return change_seq or 0
+
+
+def encode_cursor(change_seq: int, coin_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{change_seq}:{coin_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Decodifica um cursor do feed de alterações em (change_seq, id). Cursores
+    antigos, de (updated_at, id), voltam ao início: o cliente ressincroniza
+    tudo. Lança ValueError se for inválido.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        if "|" in raw:
+            return 0, 0
+        change_seq, coin_id = raw.split(":")
+        return int(change_seq), int(coin_id)
+    except Exception as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def list_changes(
+    db: Session, owner_id: int, since: Optional[str], limit: int
+) -> Dict[str, Any]:
+    """
+    Lista moedas criadas/alteradas e excluídas após o cursor, em ordem de
+    `change_seq` (a ordem de commit das escritas do usuário, ver
+    CollectionVersion). Uma transação que termina depois nunca fica atrás de
+    um cursor já entregue: basta reenviá-lo para continuar a sincronização.
+    """
+    after = decode_cursor(since) if since else (0, 0)
+    upserts = select(
+        Coin.id.label("coin_id"),
+        Coin.change_seq.label("change_seq"),
+        Coin.updated_at.label("changed_at"),
+        literal(False).label("deleted"),
+    ).where(
+        Coin.owner_id == owner_id,
+        Coin.change_seq >= after[0],
+        tuple_(Coin.change_seq, Coin.id) > after,
+    )
+    deletes = select(
+        CoinTombstone.coin_id.label("coin_id"),
+        CoinTombstone.change_seq.label("change_seq"),
+        CoinTombstone.deleted_at.label("changed_at"),
+        literal(True).label("deleted"),
+    ).where(
+        CoinTombstone.owner_id == owner_id,
+        CoinTombstone.change_seq >= after[0],
+        tuple_(CoinTombstone.change_seq, CoinTombstone.coin_id) > after,
+    )
+
+    # Escritas da mesma transação compartilham o change_seq; o id desempata.
+    feed = union_all(upserts, deletes).subquery()
+    rows = db.execute(
+        select(feed).order_by(feed.c.change_seq, feed.c.coin_id).limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    upsert_ids = [row.coin_id for row in rows if not row.deleted]
+    coins_by_id = {}
+    if upsert_ids:
+        coins = db.execute(select(Coin).where(Coin.id.in_(upsert_ids))).scalars()
+        coins_by_id = {coin.id: coin for coin in coins}
+
+    return {
+        # Moedas excluídas entre as duas consultas aparecem como tombstone depois.
+        "changes": [coins_by_id[i] for i in upsert_ids if i in coins_by_id],
+        "deleted": [
+            {"id": row.coin_id, "deleted_at": row.changed_at} for row in rows if row.deleted
+        ],
+        "next_cursor": encode_cursor(*((rows[-1].change_seq, rows[-1].coin_id) if rows else after)),
+        "has_more": has_more,
+    }
+
+
+def _normalized_keys(db: Session, rows: List[Dict[str, Any]], chunk_size: int = 500) -> List[tuple]:
+    """
+    Chave natural normalizada (`natural_key`) de cada linha, calculada pelo
+    banco com a mesma expressão do índice: um SELECT por linha, unidos em
+    consultas de até `chunk_size` (limite de UNION do SQLite).
+    """
+    columns = Coin.__table__.c
+    keys: List[tuple] = []
+    for start in range(0, len(rows), chunk_size):
+        selects = [
+            select(
+                literal(position).label("position"),
+                *natural_key(
+                    SimpleNamespace(**{field: literal(row[field], columns[field].type) for field in NATURAL_KEY})
+                ),
+            )
+            for position, row in enumerate(rows[start:start + chunk_size])
+        ]
+        query = selects[0] if len(selects) == 1 else union_all(*selects)
+        chunk = sorted(tuple(row) for row in db.execute(query))
+        keys.extend(tuple(key) for _, *key in chunk)
+    return keys
+
+
+def _lock_natural_keys(db: Session, keys: Iterable[tuple]) -> None:
+    """
+    Advisory locks (até o fim da transação) nas chaves naturais, em ordem
+    fixa para não haver deadlock: dois upserts da mesma moeda não podem
+    ambos achar que ela não existe e inserir duas linhas. Só no Postgres.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    lock_ids = sorted(
+        {
+            int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "big", signed=True)
+            for key in keys
+        }
+    )
+    if lock_ids:
+        db.execute(
+            text("SELECT pg_advisory_xact_lock(lock_id) FROM unnest(CAST(:lock_ids AS bigint[])) AS lock_id ORDER BY lock_id"),
+            {"lock_ids": lock_ids},
+        )
+
+
+def _existing_natural_keys(db: Session, keys: Iterable[tuple]) -> Dict[tuple, int]:
+    """Id da moeda mais antiga de cada chave natural (normalizada) que já existe."""
+    keys = list(set(keys))
+    if not keys:
+        return {}
+    key = natural_key(Coin)
+    rows = db.execute(
+        select(func.min(Coin.id), *key).where(tuple_(*key).in_(keys)).group_by(*key)
+    ).all()
+    return {tuple(found): coin_id for coin_id, *found in rows}
+
+
+def _add_quantities(db: Session, added: Dict[int, int]) -> None:
+    """Soma `added[id]` à quantidade de cada moeda, num único executemany."""
+    if not added:
+        return
+    db.connection().execute(
+        update(Coin)
+        .where(Coin.id == bindparam("coin_id"))
+        .values(quantity=Coin.quantity + bindparam("added"), updated_at=func.now()),
+        [{"coin_id": coin_id, "added": quantity} for coin_id, quantity in added.items()],
+    )
+
+
+def upsert_coins(
+    db: Session,
+    rows: List[Dict[str, Any]],
+    on_duplicate: str = "insert",
+    batch_size: int = 1_000,
+) -> Dict[str, int]:
+    """
+    Insere moedas em lote. Com `insert` (padrão), toda linha vira uma moeda
+    nova. Com `merge`, uma moeda com a mesma chave natural (`natural_key`:
+    a mesma comparação de `find_duplicates`) de uma existente soma sua
+    quantidade à mais antiga delas; com `skip`, é ignorada. As chaves do
+    lote ficam travadas (advisory lock) até o commit, então importações
+    simultâneas não duplicam a mesma moeda. Não faz commit.
+    """
+    if on_duplicate == "insert":
+        if rows:
+            db.execute(insert(Coin), rows)
+        return {"inserted": len(rows), "merged": 0, "skipped": 0}
+
+    inserted = merged = skipped = 0
+    for start in range(0, len(rows), batch_size):
+        chunk = rows[start:start + batch_size]
+        # Repetições no mesmo lote são resolvidas antes da consulta ao banco.
+        batch: Dict[tuple, Dict[str, Any]] = {}
+        for key, row in zip(_normalized_keys(db, chunk), chunk):
+            if key not in batch:
+                batch[key] = dict(row)
+            elif on_duplicate == "merge":
+                batch[key]["quantity"] += row["quantity"]
+                merged += 1
+            else:
+                skipped += 1
+
+        _lock_natural_keys(db, batch)
+        existing = _existing_natural_keys(db, batch)
+        new_rows = [row for key, row in batch.items() if key not in existing]
+        if on_duplicate == "merge":
+            _add_quantities(db, {coin_id: batch[key]["quantity"] for key, coin_id in existing.items()})
+            merged += len(existing)
+        else:
+            skipped += len(existing)
+        if new_rows:
+            db.execute(insert(Coin), new_rows)
+        inserted += len(new_rows)
+
+    return {"inserted": inserted, "merged": merged, "skipped": skipped}
+
+
+def merge_coin(db: Session, values: Dict[str, Any]) -> Coin:
+    """Insere uma moeda ou soma sua quantidade à moeda igual já existente. Não faz commit."""
+    [key] = _normalized_keys(db, [values])
+    _lock_natural_keys(db, [key])
+    coin_id = _existing_natural_keys(db, [key]).get(key)
+    if coin_id is None:
+        coin = Coin(**values)
+        db.add(coin)
+        db.flush()
+        return coin
+    _add_quantities(db, {coin_id: values["quantity"]})
+    return db.get(Coin, coin_id, populate_existing=True)
+
+
+def merge_duplicates(db: Session, owner_id: int, ids: List[int]) -> Optional[Coin]:
+    """
+    Junta moedas repetidas do usuário (um grupo de `find_duplicates`) na mais
+    antiga de `ids`: ela fica com a soma das quantidades e mantém os próprios
+    dados; as demais são excluídas, com tombstone. None se algum id não
+    existir ou for de outro usuário; ValueError se as moedas não tiverem a
+    mesma chave natural. Não faz commit.
+    """
+    rows = db.execute(
+        select(Coin, *natural_key(Coin))
+        .where(Coin.owner_id == owner_id, Coin.id.in_(ids))
+        .order_by(Coin.id)
+        .with_for_update(of=Coin)
+    ).all()
+    if len(rows) != len(set(ids)):
+        return None
+    if len({tuple(key) for _, *key in rows}) > 1:
+        raise ValueError("Only coins with the same country, year, face value, condition and originality can be merged.")
+    keep, *others = [coin for coin, *_ in rows]
+    keep.quantity = sum(coin.quantity for coin, *_ in rows)
+    for coin in others:
+        db.add(CoinTombstone(coin_id=coin.id, owner_id=owner_id))
+        db.delete(coin)
+    db.flush()
+    return keep
+
+
+def find_duplicates(db: Session, owner_id: int, limit: int) -> List[Dict[str, Any]]:
+    """
+    Grupos de moedas do usuário com a mesma chave natural (`natural_key`):
+    país, valor facial e estado sem diferenciar maiúsculas nem espaços.
+    """
+    _, country, year, face_value, condition, originality = natural_key(Coin)
+    key = (
+        country.label("country"),
+        year,
+        face_value.label("face_value"),
+        condition.label("condition"),
+        originality,
+    )
+    query = (
+        select(
+            *key,
+            func.count(Coin.id).label("coins"),
+            func.sum(Coin.quantity).label("total_quantity"),
+            func.array_agg(aggregate_order_by(Coin.id, Coin.id)).label("ids"),
+        )
+        .where(Coin.owner_id == owner_id)
+        .group_by(*key)
+        .having(func.count(Coin.id) > 1)
+        .order_by(func.count(Coin.id).desc())
+        .limit(limit)
+    )
+    return [
+        {
+            **row,
+            "condition": row["condition"] or None,
+            "originality": getattr(row["originality"], "value", row["originality"]),
+        }
+        for row in db.execute(query).mappings()
+    ]
@@ -0,0 +1,170 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.coin import Coin
+from models.country import Country
+from services.coin_service import data_version
+
+# Colunas de texto guardadas como códigos inteiros + dicionário (-1 = nulo).
+DICTIONARY_FIELDS = (
+    "country",
+    "country_code",
+    "country_name",
+    "category",
+    "condition",
+    "originality",
+    "currency",
+)
+NUMERIC_FIELDS = ("estimated_value", "purchase_price", "quantity")
+
+
+def _encode(values: Sequence[Any]) -> Tuple[np.ndarray, List[Any]]:
+    """Codifica `values` como índices em `labels` (nulo vira -1)."""
+    labels = [v for v in dict.fromkeys(values) if v is not None]
+    index = {label: code for code, label in enumerate(labels)}
+    index[None] = -1
+    dtype = np.int16 if len(labels) < np.iinfo(np.int16).max else np.int32
+    codes = np.fromiter(map(index.__getitem__, values), dtype=dtype, count=len(values))
+    return codes, labels
+
+
+class CollectionColumns:
+    """
+    A coleção de um usuário em arrays NumPy, uma posição por moeda: ano,
+    valores e quantidade numéricos, textos codificados por dicionário e a
+    data de aquisição em dias. Imutável: uma escrita na coleção gera outra
+    versão (ver `data_version`).
+    """
+
+    def __init__(self, rows: Sequence[Sequence[Any]]):
+        (
+            country, country_code, country_name, category, condition, originality,
+            currency, year, estimated, purchase, quantity, acquired,
+        ) = list(zip(*rows)) if rows else [()] * 12
+        self.size = len(rows)
+        self.codes: Dict[str, np.ndarray] = {}
+        self.labels: Dict[str, List[Any]] = {}
+        originality = [getattr(o, "value", o) for o in originality]
+        for field, values in zip(
+            DICTIONARY_FIELDS,
+            (country, country_code, country_name, category, condition, originality, currency),
+        ):
+            self.codes[field], self.labels[field] = _encode(values)
+
+        self.year = np.array(year, dtype=np.int32)
+        # NaN para nulo; a quantidade também fica em float para somar sem conversões.
+        self.numeric = {
+            "estimated_value": np.array(estimated, dtype=np.float64),
+            "purchase_price": np.array(purchase, dtype=np.float64),
+            "quantity": np.array(quantity, dtype=np.float64),
+        }
+        self.acquisition_day = np.array(acquired, dtype="datetime64[D]")
+
+        arrays = [self.year, self.acquisition_day, *self.codes.values(), *self.numeric.values()]
+        # Os dicionários são pequenos perto dos arrays: estimativa por rótulo.
+        labels = sum(len(labels) for labels in self.labels.values())
+        self.nbytes = sum(a.nbytes for a in arrays) + labels * 64
+
+    def decoded(self, field: str) -> np.ndarray:
+        """Valores de uma coluna de dicionário como array de objetos (None para nulo)."""
+        labels = np.array([*self.labels[field], None], dtype=object)
+        return labels[self.codes[field]]
+
+
+def _load(db: Session, owner_id: int) -> CollectionColumns:
+    """Uma única consulta de colunas, direto na conexão (sem a camada de resultados do ORM)."""
+    rows = db.connection().execute(
+        select(
+            Coin.country,
+            Coin.country_code,
+            func.coalesce(Country.name, func.trim(Coin.country)),
+            Coin.category,
+            Coin.condition,
+            Coin.originality,
+            Coin.currency,
+            Coin.year,
+            Coin.estimated_value,
+            Coin.purchase_price,
+            Coin.quantity,
+            Coin.acquisition_date,
+        )
+        .outerjoin(Country, Country.code == Coin.country_code)
+        .where(Coin.owner_id == owner_id)
+    ).all()
+    return CollectionColumns(rows)
+
+
+class ColumnsCache:
+    """
+    LRU de `CollectionColumns` por usuário limitado pelo total de bytes dos
+    arrays. Cada entrada guarda a versão dos dados com que foi carregada;
+    versão diferente (moeda criada, alterada ou excluída) recarrega.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[Hashable, Tuple[Any, CollectionColumns]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, owner_id: int, version: Any) -> Optional[CollectionColumns]:
+        with self._lock:
+            item = self._data.get(owner_id)
+            if item is None or item[0] != version:
+                return None
+            self._data.move_to_end(owner_id)
+            return item[1]
+
+    def set(self, owner_id: int, version: Any, columns: CollectionColumns) -> None:
+        size = columns.nbytes
+        with self._lock:
+            self._discard(owner_id)
+            if size > self.max_bytes:
+                return
+            self._data[owner_id] = (version, columns)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._discard(next(iter(self._data)))
+
+    def invalidate(self, owner_id: int) -> None:
+        with self._lock:
+            self._discard(owner_id)
+
+    def _discard(self, owner_id: int) -> None:
+        item = self._data.pop(owner_id, None)
+        if item is not None:
+            self._bytes -= item[1].nbytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes}
+
+
+columns_cache = ColumnsCache(settings.COLLECTION_COLUMNS_MAX_BYTES)
+
+
+def get_collection_columns(
+    db: Session, owner_id: int, version: Any = None
+) -> Optional[CollectionColumns]:
+    """
+    Snapshot colunar atual da coleção, carregado na primeira leitura depois
+    de cada alteração. None se desabilitado ou se a coleção passa de
+    COLLECTION_COLUMNS_MAX_ROWS (quem chama usa o caminho SQL).
+    """
+    if not settings.COLLECTION_COLUMNS_ENABLED:
+        return None
+    version = version if version is not None else data_version(db, owner_id)
+    columns = columns_cache.get(owner_id, version)
+    if columns is None:
+        total = db.scalar(select(func.count()).where(Coin.owner_id == owner_id))
+        if total > settings.COLLECTION_COLUMNS_MAX_ROWS:
+            return None
+        columns = _load(db, owner_id)
+        columns_cache.set(owner_id, version, columns)
+    return columns
@@ -0,0 +1,219 @@
+import io
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import annotated_types
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.admission import admission_slot, set_local_statement_timeout
+from models.coin import Coin, OriginalityEnum
+from schemas.coin import CoinCreate
+
+COLUMNAR_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "coins.parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "coins.arrows"),
+}
+# Arquivos Arrow IPC no formato de arquivo começam (e terminam) com estes bytes;
+# o formato de streaming não tem marcador.
+ARROW_FILE_MAGIC = b"ARROW1"
+
+# Tipos das colunas exportadas (mesmos campos de CoinRead).
+ARROW_SCHEMA = pa.schema(
+    [
+        ("id", pa.int64()),
+        ("owner_id", pa.int64()),
+        ("quantity", pa.int32()),
+        ("year", pa.int32()),
+        ("country", pa.string()),
+        ("country_code", pa.string()),
+        ("face_value", pa.string()),
+        ("purchase_price", pa.float64()),
+        ("estimated_value", pa.float64()),
+        ("currency", pa.string()),
+        ("originality", pa.dictionary(pa.int8(), pa.string())),
+        ("condition", pa.string()),
+        ("storage_location", pa.string()),
+        ("category", pa.string()),
+        ("acquisition_date", pa.timestamp("us")),
+        ("acquisition_source", pa.string()),
+        ("notes", pa.string()),
+        ("image_url_front", pa.string()),
+        ("image_url_back", pa.string()),
+        ("created_at", pa.timestamp("us", tz="UTC")),
+        ("updated_at", pa.timestamp("us", tz="UTC")),
+    ]
+)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Arquivo só de escrita que acumula bytes até serem drenados para a resposta."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _record_batch(rows: List[Tuple[Any, ...]]) -> pa.RecordBatch:
+    columns = list(zip(*rows))
+    arrays = []
+    for field, values in zip(ARROW_SCHEMA, columns):
+        if field.name == "originality":
+            values = [v.value if v is not None else None for v in values]
+            arrays.append(pa.array(values, pa.string()).dictionary_encode().cast(field.type))
+        else:
+            arrays.append(pa.array(values, field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=ARROW_SCHEMA)
+
+
+def stream_export(
+    owner_id: int,
+    format: str,
+    open_session: Callable[[], Session],
+    batch_size: int = 50_000,
+) -> Iterator[bytes]:
+    """
+    Exporta as moedas do usuário em Parquet (um row group por lote) ou Arrow
+    IPC, lendo por um cursor do lado do servidor.
+
+    O corpo da resposta é gerado depois que a requisição (e suas
+    dependências) já terminou, então o gerador toma a própria vaga de
+    admissão "export" e abre a própria sessão com `open_session` (réplica
+    quando possível), com o statement_timeout da exportação. O primeiro
+    item é o cabeçalho do arquivo, devolvido logo depois da admissão: quem
+    chama pode consumi-lo antes de começar a resposta para que uma recusa
+    (503) ainda vire um erro HTTP.
+    """
+    columns = [getattr(Coin, name) for name in ARROW_SCHEMA.names]
+    sink = _ChunkSink()
+
+    with admission_slot("export"):
+        db = open_session()
+        try:
+            set_local_statement_timeout(db, "export")
+            writer = (
+                pq.ParquetWriter(sink, ARROW_SCHEMA, compression="zstd")
+                if format == "parquet"
+                else pa.ipc.new_stream(sink, ARROW_SCHEMA)
+            )
+            yield sink.drain()
+
+            result = db.execute(
+                select(*columns).where(Coin.owner_id == owner_id).order_by(Coin.id),
+                execution_options={"stream_results": True, "yield_per": batch_size},
+            )
+            for rows in result.partitions():
+                writer.write_batch(_record_batch(rows))
+                yield sink.drain()
+
+            writer.close()
+            yield sink.drain()
+        finally:
+            db.close()
+
+
+def _field_constraints(name: str) -> Dict[str, Any]:
+    constraints: Dict[str, Any] = {}
+    for meta in CoinCreate.model_fields[name].metadata:
+        if isinstance(meta, annotated_types.MaxLen):
+            constraints["max_length"] = meta.max_length
+        elif isinstance(meta, annotated_types.Ge):
+            constraints["ge"] = meta.ge
+        elif isinstance(meta, annotated_types.Gt):
+            constraints["gt"] = meta.gt
+        elif getattr(meta, "pattern", None):
+            constraints["pattern"] = meta.pattern
+    return constraints
+
+
+def _import_type(name: str) -> pa.DataType:
+    return pa.string() if name == "originality" else ARROW_SCHEMA.field(name).type
+
+
+def validate_batch(batch: pa.RecordBatch) -> Tuple[pa.Table, int]:
+    """
+    Valida um lote inteiro de uma vez com as mesmas regras de CoinCreate
+    (obrigatórios, tamanhos, limites, padrões e valores do enum), usando
+    pyarrow.compute. Retorna as linhas válidas e quantas foram rejeitadas.
+    """
+    size = batch.num_rows
+    valid = pa.array([True] * size)
+    arrays = {}
+
+    for name, field in CoinCreate.model_fields.items():
+        target = _import_type(name)
+        if name in batch.schema.names:
+            array = batch.column(name)
+            if pa.types.is_dictionary(array.type):
+                array = array.dictionary_decode()
+            try:
+                array = array.cast(target)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                return pa.table({}), size
+        else:
+            default = field.default if not field.is_required() else None
+            default = getattr(default, "value", default)
+            array = pa.array([default] * size, target)
+
+        if field.is_required() or field.default is not None:
+            valid = pc.and_(valid, pc.is_valid(array))
+
+        rules = _field_constraints(name)
+        checks = []
+        if "max_length" in rules:
+            checks.append(pc.less_equal(pc.utf8_length(array), rules["max_length"]))
+        if "ge" in rules:
+            checks.append(pc.greater_equal(array, rules["ge"]))
+        if "gt" in rules:
+            checks.append(pc.greater(array, rules["gt"]))
+        if "pattern" in rules:
+            checks.append(pc.match_substring_regex(array, rules["pattern"]))
+        if name == "originality":
+            array = pc.utf8_lower(array)
+            checks.append(pc.is_in(array, value_set=pa.array([e.value for e in OriginalityEnum])))
+        for check in checks:
+            # Nulo passa aqui; obrigatoriedade já foi tratada acima.
+            valid = pc.and_(valid, pc.fill_null(check, True))
+        arrays[name] = array
+
+    table = pa.table(arrays).filter(valid)
+    return table, size - table.num_rows
+
+
+def iter_import_batches(content: bytes, format: str, batch_size: int = 50_000) -> Iterator[pa.RecordBatch]:
+    if format == "parquet":
+        yield from pq.ParquetFile(io.BytesIO(content)).iter_batches(batch_size=batch_size)
+    elif content.startswith(ARROW_FILE_MAGIC):
+        # Formato de arquivo do Arrow (.arrow/.feather v2), com rodapé e acesso aleatório.
+        reader = pa.ipc.open_file(content)
+        for index in range(reader.num_record_batches):
+            yield reader.get_batch(index)
+    else:
+        yield from pa.ipc.open_stream(content)
+
+
+def columnar_rows(content: bytes, format: str, owner_id: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Linhas válidas (prontas para upsert) e número de linhas rejeitadas do arquivo."""
+    rows: List[Dict[str, Any]] = []
+    errors = 0
+    for batch in iter_import_batches(content, format):
+        table, rejected = validate_batch(batch)
+        errors += rejected
+        for row in table.to_pylist():
+            row["originality"] = OriginalityEnum(row["originality"])
+            row["owner_id"] = owner_id
+            rows.append(row)
+    return rows, errors
@@ -0,0 +1,140 @@
+import csv
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import settings
+from models.coin import Coin
+from models.country import Country, CountryAlias
+
+_alias_cache = TTLCache(maxsize=1, ttl=settings.COUNTRY_ALIAS_CACHE_TTL_SECONDS)
+
+
+def normalize_country(value: str) -> str:
+    """Chave de comparação: minúsculas e espaços simples."""
+    return " ".join(value.split()).lower()
+
+
+def _strip_accents(value: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", value)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def alias_keys(names: Iterable[str]) -> Set[str]:
+    """Chaves normalizadas de cada nome, com e sem acentos."""
+    keys = set()
+    for name in names:
+        if name and name.strip():
+            key = normalize_country(name)
+            keys.update((key, _strip_accents(key)))
+    return keys
+
+
+def parse_countries_csv(stream: TextIO) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Lê um CSV com colunas `code,name,aliases` (aliases separados por `|`).
+    Retorna as linhas de `countries` e de `country_aliases`; um alias
+    repetido vale para o primeiro país em que aparece.
+    """
+    countries: List[Dict[str, str]] = []
+    aliases: Dict[str, str] = {}
+    for row in csv.DictReader(stream):
+        code = row["code"].strip().upper()
+        name = row["name"].strip()
+        countries.append({"code": code, "name": name})
+        names = [code, name, *(row.get("aliases") or "").split("|")]
+        for key in alias_keys(names):
+            aliases.setdefault(key, code)
+    return countries, [{"alias": a, "country_code": c} for a, c in aliases.items()]
+
+
+def load_countries_csv(db: Session, stream: TextIO) -> int:
+    """Importa/atualiza países e aliases a partir do CSV. Retorna o número de países."""
+    countries, aliases = parse_countries_csv(stream)
+    if countries:
+        stmt = insert(Country).values(countries)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[Country.code], set_={"name": stmt.excluded.name}
+            )
+        )
+    if aliases:
+        stmt = insert(CountryAlias).values(aliases)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[CountryAlias.alias],
+                set_={"country_code": stmt.excluded.country_code},
+            )
+        )
+    db.commit()
+    _alias_cache.clear()
+    return len(countries)
+
+
+def get_country_aliases(db: Session) -> Dict[str, str]:
+    """Mapa alias -> código em memória, recarregado a cada COUNTRY_ALIAS_CACHE_TTL_SECONDS."""
+    aliases = _alias_cache.get("aliases")
+    if aliases is None:
+        aliases = dict(db.execute(select(CountryAlias.alias, CountryAlias.country_code)).all())
+        _alias_cache.set("aliases", aliases)
+    return aliases
+
+
+def lookup_country_code(aliases: Dict[str, str], name: Optional[str]) -> Optional[str]:
+    """Código ISO de `name` num mapa alias -> código; None se não for reconhecido."""
+    if not name or not name.strip():
+        return None
+    key = normalize_country(name)
+    return aliases.get(key) or aliases.get(_strip_accents(key))
+
+
+def resolve_country_code(db: Session, name: Optional[str]) -> Optional[str]:
+    """Código ISO do país pelo nome, código ou alias; None se não for reconhecido."""
+    return lookup_country_code(get_country_aliases(db), name)
+
+
+def assign_country_codes(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Preenche `country_code` em linhas prontas para inserção (importação)."""
+    for row in rows:
+        row["country_code"] = resolve_country_code(db, row.get("country"))
+
+
+def backfill_country_codes(
+    db: Session, batch_size: int = 5_000, pause_seconds: float = 0.05
+) -> int:
+    """
+    Resolve `country_code` das moedas existentes em lotes de ids, com commit
+    e uma pausa curta por lote para não segurar locks nem saturar o banco.
+    Os nomes são resolvidos em Python, com a mesma normalização (acentos,
+    maiúsculas, espaços) das moedas novas, e `updated_at` avança para os
+    clientes verem a alteração. Retorna quantas moedas foram atualizadas.
+    """
+    aliases = get_country_aliases(db)
+    max_id = db.scalar(select(func.coalesce(func.max(Coin.id), 0)))
+    updated = 0
+    for low in range(0, max_id, batch_size):
+        rows = db.execute(
+            select(Coin.id, Coin.country).where(
+                Coin.id > low, Coin.id <= low + batch_size, Coin.country_code.is_(None)
+            )
+        ).all()
+        ids_by_code: Dict[str, List[int]] = {}
+        for coin_id, country in rows:
+            code = lookup_country_code(aliases, country)
+            if code:
+                ids_by_code.setdefault(code, []).append(coin_id)
+        for code, ids in ids_by_code.items():
+            updated += db.execute(
+                update(Coin)
+                .where(Coin.id.in_(ids), Coin.country_code.is_(None))
+                .values(country_code=code, updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        db.commit()
+        time.sleep(pause_seconds)
+    return updated
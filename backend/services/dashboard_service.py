@@ -0,0 +1,156 @@
+from datetime import date
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models.coin import Coin, OriginalityEnum
+from models.country import Country
+from services.collection_columns_service import CollectionColumns, get_collection_columns
+from services.valuation_service import rate_days, valuate_arrays, valuate_collection
+
+
+def _summary_from_columns(columns: CollectionColumns) -> Dict[str, Any]:
+    """Resumo da coleção calculado sobre o snapshot colunar."""
+    # Grupos por (código canônico, nome exibido), como o GROUP BY do SQL.
+    code_codes, code_labels = columns.codes["country_code"], columns.labels["country_code"]
+    name_codes, name_labels = columns.codes["country_name"], columns.labels["country_name"]
+    keys = (code_codes.astype(np.int64) + 1) * (len(name_labels) + 1) + name_codes + 1
+    keys, counts = np.unique(keys, return_counts=True)
+    by_country = []
+    for key, count in sorted(zip(keys.tolist(), counts.tolist()), key=lambda kc: -kc[1]):
+        code, name = divmod(key, len(name_labels) + 1)
+        by_country.append({
+            "country_code": code_labels[code - 1] if code else None,
+            "country": name_labels[name - 1] if name else None,
+            "count": count,
+        })
+    # País canônico quando reconhecido; senão, o nome digitado (normalizado).
+    total_countries = len({
+        row["country_code"] or (row["country"] or "").lower() for row in by_country
+    })
+
+    years, year_counts = np.unique(columns.year, return_counts=True)
+
+    originality_codes = columns.codes["originality"]
+    originality_counts = np.bincount(
+        originality_codes[originality_codes >= 0], minlength=len(columns.labels["originality"])
+    )
+    by_originality = sorted(
+        (
+            {"originality": label, "count": count}
+            for label, count in zip(columns.labels["originality"], originality_counts.tolist())
+        ),
+        key=lambda row: -row["count"],
+    )
+    by_value = {row["originality"]: row["count"] for row in by_originality}
+
+    return {
+        "total_coins": columns.size,
+        "total_countries": total_countries,
+        "total_originals": by_value.get(OriginalityEnum.ORIGINAL.value, 0),
+        "total_replicas": by_value.get(OriginalityEnum.REPLICA.value, 0),
+        "total_estimated_value": float(np.nansum(columns.numeric["estimated_value"])),
+        "by_country": by_country,
+        "by_year": [
+            {"year": year, "count": count}
+            for year, count in zip(years.tolist(), year_counts.tolist())
+        ],
+        "by_originality": by_originality,
+    }
+
+
+def _summary_from_sql(db: Session, owner_id: int) -> Dict[str, Any]:
+    owned = Coin.owner_id == owner_id
+    total_coins, total_originals, total_replicas, total_estimated_value = db.execute(
+        select(
+            func.count(),
+            func.count().filter(Coin.originality == OriginalityEnum.ORIGINAL),
+            func.count().filter(Coin.originality == OriginalityEnum.REPLICA),
+            func.sum(Coin.estimated_value),
+        ).where(owned)
+    ).one()
+
+    # País canônico quando reconhecido; senão, o nome digitado (normalizado).
+    country_key = func.coalesce(Coin.country_code, func.lower(func.trim(Coin.country)))
+    total_countries = db.scalar(select(func.count(func.distinct(country_key))).where(owned)) or 0
+
+    country_name = func.coalesce(Country.name, func.trim(Coin.country))
+    by_country = db.execute(
+        select(
+            Coin.country_code,
+            country_name.label("country"),
+            func.count(Coin.id).label("count"),
+        )
+        .outerjoin(Country, Country.code == Coin.country_code)
+        .where(owned)
+        .group_by(Coin.country_code, country_name)
+        .order_by(func.count(Coin.id).desc())
+    ).mappings().all()
+
+    by_year = db.execute(
+        select(Coin.year, func.count(Coin.id).label("count"))
+        .where(owned)
+        .group_by(Coin.year)
+        .order_by(Coin.year.asc())
+    ).mappings().all()
+
+    by_originality = db.execute(
+        select(Coin.originality, func.count(Coin.id).label("count"))
+        .where(owned)
+        .group_by(Coin.originality)
+        .order_by(func.count(Coin.id).desc())
+    ).mappings().all()
+
+    return {
+        "total_coins": total_coins,
+        "total_countries": total_countries,
+        "total_originals": total_originals,
+        "total_replicas": total_replicas,
+        "total_estimated_value": total_estimated_value or 0.0,
+        "by_country": by_country,
+        "by_year": by_year,
+        "by_originality": [
+            {
+                "originality": getattr(row["originality"], "value", row["originality"]),
+                "count": row["count"],
+            }
+            for row in by_originality
+        ],
+    }
+
+
+def collection_summary(
+    db: Session,
+    owner_id: int,
+    currency: Optional[str] = None,
+    as_of: Optional[date] = None,
+    rate_basis: str = "as_of",
+) -> Dict[str, Any]:
+    """
+    Resumo do dashboard. Usa o snapshot colunar da coleção quando disponível
+    (uma consulta de versão por leitura) e cai nas consultas SQL quando ele
+    está desabilitado ou a coleção é grande demais. Com `currency`, os
+    totais de valor são convertidos; sem ela, somados como estão.
+    """
+    columns = get_collection_columns(db, owner_id)
+    if columns is not None:
+        summary = _summary_from_columns(columns)
+    else:
+        summary = _summary_from_sql(db, owner_id)
+
+    if not currency:
+        return summary
+    if columns is not None:
+        valuation = valuate_arrays(
+            db,
+            currency,
+            columns.decoded("currency"),
+            columns.numeric["estimated_value"],
+            columns.numeric["purchase_price"],
+            rate_days(columns.acquisition_day, as_of, rate_basis),
+        )
+    else:
+        valuation = valuate_collection(db, owner_id, currency, as_of, rate_basis)
+    return {**valuation, **summary, "total_estimated_value": valuation["total_estimated_value"]}
@@ -0,0 +1,221 @@
+import io
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from loguru import logger
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.database import SessionLocal
+from models.coin import Coin
+
+IMAGE_SIDES = ("front", "back")
+
+# Número de bits 1 em cada byte, para calcular a distância de Hamming.
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(data: bytes) -> Optional[int]:
+    """
+    Hash perceptual (dHash de 64 bits) de uma imagem: compara o brilho de
+    pixels vizinhos numa miniatura 9x8 em tons de cinza. Retorna um inteiro
+    com sinal (cabe em BIGINT) ou None se a imagem não puder ser lida.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            pixels = np.asarray(
+                image.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16
+            )
+    except (UnidentifiedImageError, OSError):
+        return None
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int(np.frombuffer(bits.tobytes(), dtype=">i8")[0])
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Distância de Hamming de `value` para cada hash do array (int64)."""
+    xor = (hashes ^ np.int64(value)).view(np.uint64)
+    if hasattr(np, "bitwise_count"):  # NumPy 2.0+
+        return np.bitwise_count(xor)
+    return _POPCOUNT[xor.view(np.uint8)].reshape(len(xor), 8).sum(axis=1)
+
+
+class _HashArrays:
+    """Hashes num array NumPy contíguo, com o id e o dono da moeda de cada posição."""
+
+    def __init__(self, capacity: int):
+        self.hashes = np.zeros(capacity, dtype=np.int64)
+        self.coin_ids = np.full(capacity, -1, dtype=np.int64)
+        self.owner_ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self.positions: Dict[Tuple[int, str], int] = {}
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Tuple[int, int, Optional[int], Optional[int]]]) -> "_HashArrays":
+        data = cls(max(1024, 2 * len(rows)))
+        for coin_id, owner_id, front, back in rows:
+            data.apply(coin_id, owner_id, "front", front)
+            data.apply(coin_id, owner_id, "back", back)
+        return data
+
+    def apply(self, coin_id: int, owner_id: int, side: str, value: Optional[int]) -> None:
+        """Grava o hash de um lado da moeda (None remove)."""
+        if value is None:
+            position = self.positions.pop((coin_id, side), None)
+            if position is not None:
+                self.coin_ids[position] = -1
+            return
+        position = self.positions.get((coin_id, side))
+        if position is None:
+            if self.size == len(self.hashes):
+                capacity = max(1024, 2 * len(self.hashes))
+                for name in ("hashes", "coin_ids", "owner_ids"):
+                    old = getattr(self, name)
+                    grown = np.full(capacity, -1 if name == "coin_ids" else 0, dtype=np.int64)
+                    grown[: len(old)] = old
+                    setattr(self, name, grown)
+            position = self.size
+            self.size += 1
+            self.positions[(coin_id, side)] = position
+        self.hashes[position] = value
+        self.coin_ids[position] = coin_id
+        self.owner_ids[position] = owner_id
+
+
+class ImageHashIndex:
+    """
+    Índice em memória dos hashes das imagens das moedas.
+
+    Os hashes ficam num array NumPy contíguo; a busca calcula a distância de
+    Hamming para todos de uma vez (XOR + contagem de bits) e usa
+    argpartition para o top-k. É carregado na primeira busca e atualizado a
+    cada upload/exclusão deste processo. Para ver escritas de outros
+    processos, a cada IMAGE_INDEX_REFRESH_SECONDS uma thread relê tudo do
+    banco e troca o índice de uma vez; as buscas continuam no índice antigo
+    enquanto isso, e as alterações feitas durante a releitura são
+    reaplicadas no novo antes da troca.
+    """
+
+    def __init__(self, refresh_seconds: float, session_factory: Callable[[], Session] = SessionLocal):
+        self.refresh_seconds = refresh_seconds
+        self.session_factory = session_factory
+        # `_lock` protege o índice atual e é segurado só por operações em
+        # memória; `_load_lock` serializa as releituras do banco.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._data: Optional[_HashArrays] = None
+        self._loaded_at: Optional[float] = None
+        self._refreshing = False
+        # Alterações recebidas durante uma releitura (None fora dela).
+        self._pending: Optional[List[Tuple[int, int, str, Optional[int]]]] = None
+
+    def refresh(self, db: Session) -> None:
+        """Relê todos os hashes do banco, fora do lock das buscas, e troca o índice."""
+        with self._load_lock:
+            self._refresh(db)
+
+    def _refresh(self, db: Session) -> None:
+        with self._lock:
+            self._pending = []
+        try:
+            rows = db.execute(
+                select(Coin.id, Coin.owner_id, Coin.image_hash_front, Coin.image_hash_back).where(
+                    (Coin.image_hash_front.is_not(None)) | (Coin.image_hash_back.is_not(None))
+                )
+            ).all()
+            data = _HashArrays.from_rows(rows)
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for change in self._pending:
+                data.apply(*change)
+            self._data, self._pending, self._loaded_at = data, None, time.monotonic()
+
+    def _refresh_in_background(self) -> None:
+        try:
+            with self.session_factory() as db:
+                self.refresh(db)
+        except Exception:
+            logger.exception("Image hash index refresh failed")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _ensure_loaded(self, db: Session) -> None:
+        """Carrega na primeira busca; depois, só agenda a releitura quando vence."""
+        with self._lock:
+            loaded = self._data is not None
+            stale = loaded and time.monotonic() - self._loaded_at > self.refresh_seconds
+            if stale and not self._refreshing:
+                self._refreshing = True
+            else:
+                stale = False
+        if stale:
+            threading.Thread(
+                target=self._refresh_in_background, name="image-index-refresh", daemon=True
+            ).start()
+        if not loaded:
+            with self._load_lock:
+                if self._data is None:
+                    self._refresh(db)
+
+    def _apply(self, coin_id: int, owner_id: int, side: str, value: Optional[int]) -> None:
+        # Chamado com `_lock`.
+        if self._pending is not None:
+            self._pending.append((coin_id, owner_id, side, value))
+        if self._data is not None:
+            self._data.apply(coin_id, owner_id, side, value)
+
+    def update(self, coin_id: int, owner_id: int, side: str, value: Optional[int]) -> None:
+        """Registra o hash de uma imagem enviada (se o índice já estiver carregado)."""
+        with self._lock:
+            self._apply(coin_id, owner_id, side, value)
+
+    def remove(self, coin_id: int) -> None:
+        with self._lock:
+            for side in IMAGE_SIDES:
+                self._apply(coin_id, 0, side, None)
+
+    def search(
+        self,
+        db: Session,
+        value: int,
+        k: int,
+        max_distance: int,
+        owner_id: Optional[int] = None,
+    ) -> List[Tuple[int, int]]:
+        """Top-k moedas (id, distância) mais parecidas, considerando frente e verso."""
+        self._ensure_loaded(db)
+        with self._lock:
+            data = self._data
+            size = data.size
+            distances = hamming_distances(data.hashes[:size], value)
+            mask = (data.coin_ids[:size] >= 0) & (distances <= max_distance)
+            if owner_id is not None:
+                mask &= data.owner_ids[:size] == owner_id
+            candidates = np.flatnonzero(mask)
+
+            # Cada moeda pode aparecer duas vezes (frente e verso).
+            if len(candidates) > 2 * k:
+                nearest = np.argpartition(distances[candidates], 2 * k)[: 2 * k]
+                candidates = candidates[nearest]
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+            coin_ids = data.coin_ids[candidates].tolist()
+            candidate_distances = distances[candidates].tolist()
+
+        results: Dict[int, int] = {}
+        for coin_id, distance in zip(coin_ids, candidate_distances):
+            if coin_id not in results:
+                results[coin_id] = distance
+                if len(results) == k:
+                    break
+        return list(results.items())
+
+
+image_index = ImageHashIndex(settings.IMAGE_INDEX_REFRESH_SECONDS)
@@ -0,0 +1,209 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from models.coin import Coin, CollectionVersion
+from models.snapshot import ValuationSnapshot
+from services.valuation_service import get_fx_table, rate_days
+
+BUCKETS = ("day", "week", "month")
+
+
+def users_needing_snapshot(db: Session) -> Dict[int, int]:
+    """
+    Usuários cujas moedas mudaram (criadas, alteradas ou excluídas) desde o
+    último snapshot, ou que ainda não têm nenhum, com a versão atual dos
+    dados (ver `data_version`). Compara o contador de cada dono com o
+    gravado no último snapshot: uma leitura por dono, sem varrer moedas.
+    """
+    last_taken = (
+        select(
+            ValuationSnapshot.owner_id,
+            func.max(ValuationSnapshot.change_seq).label("change_seq"),
+        )
+        .group_by(ValuationSnapshot.owner_id)
+        .subquery()
+    )
+    query = (
+        select(CollectionVersion.owner_id, CollectionVersion.change_seq)
+        .outerjoin(last_taken, last_taken.c.owner_id == CollectionVersion.owner_id)
+        .where(
+            or_(
+                last_taken.c.change_seq.is_(None),
+                CollectionVersion.change_seq > last_taken.c.change_seq,
+            )
+        )
+        .order_by(CollectionVersion.owner_id)
+    )
+    return dict(db.execute(query).all())
+
+
+def _rollups(db: Session, owner_ids: List[int], snapshot_date: date) -> Dict[int, Dict[str, Any]]:
+    """Totais por usuário a partir de um único GROUP BY, com valores convertidos para DEFAULT_CURRENCY."""
+    # País canônico quando reconhecido; senão, o nome digitado (normalizado).
+    country_key = func.coalesce(Coin.country_code, func.lower(func.trim(Coin.country)))
+    rows = db.execute(
+        select(
+            Coin.owner_id,
+            country_key,
+            Coin.originality,
+            Coin.currency,
+            func.count(Coin.id),
+            func.sum(Coin.estimated_value),
+        )
+        .where(Coin.owner_id.in_(owner_ids))
+        .group_by(Coin.owner_id, country_key, Coin.originality, Coin.currency)
+    ).all()
+
+    rollups: Dict[int, Dict[str, Any]] = {
+        owner_id: {
+            "total_coins": 0,
+            "total_estimated_value": 0.0,
+            "by_originality": defaultdict(int),
+            "by_country": defaultdict(int),
+        }
+        for owner_id in owner_ids
+    }
+    if not rows:
+        return rollups
+
+    owners, countries, originalities, currencies, counts, sums = zip(*rows)
+    days = rate_days([None] * len(rows), snapshot_date, "as_of")
+    values = get_fx_table(db).convert(
+        np.array(sums, dtype=np.float64),
+        np.array(currencies, dtype=object),
+        days,
+        settings.DEFAULT_CURRENCY,
+    )
+    values = np.nan_to_num(values).tolist()
+
+    for owner_id, country, originality, count, value in zip(
+        owners, countries, originalities, counts, values
+    ):
+        rollup = rollups[owner_id]
+        rollup["total_coins"] += count
+        rollup["total_estimated_value"] += value
+        rollup["by_originality"][getattr(originality, "value", originality)] += count
+        rollup["by_country"][country] += count
+    return rollups
+
+
+def take_snapshots(
+    db: Session, snapshot_date: Optional[date] = None, batch_size: int = 1_000
+) -> int:
+    """
+    Grava o snapshot do dia para os usuários com alterações desde o último.
+    Rodar de novo no mesmo dia substitui o snapshot. Retorna quantos foram gravados.
+    """
+    snapshot_date = snapshot_date or date.today()
+    # A versão é lida antes dos totais: uma escrita no meio gera outro snapshot.
+    versions = users_needing_snapshot(db)
+    owner_ids = list(versions)
+
+    for start in range(0, len(owner_ids), batch_size):
+        batch = owner_ids[start:start + batch_size]
+        rollups = _rollups(db, batch, snapshot_date)
+        stmt = insert(ValuationSnapshot).values(
+            [
+                {
+                    "owner_id": owner_id,
+                    "snapshot_date": snapshot_date,
+                    "total_coins": rollup["total_coins"],
+                    "total_estimated_value": round(rollup["total_estimated_value"], 2),
+                    "by_originality": dict(rollup["by_originality"]),
+                    "by_country": dict(rollup["by_country"]),
+                    "change_seq": versions[owner_id],
+                }
+                for owner_id, rollup in rollups.items()
+            ]
+        )
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[ValuationSnapshot.owner_id, ValuationSnapshot.snapshot_date],
+                set_={
+                    "total_coins": stmt.excluded.total_coins,
+                    "total_estimated_value": stmt.excluded.total_estimated_value,
+                    "by_originality": stmt.excluded.by_originality,
+                    "by_country": stmt.excluded.by_country,
+                    "change_seq": stmt.excluded.change_seq,
+                    "taken_at": func.now(),
+                },
+            )
+        )
+        db.commit()
+
+    return len(owner_ids)
+
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def _next_bucket(start: date, bucket: str) -> date:
+    if bucket == "week":
+        return start + timedelta(weeks=1)
+    if bucket == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def _buckets(start: date, end: date, bucket: str) -> Iterator[date]:
+    current = _bucket_start(start, bucket)
+    while current <= end:
+        yield current
+        current = _next_bucket(current, bucket)
+
+
+def valuation_history(
+    db: Session, owner_id: int, start: date, end: date, bucket: str
+) -> List[Dict[str, Any]]:
+    """
+    Série histórica a partir dos snapshots (sem ler `coins`). Cada ponto traz
+    o último snapshot até o fim do período; dias sem snapshot repetem o anterior.
+    """
+    previous = (
+        select(ValuationSnapshot)
+        .where(ValuationSnapshot.owner_id == owner_id, ValuationSnapshot.snapshot_date < start)
+        .order_by(ValuationSnapshot.snapshot_date.desc())
+        .limit(1)
+    )
+    in_range = (
+        select(ValuationSnapshot)
+        .where(
+            ValuationSnapshot.owner_id == owner_id,
+            and_(ValuationSnapshot.snapshot_date >= start, ValuationSnapshot.snapshot_date <= end),
+        )
+        .order_by(ValuationSnapshot.snapshot_date)
+    )
+    snapshots = list(db.execute(previous).scalars()) + list(db.execute(in_range).scalars())
+
+    series: List[Dict[str, Any]] = []
+    current: Optional[ValuationSnapshot] = None
+    index = 0
+    for bucket_start in _buckets(start, end, bucket):
+        bucket_end = min(_next_bucket(bucket_start, bucket) - timedelta(days=1), end)
+        while index < len(snapshots) and snapshots[index].snapshot_date <= bucket_end:
+            current = snapshots[index]
+            index += 1
+        if current is None:
+            continue
+        series.append(
+            {
+                "date": bucket_start,
+                "total_coins": current.total_coins,
+                "total_estimated_value": current.total_estimated_value,
+                "by_originality": current.by_originality,
+                "by_country": current.by_country,
+            }
+        )
+    return series
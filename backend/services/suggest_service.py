@@ -0,0 +1,122 @@
+import bisect
+import heapq
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import settings
+from models.coin import Coin
+
+SUGGEST_FIELDS = ("country", "category", "condition", "storage_location")
+
+
+def _normalize(value: str) -> str:
+    """Forma usada na comparação de prefixos: sem acentos, maiúsculas nem espaços nas pontas."""
+    decomposed = unicodedata.normalize("NFKD", value.strip().casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+class _PrefixIndex:
+    """
+    Valores distintos de um campo com suas frequências. As chaves ficam numa
+    lista ordenada pela forma normalizada, e a busca por prefixo é um bisect
+    seguido de uma varredura só pelo intervalo que casa.
+    """
+
+    def __init__(self, counts: Dict[str, int]):
+        self._counts = dict(counts)
+        self._keys: List[Tuple[str, str]] = sorted((_normalize(v), v) for v in self._counts)
+
+    def add(self, value: str, delta: int) -> None:
+        entry = (_normalize(value), value)
+        count = self._counts.get(value, 0) + delta
+        if count > 0:
+            if value not in self._counts:
+                bisect.insort(self._keys, entry)
+            self._counts[value] = count
+        elif value in self._counts:
+            del self._counts[value]
+            del self._keys[bisect.bisect_left(self._keys, entry)]
+
+    def search(self, prefix: str, limit: int) -> List[Dict[str, Any]]:
+        prefix = _normalize(prefix)
+        matches = []
+        for position in range(bisect.bisect_left(self._keys, (prefix,)), len(self._keys)):
+            key, value = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            matches.append((key, value))
+        best = heapq.nsmallest(limit, matches, key=lambda m: (-self._counts[m[1]], m))
+        return [{"value": value, "count": self._counts[value]} for _, value in best]
+
+
+class SuggestionIndex:
+    """
+    Índices de prefixo por (usuário, campo), montados na primeira consulta com
+    um único GROUP BY e mantidos pelas escritas deste processo. Ficam num LRU
+    limitado a SUGGEST_INDEX_MAX_ENTRIES e expiram após SUGGEST_INDEX_TTL_SECONDS
+    para enxergar escritas feitas por outros processos.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self._indexes = TTLCache(maxsize=max_entries, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def _build(self, db: Session, owner_id: int, field: str) -> _PrefixIndex:
+        column = getattr(Coin, field)
+        rows = db.execute(
+            select(column, func.count())
+            .where(Coin.owner_id == owner_id, column.is_not(None), column != "")
+            .group_by(column)
+        ).all()
+        return _PrefixIndex(dict(rows))
+
+    def suggest(
+        self, db: Session, owner_id: int, field: str, prefix: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        """Valores do campo que começam com `prefix`, dos mais usados para os menos."""
+        index = self._indexes.get((owner_id, field))
+        if index is None:
+            index = self._build(db, owner_id, field)
+            self._indexes.set((owner_id, field), index)
+        with self._lock:
+            return index.search(prefix, limit)
+
+    def record(
+        self,
+        owner_id: int,
+        old: Optional[Dict[str, Any]] = None,
+        new: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Aplica uma moeda criada (só `new`), alterada (ambos) ou excluída (só `old`)."""
+        with self._lock:
+            for field in SUGGEST_FIELDS:
+                before = (old or {}).get(field)
+                after = (new or {}).get(field)
+                if before == after:
+                    continue
+                index = self._indexes.get((owner_id, field))
+                if index is None:
+                    continue
+                if before:
+                    index.add(before, -1)
+                if after:
+                    index.add(after, 1)
+
+    def invalidate(self, owner_id: int) -> None:
+        """Descarta os índices do usuário (após escritas em lote, como importações)."""
+        for field in SUGGEST_FIELDS:
+            self._indexes.pop((owner_id, field))
+
+
+def suggest_values(coin: Coin) -> Dict[str, Any]:
+    return {field: getattr(coin, field) for field in SUGGEST_FIELDS}
+
+
+suggestions = SuggestionIndex(
+    settings.SUGGEST_INDEX_MAX_ENTRIES, settings.SUGGEST_INDEX_TTL_SECONDS
+)
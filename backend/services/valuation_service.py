@@ -0,0 +1,228 @@
+import csv
+import re
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, TextIO, Union
+
+import numpy as np
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from core.cache import TTLCache
+from core.config import settings
+from models.coin import Coin, FxRate
+
+RATE_BASIS = ("as_of", "acquisition")
+
+# Chave de busca: código da moeda * _DAY_SPAN + (dia desde 1970 + _DAY_OFFSET).
+_DAY_SPAN = 1_000_000
+_DAY_OFFSET = 500_000
+
+_fx_cache = TTLCache(maxsize=1, ttl=settings.FX_CACHE_TTL_SECONDS)
+
+
+class FxTable:
+    """
+    Cotações históricas em arrays NumPy ordenados por (moeda, data).
+
+    A cotação de uma moeda em um dia é a última conhecida até aquele dia.
+    Todas as cotações são unidades da moeda por 1 FX_BASE_CURRENCY.
+    """
+
+    def __init__(self, base: str, rows: Iterable[Sequence[Any]]):
+        self.base = base
+        rows = list(rows)
+        currencies = sorted({row[0] for row in rows} | {base})
+        self.codes = {currency: code for code, currency in enumerate(currencies)}
+
+        if rows:
+            row_codes = np.array([self.codes[r[0]] for r in rows], dtype=np.int64)
+            row_days = np.array([r[1] for r in rows], dtype="datetime64[D]").astype(np.int64)
+            row_rates = np.array([r[2] for r in rows], dtype=np.float64)
+        else:
+            row_codes = np.empty(0, dtype=np.int64)
+            row_days = np.empty(0, dtype=np.int64)
+            row_rates = np.empty(0, dtype=np.float64)
+
+        keys = row_codes * _DAY_SPAN + row_days + _DAY_OFFSET
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._codes = row_codes[order]
+        self._rates = row_rates[order]
+
+    def encode(self, currencies: np.ndarray) -> np.ndarray:
+        """Converte códigos ISO em códigos inteiros (-1 para moedas sem cotação)."""
+        unique, inverse = np.unique(currencies.astype(str), return_inverse=True)
+        mapped = np.array([self.codes.get(c, -1) for c in unique], dtype=np.int64)
+        return mapped[inverse].reshape(currencies.shape)
+
+    def rates_at(self, codes: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Cotação de cada (moeda, dia); NaN quando não há cotação conhecida."""
+        rates = np.full(codes.shape, np.nan)
+        if self._keys.size:
+            keys = codes * _DAY_SPAN + days + _DAY_OFFSET
+            idx = np.searchsorted(self._keys, keys, side="right") - 1
+            safe = np.clip(idx, 0, None)
+            found = (idx >= 0) & (codes >= 0) & (self._codes[safe] == codes)
+            rates = np.where(found, self._rates[safe], np.nan)
+        rates[codes == self.codes[self.base]] = 1.0
+        return rates
+
+    def convert(
+        self,
+        amounts: np.ndarray,
+        currencies: np.ndarray,
+        days: np.ndarray,
+        target: Union[str, np.ndarray],
+    ) -> np.ndarray:
+        """
+        Converte `amounts` para `target` (uma moeda ou uma por linha) na data de
+        cada linha, em uma passada.
+        """
+        source_codes = self.encode(currencies)
+        if isinstance(target, str):
+            target_codes = np.full(source_codes.shape, self.codes.get(target, -1))
+        else:
+            target_codes = self.encode(target)
+        converted = amounts / self.rates_at(source_codes, days) * self.rates_at(target_codes, days)
+        # Mesma moeda não depende de cotação.
+        return np.where(currencies == target, amounts, converted)
+
+
+def normalize_currency(currency: Optional[str]) -> Optional[str]:
+    """Valida um código de moeda ISO 4217 vindo da query string. Falha com 400."""
+    if currency is None:
+        return None
+    currency = currency.strip().upper()
+    if not re.fullmatch(r"[A-Z]{3}", currency):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid currency code.",
+        )
+    return currency
+
+
+def get_fx_table(db: Session) -> FxTable:
+    """Tabela de cotações em memória, recarregada a cada FX_CACHE_TTL_SECONDS."""
+    table = _fx_cache.get("fx")
+    if table is None:
+        rows = db.execute(
+            select(FxRate.currency, FxRate.rate_date, FxRate.rate)
+        ).all()
+        table = FxTable(settings.FX_BASE_CURRENCY, rows)
+        _fx_cache.set("fx", table)
+    return table
+
+
+def load_fx_csv(db: Session, stream: TextIO, batch_size: int = 5_000) -> int:
+    """
+    Importa um snapshot de cotações em CSV com colunas `date,currency,rate`.
+    Linhas já existentes (mesma moeda e data) são atualizadas.
+    """
+    loaded = 0
+    batch: List[Dict[str, Any]] = []
+
+    def flush() -> None:
+        stmt = insert(FxRate).values(batch)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[FxRate.currency, FxRate.rate_date],
+                set_={"rate": stmt.excluded.rate},
+            )
+        )
+        batch.clear()
+
+    for row in csv.DictReader(stream):
+        batch.append(
+            {
+                "currency": row["currency"].strip().upper(),
+                "rate_date": date.fromisoformat(row["date"].strip()),
+                "rate": float(row["rate"]),
+            }
+        )
+        loaded += 1
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+
+    db.commit()
+    _fx_cache.clear()
+    return loaded
+
+
+def rate_days(
+    acquisition_dates: Sequence[Optional[datetime]],
+    as_of: Optional[date],
+    basis: str,
+) -> np.ndarray:
+    """Dia (desde 1970) da cotação usada por linha, conforme a base escolhida."""
+    as_of_day = np.datetime64(as_of or date.today(), "D").astype(np.int64)
+    if basis != "acquisition":
+        return np.full(len(acquisition_dates), as_of_day, dtype=np.int64)
+    days = np.array(acquisition_dates, dtype="datetime64[D]")
+    return np.where(np.isnat(days), as_of_day, days.astype(np.int64))
+
+
+def valuate_collection(
+    db: Session,
+    owner_id: int,
+    target: str,
+    as_of: Optional[date] = None,
+    basis: str = "as_of",
+) -> Dict[str, Any]:
+    """
+    Totais de valor estimado e preço de compra de um usuário convertidos para
+    `target`, a partir de uma única consulta de colunas.
+    """
+    rows = db.execute(
+        select(
+            Coin.currency,
+            Coin.estimated_value,
+            Coin.purchase_price,
+            Coin.acquisition_date,
+        ).where(Coin.owner_id == owner_id)
+    ).all()
+    currencies, estimated, purchase, acquired = zip(*rows) if rows else ((), (), (), ())
+    return valuate_arrays(
+        db,
+        target,
+        np.array(currencies, dtype=object),
+        np.array(estimated, dtype=np.float64),
+        np.array(purchase, dtype=np.float64),
+        rate_days(acquired, as_of, basis),
+    )
+
+
+def valuate_arrays(
+    db: Session,
+    target: str,
+    currencies: np.ndarray,
+    estimated: np.ndarray,
+    purchase: np.ndarray,
+    days: np.ndarray,
+) -> Dict[str, Any]:
+    """Totais convertidos para `target` a partir das colunas já em arrays (uma posição por moeda)."""
+    if not len(currencies):
+        return {
+            "currency": target,
+            "total_estimated_value": 0.0,
+            "total_purchase_price": 0.0,
+            "unconverted_coins": 0,
+        }
+
+    fx = get_fx_table(db)
+    estimated_converted = fx.convert(estimated, currencies, days, target)
+    purchase_converted = fx.convert(purchase, currencies, days, target)
+
+    # Valor informado, mas sem cotação para converter.
+    unconverted = (~np.isnan(estimated) & np.isnan(estimated_converted)) | (
+        ~np.isnan(purchase) & np.isnan(purchase_converted)
+    )
+    return {
+        "currency": target,
+        "total_estimated_value": float(np.nansum(estimated_converted)),
+        "total_purchase_price": float(np.nansum(purchase_converted)),
+        "unconverted_coins": int(unconverted.sum()),
+    }
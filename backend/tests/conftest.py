@@ -0,0 +1,57 @@
+import os
+import sys
+from pathlib import Path
+
+# `core.config` exige estas variáveis; os testes que precisam de um banco de
+# verdade usam TEST_POSTGRES_URL (e são pulados sem ela).
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+
+BACKEND = Path(__file__).resolve().parents[1]
+sys.path.append(str(BACKEND))
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+
+from core.config import settings
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+@pytest.fixture
+def pg_engine():
+    """Engine do banco de TEST_POSTGRES_URL, com o schema `public` recriado vazio."""
+    engine = sa.create_engine(TEST_POSTGRES_URL)
+    with engine.begin() as conn:
+        conn.execute(sa.text("DROP SCHEMA public CASCADE"))
+        conn.execute(sa.text("CREATE SCHEMA public"))
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def alembic_config(monkeypatch):
+    monkeypatch.chdir(BACKEND)
+    monkeypatch.setattr(settings, "DATABASE_URL", TEST_POSTGRES_URL)
+    monkeypatch.setattr(settings, "MIGRATION_BATCH_SIZE", 500)
+    monkeypatch.setattr(settings, "MIGRATION_BATCH_PAUSE_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "COINS_PARTITION_BATCH_PAUSE_SECONDS", 0.0)
+    return Config(str(BACKEND / "alembic.ini"))
+
+
+@pytest.fixture
+def migrate(pg_engine, alembic_config):
+    """Função que leva o banco vazio de `pg_engine` até `revision`."""
+
+    def upgrade(revision: str = "head") -> None:
+        command.upgrade(alembic_config, "02565b74785f")
+        with pg_engine.begin() as conn:
+            # Bancos criados antes da convenção de nomes têm os nomes padrão
+            # do Postgres, que é o que 3647e399b1cc espera.
+            conn.execute(sa.text("ALTER TABLE coins RENAME CONSTRAINT fk_coins_owner_id_users TO coins_owner_id_fkey"))
+            conn.execute(sa.text("ALTER TABLE users RENAME CONSTRAINT uq_users_email TO users_email_key"))
+        command.upgrade(alembic_config, revision)
+
+    return upgrade
@@ -0,0 +1,162 @@
+import base64
+import os
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+
+from core.database import Base
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.coin import Coin, CoinTombstone
+from models.user import User
+from services.coin_service import data_version, decode_cursor, encode_cursor, list_changes
+
+requires_postgres = pytest.mark.skipif(
+    not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set"
+)
+
+
+def _insert_coins(conn, owner_id, count):
+    conn.execute(
+        sa.text(
+            "INSERT INTO coins (quantity, year, country, face_value, currency, originality, owner_id) "
+            "SELECT 1, 1900 + g, 'Brasil', '1', 'BRL', 'ORIGINAL', :owner_id FROM generate_series(1, :count) g"
+        ),
+        {"owner_id": owner_id, "count": count},
+    )
+
+
+def _sync(engine, owner_id, cursor):
+    with Session(engine) as db:
+        return list_changes(db, owner_id, cursor, 100)
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(42, 7)) == (42, 7)
+
+
+def test_legacy_cursor_restarts_sync():
+    legacy = base64.urlsafe_b64encode(b"2026-01-08T21:12:04.318227+00:00|17").decode()
+    assert decode_cursor(legacy) == (0, 0)
+    with pytest.raises(ValueError):
+        decode_cursor("not a cursor")
+
+
+@requires_postgres
+def test_late_commit_is_not_skipped(pg_engine, migrate):
+    migrate()
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        _insert_coins(conn, 1, 2)
+    cursor = _sync(pg_engine, 1, None)["next_cursor"]
+
+    # A transação longa começa antes (now() fica fixo no início) e commita depois.
+    with pg_engine.connect() as slow:
+        slow.execute(sa.text("SELECT now()"))
+        with pg_engine.begin() as fast:
+            fast.execute(sa.text("UPDATE coins SET notes = 'fast', updated_at = now() WHERE id = 2"))
+        first = _sync(pg_engine, 1, cursor)
+        slow.execute(sa.text("UPDATE coins SET notes = 'slow', updated_at = now() WHERE id = 1"))
+        slow.commit()
+    second = _sync(pg_engine, 1, first["next_cursor"])
+
+    assert [coin.id for coin in first["changes"]] == [2]
+    assert [coin.id for coin in second["changes"]] == [1]
+    # Pelo updated_at, a moeda 1 ficaria atrás do cursor já entregue.
+    assert second["changes"][0].updated_at < first["changes"][0].updated_at
+
+
+@requires_postgres
+def test_deletes_follow_commit_order(pg_engine, migrate):
+    migrate()
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        _insert_coins(conn, 1, 3)
+        conn.execute(sa.text("DELETE FROM coins WHERE id = 2"))
+        conn.execute(sa.text("INSERT INTO coin_tombstones (coin_id, owner_id) VALUES (2, 1)"))
+        conn.execute(sa.text("UPDATE coins SET notes = 'edited' WHERE id = 1"))
+
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("UPDATE coins SET notes = 'again' WHERE id = 3"))
+
+    page = _sync(pg_engine, 1, None)
+    assert [coin.id for coin in page["changes"]] == [1, 3]
+    assert [row["id"] for row in page["deleted"]] == [2]
+    assert decode_cursor(page["next_cursor"]) == (2, 3)
+    assert _sync(pg_engine, 1, page["next_cursor"])["changes"] == []
+
+
+@requires_postgres
+def test_pages_split_a_transaction(pg_engine, migrate):
+    migrate()
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        _insert_coins(conn, 1, 5)
+
+    seen, cursor = [], None
+    while True:
+        with Session(pg_engine) as db:
+            page = list_changes(db, 1, cursor, 2)
+        seen += [coin.id for coin in page["changes"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == [1, 2, 3, 4, 5]
+
+
+@requires_postgres
+def test_counter_bumps_once_per_transaction(pg_engine, migrate):
+    migrate()
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        _insert_coins(conn, 1, 50)
+        conn.execute(sa.text("UPDATE coins SET notes = 'edited'"))
+        xmin_before = conn.execute(sa.text("SELECT xmin::text FROM collection_versions")).scalar()
+        conn.execute(sa.text("UPDATE coins SET notes = 'again'"))
+        xmin_after = conn.execute(sa.text("SELECT xmin::text FROM collection_versions")).scalar()
+
+    with pg_engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT change_seq FROM collection_versions")).scalar() == 1
+        assert conn.execute(sa.text("SELECT DISTINCT change_seq FROM coins")).scalars().all() == [1]
+    # As escritas seguintes da transação só leem o contador.
+    assert xmin_before == xmin_after
+
+
+def test_sqlite_triggers_fill_the_feed():
+    engine = sa.create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=1, email="a@example.com", hashed_password="x"))
+        coins = [
+            Coin(quantity=1, year=1900 + i, country="Brasil", face_value="1", owner_id=1)
+            for i in range(3)
+        ]
+        db.add_all(coins)
+        db.commit()
+        coins[0].notes = "edited"
+        db.add(CoinTombstone(coin_id=coins[1].id, owner_id=1))
+        db.delete(coins[1])
+        db.commit()
+
+        page = list_changes(db, 1, None, 100)
+        assert [coin.id for coin in page["changes"]] == [3, 1]
+        assert [row["id"] for row in page["deleted"]] == [2]
+        assert data_version(db, 1) == decode_cursor(page["next_cursor"])[0] == 5
+        assert list_changes(db, 1, page["next_cursor"], 100)["changes"] == []
+
+
+@requires_postgres
+def test_data_version_is_the_feed_position(pg_engine, migrate):
+    migrate()
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (2, 'b@example.com', 'x')"))
+        _insert_coins(conn, 1, 3)
+    with Session(pg_engine) as db:
+        assert data_version(db, 1) == 1
+        assert data_version(db, 2) == 0
+
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("UPDATE coins SET notes = 'edited' WHERE id = 1"))
+    with Session(pg_engine) as db:
+        assert data_version(db, 1) == decode_cursor(list_changes(db, 1, None, 100)["next_cursor"])[0] == 2
@@ -0,0 +1,206 @@
+"""
+Upsert opcional pela chave natural e junção de duplicatas. A chave natural
+não é única: inserir uma moeda repetida é permitido, e só o modo pedido
+(merge/skip) ou POST /coins/duplicates/merge juntam as linhas.
+"""
+import os
+import threading
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.coin import Coin, CoinTombstone, OriginalityEnum
+from models.user import User
+from services.coin_service import find_duplicates, merge_coin, merge_duplicates, upsert_coins
+
+
+def _row(**values):
+    return {
+        "owner_id": 1,
+        "country": "Brasil",
+        "year": 1994,
+        "face_value": "1 Real",
+        "condition": None,
+        "originality": OriginalityEnum.ORIGINAL,
+        "quantity": 1,
+        **values,
+    }
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request):
+    if request.param == "sqlite":
+        engine = sa.create_engine("sqlite://", poolclass=StaticPool)
+    elif os.environ.get("TEST_POSTGRES_URL"):
+        engine = request.getfixturevalue("pg_engine")
+    else:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            User(id=1, email="a@example.com", hashed_password="x"),
+            User(id=2, email="b@example.com", hashed_password="x"),
+        ])
+        session.commit()
+        yield session
+    engine.dispose()
+
+
+def _quantities(db):
+    return db.execute(sa.select(Coin.owner_id, Coin.condition, Coin.quantity).order_by(Coin.id)).all()
+
+
+def test_insert_mode_keeps_every_row(db):
+    db.add(Coin(**_row(notes="do avô")))
+    db.commit()
+
+    result = upsert_coins(db, [_row(), _row()])
+    db.commit()
+
+    assert result == {"inserted": 2, "merged": 0, "skipped": 0}
+    assert db.scalar(sa.select(sa.func.count()).select_from(Coin)) == 3
+
+
+def test_merge_mode_adds_to_oldest_match(db):
+    db.add_all([Coin(**_row(quantity=2)), Coin(**_row(quantity=5)), Coin(**_row(owner_id=2))])
+    db.commit()
+
+    result = upsert_coins(
+        db,
+        [_row(quantity=3), _row(), _row(condition="MBC"), _row(condition="MBC")],
+        "merge",
+    )
+    db.commit()
+
+    assert result == {"inserted": 1, "merged": 3, "skipped": 0}
+    assert _quantities(db) == [(1, None, 6), (1, None, 5), (2, None, 1), (1, "MBC", 2)]
+
+
+def test_skip_mode_ignores_matches(db):
+    db.add(Coin(**_row(quantity=2)))
+    db.commit()
+
+    result = upsert_coins(db, [_row(), _row(year=1995), _row(year=1995)], "skip")
+    db.commit()
+
+    assert result == {"inserted": 1, "merged": 0, "skipped": 2}
+    assert db.scalar(sa.select(sa.func.sum(Coin.quantity))) == 3
+
+
+def test_merge_coin_inserts_then_adds(db):
+    first = merge_coin(db, _row(quantity=2))
+    db.commit()
+    again = merge_coin(db, _row(quantity=3))
+    db.commit()
+
+    assert again.id == first.id
+    assert again.quantity == 5
+
+
+def test_merge_duplicates_folds_into_oldest(db):
+    coins = [Coin(**_row(notes=f"lote {i}", quantity=i + 1)) for i in range(3)]
+    db.add_all(coins)
+    db.commit()
+    ids = [coin.id for coin in coins]
+
+    kept = merge_duplicates(db, 1, list(reversed(ids)))
+    db.commit()
+
+    assert (kept.id, kept.quantity, kept.notes) == (ids[0], 6, "lote 0")
+    assert db.scalars(sa.select(Coin.id)).all() == [ids[0]]
+    assert sorted(db.scalars(sa.select(CoinTombstone.coin_id)).all()) == ids[1:]
+
+
+def test_merge_uses_the_report_normalization(db):
+    db.add(Coin(**_row(country=" brasil", face_value="1 REAL", condition="")))
+    db.commit()
+
+    result = upsert_coins(db, [_row(country="Brasil "), _row(country="BRASIL", condition="MBC")], "merge")
+    db.commit()
+
+    assert result == {"inserted": 1, "merged": 1, "skipped": 0}
+    assert _quantities(db) == [(1, "", 2), (1, "MBC", 1)]
+
+
+def test_report_groups_what_merge_joins(db):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("find_duplicates usa array_agg")
+    upsert_coins(db, [_row(country=" brasil"), _row(country="Brasil ", condition=""), _row(year=1995)])
+    db.commit()
+
+    [group] = find_duplicates(db, 1, 10)
+    assert (group["country"], group["condition"], group["coins"]) == ("brasil", None, 2)
+    kept = merge_duplicates(db, 1, group["ids"])
+    db.commit()
+    assert kept.quantity == 2
+
+
+def test_merge_duplicates_rejects_different_coins(db):
+    coins = [Coin(**_row()), Coin(**_row(year=1995))]
+    db.add_all(coins)
+    db.commit()
+
+    with pytest.raises(ValueError):
+        merge_duplicates(db, 1, [coin.id for coin in coins])
+    db.rollback()
+    assert db.scalar(sa.select(sa.func.count()).select_from(Coin)) == 2
+
+
+def test_merge_duplicates_rejects_foreign_coins(db):
+    mine, theirs = Coin(**_row()), Coin(**_row(owner_id=2))
+    db.add_all([mine, theirs])
+    db.commit()
+
+    assert merge_duplicates(db, 1, [mine.id, theirs.id]) is None
+    db.rollback()
+    assert db.scalar(sa.select(sa.func.count()).select_from(Coin)) == 2
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_migration_leaves_existing_duplicates_alone(pg_engine, alembic_config, migrate):
+    migrate("f5c0a8e7b342")
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        conn.execute(sa.text(
+            "INSERT INTO coins (quantity, year, country, face_value, originality, owner_id) "
+            "VALUES (1, 1994, 'Brasil', '1 Real', 'ORIGINAL', 1), (2, 1994, 'Brasil', '1 Real', 'ORIGINAL', 1)"
+        ))
+
+    command.upgrade(alembic_config, "0a6d3e9f1b87")
+
+    with pg_engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT id, quantity FROM coins ORDER BY id")).all() == [(1, 1), (2, 2)]
+        assert conn.execute(sa.text("SELECT count(*) FROM coin_tombstones")).scalar() == 0
+        unique = conn.execute(sa.text(
+            "SELECT indisunique FROM pg_index WHERE indexrelid = 'ix_coins_natural_key'::regclass"
+        )).scalar()
+        assert unique is False
+
+
+def test_concurrent_merges_do_not_duplicate(db):
+    if db.get_bind().dialect.name != "postgresql":
+        pytest.skip("advisory locks só no Postgres")
+    engine = db.get_bind()
+    results = {}
+
+    def second_import():
+        with Session(engine) as other:
+            results["second"] = upsert_coins(other, [_row(country="brasil")], "merge")
+            other.commit()
+
+    upsert_coins(db, [_row()], "merge")
+    thread = threading.Thread(target=second_import)
+    thread.start()
+    # A segunda importação espera o lock da chave até este commit.
+    thread.join(0.5)
+    assert thread.is_alive()
+    db.commit()
+    thread.join(5)
+
+    assert results["second"] == {"inserted": 0, "merged": 1, "skipped": 0}
+    assert _quantities(db) == [(1, None, 2)]
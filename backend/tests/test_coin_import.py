@@ -0,0 +1,54 @@
+"""Erros da importação: formato inválido é 400 e statement_timeout é 503, não 500."""
+import pytest
+import sqlalchemy as sa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from psycopg.errors import QueryCanceled
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.admission import statement_timeout_handler
+from core.database import Base, get_db
+from core.security import get_current_user
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.user import User
+from routers import coins
+
+
+@pytest.fixture
+def client():
+    engine = sa.create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+
+    def session():
+        with Session(engine) as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(coins.router)
+    app.add_exception_handler(OperationalError, statement_timeout_handler)
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, email="a@example.com")
+    yield TestClient(app)
+    engine.dispose()
+
+
+def _import(client, name, content):
+    return client.post("/coins/import", files={"file": (name, content)})
+
+
+def test_unknown_format_is_bad_request(client):
+    assert _import(client, "coins.xml", b"<coins/>").status_code == 400
+
+
+def test_statement_timeout_is_service_unavailable(client, monkeypatch):
+    def cancelled(db, rows, on_duplicate):
+        raise OperationalError("INSERT INTO coins ...", {}, QueryCanceled("canceling statement due to statement timeout"))
+
+    monkeypatch.setattr(coins, "upsert_coins", cancelled)
+    response = _import(client, "coins.json", b'[{"year": 1994, "country": "Brasil", "face_value": "1 real"}]')
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "30"
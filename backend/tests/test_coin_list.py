@@ -0,0 +1,67 @@
+"""Total da listagem de moedas: cache invalidado por escrita e estimativa fora do Postgres."""
+import pytest
+import sqlalchemy as sa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base, get_db
+from core.security import get_current_user
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.coin import Coin
+from models.user import User
+from routers import coins
+
+
+@pytest.fixture
+def client():
+    engine = sa.create_engine(
+        "sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=1, email="a@example.com", hashed_password="x"))
+        db.commit()
+
+    def session():
+        with Session(engine) as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(coins.router)
+    app.dependency_overrides[get_db] = session
+    app.dependency_overrides[get_current_user] = lambda: User(id=1, email="a@example.com")
+    yield TestClient(app), engine
+    coins._count_cache.clear()
+    engine.dispose()
+
+
+def _add_coin(engine, year):
+    with Session(engine) as db:
+        db.add(Coin(owner_id=1, year=year, country="Brasil", face_value="1 real", quantity=1))
+        db.commit()
+
+
+def _meta(client, **params):
+    response = client.get("/coins", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()["meta"]
+
+
+def test_write_invalidates_cached_total(client):
+    client, engine = client
+    _add_coin(engine, 1990)
+    assert _meta(client)["total_items"] == 1
+
+    _add_coin(engine, 1991)
+    assert _meta(client)["total_items"] == 2
+
+
+def test_estimated_total_falls_back_to_exact_count(client):
+    client, engine = client
+    for year in (1990, 1991, 1992):
+        _add_coin(engine, year)
+    meta = _meta(client, include_total="estimated")
+    assert meta["total_items"] == 3
+    assert meta["total_is_estimate"] is False
@@ -0,0 +1,155 @@
+"""
+O snapshot colunar tem de dar o mesmo resultado que as consultas SQL que ele
+substitui (resumo do dashboard e agregações), inclusive com nulos, faixas de
+preço e décadas de anos negativos. Roda no SQLite em memória e, com
+TEST_POSTGRES_URL, também no Postgres.
+"""
+import itertools
+import os
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from models.coin import Coin, OriginalityEnum
+from models.country import Country
+from models.user import User
+from services.analytics_service import _aggregate_columns, _aggregate_sql, parse_filters
+from services.collection_columns_service import _load
+from services.dashboard_service import _summary_from_columns, _summary_from_sql
+
+YEARS = (-55, -10, -5, -1, 0, 5, 9, 10, 1889, 1990, 2024)
+ESTIMATED = (None, 0.0, 9.99, 10.0, 49.5, 100.0, 999.0, 1_000.0, 25_000.0)
+COUNTRIES = (("Brasil", "BR"), ("brasil", "BR"), ("Alemanha", "DE"), ("Atlântida", None), (" Roma ", None))
+ORIGINALITIES = tuple(OriginalityEnum)
+
+GROUPS = (
+    (),
+    ("country",),
+    ("country_code",),
+    ("year",),
+    ("decade",),
+    ("category",),
+    ("condition",),
+    ("originality",),
+    ("currency",),
+    ("acquisition_year",),
+    ("price_band",),
+    ("decade", "price_band"),
+    ("country_code", "originality", "acquisition_year"),
+)
+METRICS = (
+    "count",
+    "sum:estimated_value",
+    "avg:estimated_value",
+    "min:purchase_price",
+    "max:purchase_price",
+    "sum:quantity",
+    "avg:quantity",
+    "min:quantity",
+)
+FILTERS = (
+    "",
+    "decade:lt:0",
+    "year:in:-5|0|5",
+    "estimated_value:gte:10",
+    "price_band:eq:10-50",
+    "country_code:ne:BR",
+    "originality:eq:replica,category:in:Comemorativa|Circulação",
+)
+
+
+def _coins(owner_id):
+    for i, (year, estimated) in enumerate(itertools.product(YEARS, ESTIMATED)):
+        country, code = COUNTRIES[i % len(COUNTRIES)]
+        yield Coin(
+            owner_id=owner_id,
+            year=year,
+            country=country,
+            country_code=code,
+            face_value=f"{i} réis",
+            estimated_value=estimated,
+            purchase_price=None if i % 4 == 0 else round(i * 1.37, 2),
+            quantity=1 + i % 3,
+            currency=("BRL", "USD", "EUR")[i % 3],
+            originality=ORIGINALITIES[i % len(ORIGINALITIES)],
+            condition=None if i % 5 == 0 else ("MBC", "SOB", "FC")[i % 3],
+            category=(None, "Comemorativa", "Circulação")[i % 3],
+            acquisition_date=None if i % 6 == 0 else datetime(2000 + i % 25, 1 + i % 12, 1 + i % 28),
+        )
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request):
+    if request.param == "sqlite":
+        engine = sa.create_engine("sqlite://", poolclass=StaticPool)
+    elif os.environ.get("TEST_POSTGRES_URL"):
+        engine = request.getfixturevalue("pg_engine")
+    else:
+        pytest.skip("TEST_POSTGRES_URL not set")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([Country(code="BR", name="Brasil"), Country(code="DE", name="Alemanha")])
+        owner, other = User(email="a@example.com", hashed_password="x"), User(email="b@example.com", hashed_password="x")
+        session.add_all([owner, other])
+        session.flush()
+        session.add_all([*_coins(owner.id), *itertools.islice(_coins(other.id), 7)])
+        session.commit()
+        session.info["owner_id"] = owner.id
+        yield session
+    engine.dispose()
+
+
+def _plain(value):
+    value = getattr(value, "value", value)
+    if isinstance(value, (float, Decimal)):
+        return round(float(value), 6)
+    return value
+
+
+def _normalize(rows):
+    """Linhas como dicts com valores simples, numa ordem estável (o SQLite ordena nulos antes)."""
+    return sorted(({key: _plain(value) for key, value in dict(row).items()} for row in rows), key=repr)
+
+
+@pytest.mark.parametrize("group_by", GROUPS, ids=lambda g: ",".join(g) or "total")
+@pytest.mark.parametrize("filters", FILTERS, ids=lambda f: f or "unfiltered")
+def test_aggregate_matches_sql(db, group_by, filters):
+    owner_id = db.info["owner_id"]
+    columns = _load(db, owner_id)
+    parsed = parse_filters(filters)
+
+    expected = _aggregate_sql(db, owner_id, group_by, METRICS, parsed)
+    assert expected, "seed should produce at least one group"
+    assert _normalize(_aggregate_columns(columns, group_by, METRICS, parsed)) == _normalize(expected)
+
+
+def test_summary_matches_sql(db):
+    owner_id = db.info["owner_id"]
+    columns = _load(db, owner_id)
+
+    expected = _summary_from_sql(db, owner_id)
+    summary = _summary_from_columns(columns)
+
+    assert set(summary) == set(expected)
+    for key, value in expected.items():
+        if isinstance(value, list):
+            assert _normalize(summary[key]) == _normalize(value), key
+        else:
+            assert _plain(summary[key]) == _plain(value), key
+
+
+def test_negative_years_fall_in_truncated_decades(db):
+    owner_id = db.info["owner_id"]
+    columns = _load(db, owner_id)
+    rows = _aggregate_columns(columns, ("decade",), ("count",), parse_filters("year:lt:10"))
+    # Divisão inteira truncada: -55 -> -50, -10 -> -10, -5 e -1 -> 0.
+    assert {row["decade"]: row["count"] for row in rows} == {
+        -50: len(ESTIMATED),
+        -10: len(ESTIMATED),
+        0: 5 * len(ESTIMATED),
+    }
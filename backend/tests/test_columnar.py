@@ -0,0 +1,88 @@
+"""
+Exportação colunar em streaming e leitura dos dois formatos Arrow IPC. A
+vaga de admissão da exportação tem de durar até o fim do corpo e ser
+devolvida mesmo se o cliente desistir no meio.
+"""
+import io
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core import admission
+from core.database import Base
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.coin import Coin
+from models.user import User
+from services.columnar_service import ARROW_SCHEMA, columnar_rows, stream_export
+
+
+@pytest.fixture
+def session_factory():
+    engine = sa.create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        session.add_all([
+            Coin(owner_id=1, year=1990 + i, country="Brasil", face_value=f"{i} real", quantity=1)
+            for i in range(5)
+        ])
+        session.commit()
+    yield lambda: Session(engine)
+    engine.dispose()
+
+
+def _in_flight():
+    return admission.admission_metrics().get("export", {}).get("in_flight", 0)
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_export_holds_slot_until_body_is_done(session_factory, format):
+    before = _in_flight()
+    body = stream_export(1, format, session_factory, batch_size=2)
+    chunks = [next(body)]
+    assert _in_flight() == before + 1
+
+    chunks.extend(body)
+    assert _in_flight() == before
+
+    content = b"".join(chunks)
+    if format == "parquet":
+        table = pq.read_table(io.BytesIO(content))
+    else:
+        table = pa.ipc.open_stream(content).read_all()
+    assert table.schema.names == ARROW_SCHEMA.names
+    assert table.column("year").to_pylist() == [1990, 1991, 1992, 1993, 1994]
+
+
+def test_export_releases_slot_when_abandoned(session_factory):
+    before = _in_flight()
+    body = stream_export(1, "arrow", session_factory, batch_size=2)
+    next(body)
+    next(body)
+    body.close()
+    assert _in_flight() == before
+
+
+def _coins_table():
+    return pa.table({
+        "year": pa.array([1994, 1995], pa.int32()),
+        "country": ["Brasil", "Portugal"],
+        "face_value": ["1 Real", "1 Escudo"],
+    })
+
+
+@pytest.mark.parametrize("writer", [pa.ipc.new_stream, pa.ipc.new_file], ids=["stream", "file"])
+def test_import_reads_both_arrow_ipc_formats(writer):
+    table = _coins_table()
+    sink = io.BytesIO()
+    with writer(sink, table.schema) as ipc:
+        ipc.write_table(table)
+
+    rows, errors = columnar_rows(sink.getvalue(), "arrow", owner_id=1)
+
+    assert errors == 0
+    assert [(row["year"], row["country"]) for row in rows] == [(1994, "Brasil"), (1995, "Portugal")]
@@ -0,0 +1,57 @@
+import io
+from datetime import datetime, timezone
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from models.coin import Coin
+from models.country import Country, CountryAlias
+from models.user import User
+from services import country_service
+from services.country_service import backfill_country_codes, lookup_country_code, parse_countries_csv
+
+CSV = "code,name,aliases\nFR,França,France\nDE,Alemanha,Germany|Deutschland\n"
+PAST = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def db():
+    engine = sa.create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    countries, aliases = parse_countries_csv(io.StringIO(CSV))
+    country_service._alias_cache.clear()
+    with Session(engine) as session:
+        session.add_all([*(Country(**c) for c in countries), *(CountryAlias(**a) for a in aliases)])
+        session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        session.commit()
+        yield session
+    country_service._alias_cache.clear()
+    engine.dispose()
+
+
+def test_lookup_ignores_case_spacing_and_accents():
+    _, aliases = parse_countries_csv(io.StringIO(CSV))
+    aliases = {row["alias"]: row["country_code"] for row in aliases}
+    assert lookup_country_code(aliases, "  FRANÇA ") == "FR"
+    assert lookup_country_code(aliases, "franca") == "FR"
+    assert lookup_country_code(aliases, "Deutschland") == "DE"
+    assert lookup_country_code(aliases, "Atlântida") is None
+    assert lookup_country_code(aliases, "  ") is None
+
+
+def test_backfill_resolves_like_new_coins_and_bumps_updated_at(db):
+    names = ["FRANÇA", "Franca", "germany", "Atlântida"]
+    db.add_all([
+        Coin(owner_id=1, year=1990 + i, country=name, face_value="1", quantity=1, updated_at=PAST)
+        for i, name in enumerate(names)
+    ])
+    db.commit()
+
+    assert backfill_country_codes(db, batch_size=2, pause_seconds=0) == 3
+
+    coins = db.execute(sa.select(Coin.country, Coin.country_code, Coin.updated_at).order_by(Coin.id)).all()
+    assert [code for _, code, _ in coins] == ["FR", "FR", "DE", None]
+    assert [updated_at.replace(tzinfo=timezone.utc) > PAST for _, _, updated_at in coins] == [True, True, True, False]
@@ -0,0 +1,50 @@
+"""
+Facetas: cada uma é contada sem o filtro da própria dimensão. Os filtros de
+país (`country` em texto livre, resolvido para `country_code`) são uma só
+dimensão. Usa GROUPING SETS: só no Postgres.
+"""
+import os
+
+import pytest
+from sqlalchemy.orm import Session
+
+from core.database import Base
+from models.coin import Coin
+from models.country import Country
+from models.user import User
+from services.coin_service import FACET_FIELDS, compute_facets
+
+pytestmark = pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+
+
+@pytest.fixture
+def db(pg_engine):
+    Base.metadata.create_all(pg_engine)
+    with Session(pg_engine) as session:
+        session.add_all([Country(code="BR", name="Brasil"), Country(code="DE", name="Alemanha")])
+        session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        session.flush()
+        session.add_all([
+            Coin(owner_id=1, year=1990 + i, country=country, country_code=code, face_value="1", quantity=1)
+            for i, (country, code) in enumerate([("Brasil", "BR"), ("brasil ", "BR"), ("Alemanha", "DE")])
+        ])
+        session.commit()
+        yield session
+
+
+def _buckets(facets, field):
+    return {bucket["value"]: bucket["count"] for bucket in facets[field]}
+
+
+@pytest.mark.parametrize("field", ["country", "country_code"])
+def test_country_facet_ignores_resolved_country_filter(db, field):
+    # ?country=Brasil: o país reconhecido vira filtro por código.
+    conditions = {name: [] for name in FACET_FIELDS}
+    conditions["country_code"].append(Coin.country_code == "BR")
+    conditions["year"].append(Coin.year >= 1991)
+
+    facets = compute_facets(db, [Coin.owner_id == 1], conditions, [field, "year"], 10)
+
+    expected = {"country": {"brasil ": 1, "Alemanha": 1}, "country_code": {"BR": 1, "DE": 1}}
+    assert _buckets(facets, field) == expected[field]
+    assert _buckets(facets, "year") == {1990: 1, 1991: 1}
@@ -0,0 +1,46 @@
+"""O fingerprint da Idempotency-Key cobre o corpo: JSON e arquivos enviados."""
+from fastapi import Depends, FastAPI, UploadFile
+from fastapi.testclient import TestClient
+
+from core.idempotency import _body_digest
+
+app = FastAPI()
+
+
+@app.post("/json")
+def post_json(payload: dict, digest: str = Depends(_body_digest)):
+    return {"digest": digest}
+
+
+@app.post("/upload")
+def post_upload(file: UploadFile, digest: str = Depends(_body_digest)):
+    # A rota ainda lê o arquivo inteiro depois do hash.
+    return {"digest": digest, "size": len(file.file.read())}
+
+
+client = TestClient(app)
+KEY = {"Idempotency-Key": "k"}
+
+
+def _digest(path, **kwargs):
+    response = client.post(path, **kwargs)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_json_body_changes_digest():
+    first = _digest("/json", json={"year": 1994}, headers=KEY)["digest"]
+    assert _digest("/json", json={"year": 1994}, headers=KEY)["digest"] == first
+    assert _digest("/json", json={"year": 1995}, headers=KEY)["digest"] != first
+
+
+def test_file_content_changes_digest_and_is_rewound():
+    content = b"x" * (3 << 20)
+    first = _digest("/upload", files={"file": ("a.csv", content)}, headers=KEY)
+    assert first["size"] == len(content)
+    assert _digest("/upload", files={"file": ("a.csv", content)}, headers=KEY) == first
+    assert _digest("/upload", files={"file": ("a.csv", content + b"y")}, headers=KEY)["digest"] != first["digest"]
+
+
+def test_no_digest_without_key():
+    assert _digest("/json", json={"year": 1994})["digest"] == ""
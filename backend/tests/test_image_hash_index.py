@@ -0,0 +1,91 @@
+"""
+Índice de hashes de imagem: a releitura do banco roda fora do lock das
+buscas (numa thread, quando o índice vence) e não perde alterações feitas
+enquanto ela acontece.
+"""
+import threading
+
+import pytest
+import sqlalchemy as sa
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from core.database import Base
+from models import country  # noqa: F401  (registra a tabela countries)
+from models.coin import Coin
+from models.user import User
+from services import image_hash_service
+from services.image_hash_service import ImageHashIndex
+
+
+@pytest.fixture
+def engine():
+    # A releitura em segundo plano usa a mesma conexão em outra thread.
+    engine = sa.create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        session.add_all([
+            Coin(id=1, owner_id=1, year=1994, country="Brasil", face_value="1", quantity=1, image_hash_front=0b1111),
+            Coin(id=2, owner_id=1, year=1995, country="Brasil", face_value="1", quantity=1, image_hash_back=0b0111),
+        ])
+        session.commit()
+    yield engine
+    engine.dispose()
+
+
+def test_search_loads_on_first_use(engine):
+    index = ImageHashIndex(refresh_seconds=300, session_factory=lambda: Session(engine))
+    with Session(engine) as db:
+        assert index.search(db, 0b1111, k=5, max_distance=2) == [(1, 0), (2, 1)]
+        index.remove(1)
+        assert index.search(db, 0b1111, k=5, max_distance=2) == [(2, 1)]
+
+
+def test_changes_during_refresh_survive_the_swap(engine, monkeypatch):
+    index = ImageHashIndex(refresh_seconds=300, session_factory=lambda: Session(engine))
+    from_rows = image_hash_service._HashArrays.from_rows
+
+    def concurrent_writes(rows):
+        # Roda sem o lock das buscas: com ele, estas chamadas travariam.
+        index.remove(1)
+        index.update(3, 1, "front", 0b1110)
+        return from_rows(rows)
+
+    monkeypatch.setattr(image_hash_service._HashArrays, "from_rows", concurrent_writes)
+    with Session(engine) as db:
+        index.refresh(db)
+        monkeypatch.setattr(image_hash_service._HashArrays, "from_rows", from_rows)
+        assert index.search(db, 0b1111, k=5, max_distance=2) == [(2, 1), (3, 1)]
+
+
+def test_stale_index_is_refreshed_in_background(engine, monkeypatch):
+    index = ImageHashIndex(refresh_seconds=300, session_factory=lambda: Session(engine))
+    with Session(engine) as db:
+        index.search(db, 0, k=1, max_distance=64)
+
+        with Session(engine) as writer:
+            writer.add(Coin(id=3, owner_id=1, year=1996, country="Brasil", face_value="1", quantity=1, image_hash_front=0b1111))
+            writer.commit()
+
+        started, release = threading.Event(), threading.Event()
+        from_rows = image_hash_service._HashArrays.from_rows
+
+        def slow_from_rows(rows):
+            started.set()
+            release.wait(5)
+            return from_rows(rows)
+
+        monkeypatch.setattr(image_hash_service._HashArrays, "from_rows", slow_from_rows)
+        index.refresh_seconds = 0
+        # A busca que dispara a releitura não espera por ela.
+        assert index.search(db, 0b1111, k=5, max_distance=0) == [(1, 0)]
+        assert started.wait(5)
+        assert index.search(db, 0b1111, k=5, max_distance=0) == [(1, 0)]
+
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == "image-index-refresh":
+                thread.join(5)
+        index.refresh_seconds = 300
+        assert index.search(db, 0b1111, k=5, max_distance=0) == [(1, 0), (3, 0)]
@@ -0,0 +1,178 @@
+"""
+Migrações online contra um Postgres de verdade: o banco é populado numa
+revisão antiga e migrado até `head` enquanto uma thread lê a tabela `coins`.
+Nenhuma leitura pode falhar nem ficar presa além do `lock_timeout` das
+migrações. Pulado sem TEST_POSTGRES_URL (o schema `public` do banco
+apontado é apagado).
+"""
+import os
+import threading
+import time
+from argparse import Namespace
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+
+from core.config import settings
+
+pytestmark = pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+
+# Última revisão antes das migrações online testadas aqui.
+SEED_REVISION = "1c7b4f2a8e63"
+USERS = 3
+COINS_PER_USER = 2_000
+# Maiúsculas fora do ASCII e acentos faltando: resolvidos como nas moedas novas.
+COUNTRIES = ("Brasil", " brazil ", "ALEMANHA", "FRANÇA", "Emirados Arabes Unidos", "Atlântida")
+
+
+def _seed(pg_engine, migrate):
+    migrate(SEED_REVISION)
+    with pg_engine.begin() as conn:
+        for user in range(1, USERS + 1):
+            conn.execute(
+                sa.text(
+                    "INSERT INTO users (id, email, hashed_password, created_at, updated_at) "
+                    "VALUES (:id, :email, 'x', now(), now())"
+                ),
+                {"id": user, "email": f"user{user}@example.com"},
+            )
+            conn.execute(
+                sa.text(
+                    "INSERT INTO coins (quantity, year, country, face_value, currency, "
+                    "originality, owner_id, created_at, updated_at) "
+                    "SELECT 1, 1000 + g, (CAST(:countries AS text[]))[1 + g % :n], '1', 'BRL', 'ORIGINAL', "
+                    ":owner_id, now(), now() FROM generate_series(1, :count) g"
+                ),
+                {"countries": list(COUNTRIES), "n": len(COUNTRIES), "owner_id": user, "count": COINS_PER_USER},
+            )
+
+
+class Reader(threading.Thread):
+    """Lê `coins` sem parar, guardando erros e a maior latência observada."""
+
+    def __init__(self, engine):
+        super().__init__(daemon=True)
+        self.engine = engine
+        self.stop = threading.Event()
+        self.reads = 0
+        self.errors = []
+        self.max_latency = 0.0
+
+    def run(self):
+        while not self.stop.is_set():
+            started = time.monotonic()
+            try:
+                with self.engine.connect() as conn:
+                    conn.execute(
+                        sa.text("SELECT id, country, year FROM coins WHERE owner_id = :owner_id ORDER BY id LIMIT 50"),
+                        {"owner_id": 1 + self.reads % USERS},
+                    ).all()
+            except sa.exc.DBAPIError as exc:
+                self.errors.append(exc)
+            self.max_latency = max(self.max_latency, time.monotonic() - started)
+            self.reads += 1
+
+
+@pytest.mark.parametrize("partitions", [0, 4])
+def test_upgrade_under_concurrent_reads(pg_engine, alembic_config, migrate, monkeypatch, partitions):
+    monkeypatch.setattr(settings, "COINS_PARTITION_COUNT", partitions)
+    _seed(pg_engine, migrate)
+
+    reader = Reader(pg_engine)
+    reader.start()
+    try:
+        command.upgrade(alembic_config, "head")
+    finally:
+        reader.stop.set()
+        reader.join()
+
+    assert reader.reads > 0
+    assert reader.errors == []
+    # Leituras só esperam atrás de DDL que ainda aguarda o lock (lock_timeout).
+    assert reader.max_latency < settings.MIGRATION_LOCK_TIMEOUT_MS / 1000 + 2
+
+    with pg_engine.connect() as conn:
+        partitioned = conn.execute(
+            sa.text("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'coins'::regclass)")
+        ).scalar()
+        assert partitioned == (partitions > 0)
+
+        invalid = conn.execute(
+            sa.text(
+                "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname LIKE 'ix_coins_owner_id_country_code%' AND NOT i.indisvalid"
+            )
+        ).scalars().all()
+        assert invalid == []
+        indexes = conn.execute(
+            sa.text("SELECT count(*) FROM pg_indexes WHERE indexname LIKE 'ix_coins_owner_id_country_code%'")
+        ).scalar()
+        assert indexes == 1 + partitions
+
+        validated = conn.execute(
+            sa.text(
+                "SELECT bool_and(convalidated) FROM pg_constraint "
+                "WHERE conname = 'fk_coins_country_code_countries'"
+            )
+        ).scalar()
+        assert validated
+
+        # Cada lote do backfill é uma transação: um incremento por lote e dono.
+        unsequenced = conn.execute(
+            sa.text("SELECT count(*) FROM coins c LEFT JOIN collection_versions v USING (owner_id) "
+                    "WHERE c.change_seq IS NULL OR v.change_seq IS NULL OR c.change_seq > v.change_seq")
+        ).scalar()
+        assert unsequenced == 0
+
+        codes = dict(
+            conn.execute(
+                sa.text("SELECT DISTINCT ON (country) country, country_code FROM coins ORDER BY country")
+            ).all()
+        )
+        assert codes == {
+            "Brasil": "BR",
+            " brazil ": "BR",
+            "ALEMANHA": "DE",
+            "FRANÇA": "FR",
+            "Emirados Arabes Unidos": "AE",
+            "Atlântida": None,
+        }
+        # O backfill avança updated_at só das moedas resolvidas.
+        touched = dict(
+            conn.execute(
+                sa.text("SELECT country_code IS NOT NULL, bool_and(updated_at > created_at) FROM coins GROUP BY 1")
+            ).all()
+        )
+        assert touched == {True: True, False: False}
+
+
+def test_partitioning_resumes_after_interrupted_run(pg_engine, alembic_config, migrate):
+    migrate("b7d41c2e9a10")
+    with pg_engine.begin() as conn:
+        conn.execute(sa.text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'a@example.com', 'x')"))
+        conn.execute(sa.text(
+            "INSERT INTO coins (quantity, year, country, face_value, originality, owner_id) "
+            "SELECT 1, g, 'Brasil', '1', 'ORIGINAL', 1 FROM generate_series(1, 1000) g"
+        ))
+        # Sobras de uma execução que caiu no meio da cópia.
+        conn.execute(sa.text("CREATE TABLE coins_new (LIKE coins INCLUDING DEFAULTS) PARTITION BY HASH (owner_id)"))
+        conn.execute(sa.text("CREATE TABLE coins_new_p0 PARTITION OF coins_new FOR VALUES WITH (MODULUS 1, REMAINDER 0)"))
+        conn.execute(sa.text("CREATE FUNCTION coins_sync_new() RETURNS trigger AS $$ BEGIN RETURN NULL; END $$ LANGUAGE plpgsql"))
+        conn.execute(sa.text("CREATE TRIGGER coins_sync_new AFTER INSERT ON coins FOR EACH ROW EXECUTE FUNCTION coins_sync_new()"))
+
+    alembic_config.cmd_opts = Namespace(x=["coins_partitions=3"])
+    command.upgrade(alembic_config, "c3a9f0d15e72")
+
+    with pg_engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT count(*) FROM coins")).scalar() == 1000
+        assert conn.execute(
+            sa.text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'coins'::regclass")
+        ).scalar() == 3
+        assert conn.execute(sa.text("SELECT obj_description('coins'::regclass)")).scalar() == (
+            "c3a9f0d15e72: HASH (owner_id), 3 partitions"
+        )
+        assert conn.execute(sa.text(
+            "SELECT to_regclass('coins_new') IS NULL "
+            "AND NOT EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'coins_sync_new')"
+        )).scalar()
@@ -0,0 +1,103 @@
+"""
+Roteamento entre primário e réplicas de leitura, com dois bancos SQLite que
+respondem o próprio nome: leituras vão para a réplica, escritas e leituras
+logo depois de uma escrita (cookie ou header) vão para o primário, e uma
+réplica fora do ar é pulada.
+"""
+import time
+
+import pytest
+import sqlalchemy as sa
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session, sessionmaker
+
+from core import database
+from core.database import LAST_WRITE_COOKIE, LAST_WRITE_HEADER, ReadYourWritesMiddleware, ReplicaSet, get_db
+
+app = FastAPI()
+app.add_middleware(ReadYourWritesMiddleware)
+
+
+def _which(db: Session) -> str:
+    return db.execute(sa.text("SELECT name FROM which_db")).scalar()
+
+
+@app.get("/which")
+def read_which(db: Session = Depends(get_db)):
+    return {"db": _which(db)}
+
+
+@app.post("/which")
+def write_which(db: Session = Depends(get_db)):
+    return {"db": _which(db)}
+
+
+def _sqlite(path, name) -> str:
+    url = f"sqlite:///{path / name}.db"
+    engine = sa.create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(sa.text("CREATE TABLE which_db (name TEXT)"))
+        conn.execute(sa.text("INSERT INTO which_db VALUES (:name)"), {"name": name})
+    engine.dispose()
+    return url
+
+
+@pytest.fixture
+def routing(tmp_path, monkeypatch):
+    """Aponta o primário e as réplicas para arquivos SQLite; devolve um configurador de réplicas."""
+    primary = sa.create_engine(_sqlite(tmp_path, "primary"))
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(bind=primary))
+    replica_url = _sqlite(tmp_path, "replica")
+    created = []
+
+    def use_replicas(*urls):
+        replicas = ReplicaSet([replica_url if url == "replica" else url for url in urls], retry_seconds=60)
+        monkeypatch.setattr(database, "replicas", replicas)
+        created.append(replicas)
+        return replicas
+
+    use_replicas("replica")
+    yield use_replicas
+    for replicas in created:
+        for engine in replicas.engines:
+            engine.dispose()
+    primary.dispose()
+
+
+def _db(response) -> str:
+    assert response.status_code == 200, response.text
+    return response.json()["db"]
+
+
+def test_reads_use_the_replica_and_writes_the_primary(routing):
+    client = TestClient(app)
+    assert _db(client.get("/which")) == "replica"
+    assert _db(client.post("/which")) == "primary"
+
+
+def test_reads_after_a_write_stay_on_the_primary(routing):
+    client = TestClient(app)
+    response = client.post("/which")
+    last_write = response.headers[LAST_WRITE_HEADER]
+    assert client.cookies.get(LAST_WRITE_COOKIE) == last_write
+
+    # Pelo cookie, no mesmo cliente...
+    assert _db(client.get("/which")) == "primary"
+    # ...ou pelo header, num cliente sem cookies.
+    fresh = TestClient(app)
+    assert _db(fresh.get("/which", headers={LAST_WRITE_HEADER: last_write})) == "primary"
+    stale = f"{time.time() - 3600:.3f}"
+    assert _db(fresh.get("/which", headers={LAST_WRITE_HEADER: stale})) == "replica"
+
+
+def test_failed_replica_is_skipped(routing, tmp_path):
+    replicas = routing(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}", "replica")
+    client = TestClient(app)
+    assert _db(client.get("/which")) == "replica"
+    assert _db(client.get("/which")) == "replica"
+    assert replicas.choose() is replicas.engines[1]
+
+    # Sem nenhuma réplica disponível, a leitura cai para o primário.
+    routing(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    assert _db(client.get("/which")) == "primary"
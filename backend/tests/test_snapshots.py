@@ -0,0 +1,61 @@
+"""Snapshots de valuation: rollups por país canônico e só para coleções alteradas. Usa INSERT ... ON CONFLICT do Postgres."""
+import os
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from core.database import Base
+from models.coin import Coin, CoinTombstone, CollectionVersion
+from models.country import Country
+from models.snapshot import ValuationSnapshot
+from models.user import User
+from services.snapshot_service import take_snapshots
+
+pytestmark = pytest.mark.skipif(not os.environ.get("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+
+
+@pytest.fixture
+def db(pg_engine):
+    Base.metadata.create_all(pg_engine)
+    with Session(pg_engine) as session:
+        session.add(Country(code="BR", name="Brasil"))
+        session.add(User(id=1, email="a@example.com", hashed_password="x"))
+        session.flush()
+        session.add_all([
+            Coin(owner_id=1, year=1990 + i, country=country, country_code=code, face_value="1", quantity=1)
+            for i, (country, code) in enumerate(
+                [("Brasil", "BR"), (" brazil", "BR"), ("BR", "BR"), ("Atlântida", None), ("atlântida ", None)]
+            )
+        ])
+        session.commit()
+        yield session
+
+
+def test_rollup_groups_by_canonical_country(db):
+    assert take_snapshots(db, date(2026, 1, 1)) == 1
+    snapshot = db.scalar(select(ValuationSnapshot))
+    assert snapshot.total_coins == 5
+    assert snapshot.by_country == {"BR": 3, "atlântida": 2}
+
+
+def test_only_changed_collections_are_taken_again(db):
+    db.add(User(id=2, email="b@example.com", hashed_password="x"))
+    db.add(Coin(owner_id=2, year=2000, country="Brasil", country_code="BR", face_value="1", quantity=1))
+    db.commit()
+    assert take_snapshots(db, date(2026, 1, 1)) == 2
+    assert take_snapshots(db, date(2026, 1, 2)) == 0
+
+    coin = db.scalar(select(Coin).where(Coin.owner_id == 2))
+    coin.notes = "edited"
+    db.commit()
+    assert take_snapshots(db, date(2026, 1, 2)) == 1
+    snapshot = db.get(ValuationSnapshot, (2, date(2026, 1, 2)))
+    assert snapshot.change_seq == db.get(CollectionVersion, 2).change_seq
+
+    db.add(CoinTombstone(coin_id=coin.id, owner_id=2))
+    db.delete(coin)
+    db.commit()
+    assert take_snapshots(db, date(2026, 1, 3)) == 1
+    assert db.get(ValuationSnapshot, (2, date(2026, 1, 3))).total_coins == 0